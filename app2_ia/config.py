@@ -0,0 +1,28 @@
+# app2_ia/config.py
+"""
+Configuración compartida entre módulos de App2.
+
+Solo contiene los parámetros que deben coincidir en varios módulos
+(por ejemplo, la dimensión de los embeddings entre el generador y la
+columna vectorial de la base de datos). Cada valor se lee de una
+variable de entorno.
+"""
+
+import os
+
+# --------------------------------------------------
+# Modo de almacenamiento de embeddings
+# --------------------------------------------------
+# - "proyectado": vector nativo de 768D proyectado a 1536D (comportamiento histórico)
+# - "nativo": vector nativo de 768D en float32, sin proyección
+EMBEDDING_MODOS = {"proyectado": 1536, "nativo": 768}
+
+EMBEDDING_MODO = os.getenv("EVALIA_EMBEDDING_MODO", "proyectado").strip().lower()
+if EMBEDDING_MODO not in EMBEDDING_MODOS:
+    raise RuntimeError(
+        f"EVALIA_EMBEDDING_MODO inválido ('{EMBEDDING_MODO}'). "
+        f"Valores permitidos: {sorted(EMBEDDING_MODOS)}"
+    )
+
+# Dimensión de los vectores que se generan y se guardan en la BD
+EMBEDDING_DIM = EMBEDDING_MODOS[EMBEDDING_MODO]
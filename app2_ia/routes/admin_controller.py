@@ -0,0 +1,78 @@
+from fastapi import APIRouter, HTTPException
+from typing import Any, Dict, Optional
+from app2_ia.services.vector_index import (
+    estado_indice,
+    reconstruir_indice,
+    analizar_tabla,
+    TIPOS_INDICE
+)
+from app2_ia.services.result_cache import obtener_cache_resultados
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Operaciones de mantenimiento bloqueantes: se declaran con "def" para que
+# FastAPI las ejecute en su threadpool y no congelen el bucle de eventos.
+
+@router.get(
+    "/indice",
+    summary="Estado del índice ANN de embeddings"
+)
+def obtener_estado_indice() -> Dict[str, Any]:
+    try:
+        return estado_indice()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error consultando el índice: {e}")
+
+
+@router.post(
+    "/indice/reconstruir",
+    summary="Reconstruye el índice ANN (sin cortar el servicio) y ejecuta ANALYZE"
+)
+def reconstruir(tipo: Optional[str] = None) -> Dict[str, Any]:
+    if tipo is not None and tipo not in TIPOS_INDICE:
+        raise HTTPException(status_code=400, detail=f"Tipo inválido. Valores permitidos: {sorted(TIPOS_INDICE)}")
+    try:
+        reconstruir_indice(tipo)
+        analizar_tabla()
+        return estado_indice()
+    except Exception as e:
+        logger.error("Error reconstruyendo el índice: %s", e)
+        raise HTTPException(status_code=500, detail=f"Error reconstruyendo el índice: {e}")
+
+
+@router.post(
+    "/indice/analizar",
+    summary="Ejecuta ANALYZE sobre la tabla de embeddings"
+)
+def analizar() -> Dict[str, Any]:
+    try:
+        analizar_tabla()
+        return estado_indice()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error ejecutando ANALYZE: {e}")
+
+
+@router.get(
+    "/cache",
+    summary="Estadísticas de los caches de embeddings, de resultados y del memo de limpieza"
+)
+def estadisticas_caches() -> Dict[str, Any]:
+    from app2_ia.services.embedding import obtener_modulo
+    from app2_ia.utils.limpieza import estadisticas_memo
+    return {
+        "embeddings": obtener_modulo().estadisticas_cache(),
+        "resultados": obtener_cache_resultados().stats(),
+        "limpieza": estadisticas_memo(),
+    }
+
+
+@router.post(
+    "/cache/resultados/invalidar",
+    summary="Vacía el cache de resultados de búsqueda"
+)
+def invalidar_cache_resultados() -> Dict[str, Any]:
+    obtener_cache_resultados().invalidar()
+    return obtener_cache_resultados().stats()
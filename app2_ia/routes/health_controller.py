@@ -0,0 +1,37 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app2_ia.services.arranque import esta_listo, estado_arranque
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+@router.get(
+    "/live",
+    summary="Liveness: el proceso responde"
+)
+async def live():
+    return {"status": "ok"}
+
+
+@router.get(
+    "/ready",
+    summary="Readiness: modelos cargados y almacén de vectores accesible"
+)
+def ready():
+    # "def": la comprobación de la BD es bloqueante y se ejecuta en el threadpool
+    estado = estado_arranque()
+    if not esta_listo():
+        return JSONResponse(status_code=503, content=estado)
+
+    try:
+        from app2_ia.services.vector_store import obtener_store
+        obtener_store().comprobar()
+        estado["base_de_datos"] = "ok"
+    except Exception as e:
+        logger.warning("Readiness: base de datos no disponible: %s", e)
+        estado["base_de_datos"] = f"error: {e}"
+        return JSONResponse(status_code=503, content=estado)
+
+    return estado
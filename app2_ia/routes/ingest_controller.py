@@ -1,37 +1,84 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from app2_ia.services.ingest_service import cargar_y_validar_csv, procesar_y_guardar_candidatos
-from app2_ia.models.schemas import ResultadoCarga
-import logging
-
-logger = logging.getLogger(__name__)
-
-router = APIRouter()
-
-@router.post(
-    "/procesar_csv_completo",
-    response_model=ResultadoCarga,
-    summary="Valida CSV, procesa embeddings y guarda en la BD vectorial"
-)
-async def procesar_csv_completo(file: UploadFile = File(...)):
-    
-    # Paso 1: validar el CSV
-    candidatos_validos, errores = cargar_y_validar_csv(file)
-
-    # Paso 2: procesar sólo los válidos
-    try:
-        resultado: ResultadoCarga = procesar_y_guardar_candidatos(candidatos_validos)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error interno: {e}")
-
-    # Paso 3: completar el resultado con los errores y descartados
-    resultado.descartados = len(errores)
-    resultado.errores = errores
-    
-    logger.info(
-        f"Carga finalizada: {resultado.validados} insertados, "
-        f"{resultado.descartados} descartados "
-        f"({len(resultado.duplicados)} duplicados), "
-        f"{len(resultado.errores)} errores."
-    )
-
-    return resultado
\ No newline at end of file
+from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from app2_ia.services.ingest_service import procesar_csv_en_streaming_async
+from app2_ia.services.job_service import obtener_gestor
+from app2_ia.models.schemas import ResultadoCarga, EstadoTrabajo
+import logging
+import shutil
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+@router.post(
+    "/procesar_csv_completo",
+    response_model=ResultadoCarga,
+    summary="Valida CSV, procesa embeddings y guarda en la BD vectorial"
+)
+async def procesar_csv_completo(file: UploadFile = File(...)):
+    
+    # Validar, limpiar, embeber e insertar el CSV bloque a bloque;
+    # el resultado ya incluye los errores y descartados
+    try:
+        # Etapas de CPU en hilos y consultas a la BD esperadas: no bloquea el bucle de eventos
+        resultado: ResultadoCarga = await procesar_csv_en_streaming_async(file.file)
+    except ValueError as e:
+        # Columnas incorrectas u otros problemas de formato del CSV
+        raise HTTPException(status_code=400, detail=f"CSV inválido: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno: {e}")
+
+    logger.info(
+        "Carga finalizada: %d insertados, %d descartados (%d duplicados), %d errores.",
+        resultado.validados, resultado.descartados, len(resultado.duplicados), len(resultado.errores)
+    )
+
+    return resultado
+
+
+def _guardar_en_temporal(file: UploadFile) -> str:
+    """Copia la subida a un fichero temporal que sobrevive a la petición"""
+    with tempfile.NamedTemporaryFile(prefix="evalia_carga_", suffix=".csv", delete=False) as tmp:
+        shutil.copyfileobj(file.file, tmp)
+        return tmp.name
+
+
+@router.post(
+    "/procesar_csv_async",
+    response_model=EstadoTrabajo,
+    status_code=202,
+    summary="Encola la carga de un CSV y devuelve el identificador del trabajo"
+)
+async def procesar_csv_async(file: UploadFile = File(...)):
+    ruta = await run_in_threadpool(_guardar_en_temporal, file)
+    return obtener_gestor().encolar(ruta)
+
+
+@router.get(
+    "/trabajos/{job_id}",
+    response_model=EstadoTrabajo,
+    summary="Progreso de un trabajo de carga"
+)
+async def estado_trabajo(job_id: str):
+    estado = obtener_gestor().estado(job_id)
+    if estado is None:
+        raise HTTPException(status_code=404, detail=f"Trabajo {job_id} no encontrado")
+    return estado
+
+
+@router.get(
+    "/trabajos/{job_id}/resultado",
+    response_model=ResultadoCarga,
+    summary="Resultado final de un trabajo de carga"
+)
+async def resultado_trabajo(job_id: str):
+    gestor = obtener_gestor()
+    estado = gestor.estado(job_id)
+    if estado is None:
+        raise HTTPException(status_code=404, detail=f"Trabajo {job_id} no encontrado")
+    if estado.estado == "fallido":
+        raise HTTPException(status_code=500, detail=f"El trabajo falló: {estado.detalle_error}")
+    if estado.estado != "completado":
+        raise HTTPException(status_code=409, detail=f"El trabajo aún no ha terminado ({estado.estado})")
+    return gestor.resultado(job_id)
@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from app2_ia.utils.metricas import exponer, CONTENT_TYPE
+
+router = APIRouter()
+
+@router.get(
+    "/metrics",
+    summary="Métricas en formato Prometheus (latencia por etapa, caches, pool de BD, ingesta)"
+)
+def metrics():
+    # "def": los callbacks leen estado protegido por locks; mejor en el threadpool
+    return Response(content=exponer(), media_type=CONTENT_TYPE)
@@ -1,26 +1,80 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+import os
+from fastapi import APIRouter, HTTPException, Response
+from pydantic import BaseModel, Field
 from typing import List, Optional
-from app2_ia.services.search_service import buscar_candidatos_similares
+from app2_ia.services.search_service import (
+    buscar_pagina_similares_async,
+    buscar_candidatos_similares_lote_async,
+    TOP_K,
+    K_MAX
+)
 from app2_ia.models.schemas import ResultadoRanking
 
 router = APIRouter()
 
+# Máximo de perfiles por petición en /buscar_similares_batch
+BUSQUEDA_LOTE_MAX = int(os.getenv("EVALIA_BUSQUEDA_LOTE_MAX", "100"))
+
+# Cabecera con el cursor de la página siguiente (ausente en la última página)
+CABECERA_CURSOR = "X-Siguiente-Cursor"
+# Presente si no hay cursor porque se alcanzó el máximo de resultados que
+# recorre la paginación (HNSW sin recorrido iterativo); su valor es ese máximo
+CABECERA_LIMITE = "X-Limite-Paginacion"
+
 class BusquedaPerfil(BaseModel):
     puesto: Optional[str] = None
     descripcion: str
+    # Resultados por página
+    k: int = Field(TOP_K, ge=1, le=K_MAX)
+    # Cursor devuelto en X-Siguiente-Cursor para pedir la página siguiente
+    cursor: Optional[str] = None
 
 @router.post(
     "/buscar_similares",
     response_model=List[ResultadoRanking],
     summary="Busca candidatos similares a una descripción de perfil"
 )
-async def buscar_similares(busqueda: BusquedaPerfil):
+async def buscar_similares(busqueda: BusquedaPerfil, response: Response):
     try:
-        resultados = buscar_candidatos_similares(
+        pagina = await buscar_pagina_similares_async(
             busqueda.puesto, 
-            busqueda.descripcion
+            busqueda.descripcion,
+            busqueda.k,
+            busqueda.cursor
+        )
+        if pagina.siguiente_cursor:
+            response.headers[CABECERA_CURSOR] = pagina.siguiente_cursor
+        elif pagina.limite_profundidad is not None:
+            response.headers[CABECERA_LIMITE] = str(pagina.limite_profundidad)
+        return pagina.resultados
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en la búsqueda: {e}")
+
+
+@router.post(
+    "/buscar_similares_batch",
+    response_model=List[List[ResultadoRanking]],
+    summary="Busca candidatos similares para varios perfiles en una sola petición"
+)
+async def buscar_similares_batch(busquedas: List[BusquedaPerfil]):
+    if len(busquedas) > BUSQUEDA_LOTE_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Máximo {BUSQUEDA_LOTE_MAX} perfiles por petición (recibidos {len(busquedas)})"
+        )
+    if any(b.cursor for b in busquedas):
+        raise HTTPException(
+            status_code=400,
+            detail="La búsqueda por lotes solo devuelve la primera página; usa /buscar_similares para paginar"
+        )
+    try:
+        return await buscar_candidatos_similares_lote_async(
+            [(b.puesto, b.descripcion) for b in busquedas],
+            [b.k for b in busquedas]
         )
-        return resultados
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error en la búsqueda: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error en la búsqueda: {e}")
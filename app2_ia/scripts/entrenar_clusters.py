@@ -0,0 +1,123 @@
+# app2_ia/scripts/entrenar_clusters.py
+"""
+Entrena los clusters globales sobre toda la tabla evalia_embeddings y guarda
+el cluster_id de cada candidato.
+
+1. Recorre la tabla por lotes (keyset sobre id) y ajusta un MiniBatchKMeans
+   con partial_fit: la memoria no depende del tamaño de la tabla.
+2. Guarda los centroides en EVALIA_CLUSTERS_PATH (models/clusters.joblib);
+   el servicio los recarga solo al detectar el cambio.
+3. Recorre de nuevo la tabla asignando el cluster_id de cada fila.
+
+Uso:
+    python -m app2_ia.scripts.entrenar_clusters
+    python -m app2_ia.scripts.entrenar_clusters --n-clusters 12 --epocas 3
+    python -m app2_ia.scripts.entrenar_clusters --solo-asignar   # reutiliza los centroides guardados
+
+Los cluster_id de un entrenamiento nuevo no corresponden a los del anterior:
+después de re-entrenar conviene re-entrenar también el reranking
+(scripts/train_reranking.py), que usa cluster_id como feature.
+"""
+
+import argparse
+from typing import Iterator, List, Tuple
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sqlalchemy import Integer, text
+from pgvector.sqlalchemy import Vector
+
+from app2_ia.config import EMBEDDING_DIM, EMBEDDING_MODO
+from app2_ia.services.vector_db import engine, actualizar_clusters, requerir_bd
+from app2_ia.services.clustering_service import (
+    CLUSTERS_PATH,
+    N_CLUSTERS,
+    ClusteringGlobal,
+    RegistroClusters,
+    guardar_clusters,
+)
+
+TABLA = "evalia_embeddings"
+
+
+def recorrer_tabla(batch_size: int) -> Iterator[Tuple[List[int], np.ndarray]]:
+    """Devuelve (ids de fila, matriz de embeddings) por lotes, en orden de id"""
+    seleccion = text(
+        f"SELECT id, embedding FROM {TABLA} WHERE id > :ultimo ORDER BY id LIMIT :limite"
+    ).columns(id=Integer, embedding=Vector())
+    ultimo = 0
+    while True:
+        with engine.connect() as conn:
+            filas = conn.execute(seleccion, {"ultimo": ultimo, "limite": batch_size}).all()
+        if not filas:
+            return
+        ids = [fila.id for fila in filas]
+        yield ids, np.array([np.asarray(fila.embedding, dtype=np.float32) for fila in filas])
+        ultimo = ids[-1]
+
+
+def entrenar(n_clusters: int, batch_size: int, epocas: int) -> ClusteringGlobal:
+    """Ajusta MiniBatchKMeans por lotes y guarda los centroides"""
+    modelo = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, batch_size=batch_size)
+    total = 0
+    pendiente = None
+    for epoca in range(epocas):
+        for _, lote in recorrer_tabla(batch_size):
+            # partial_fit necesita al menos n_clusters muestras en la primera llamada
+            if pendiente is not None:
+                lote = np.vstack([pendiente, lote])
+                pendiente = None
+            if not hasattr(modelo, "cluster_centers_") and len(lote) < n_clusters:
+                pendiente = lote
+                continue
+            modelo.partial_fit(lote)
+            if epoca == 0:
+                total += len(lote)
+        print(f"  Época {epoca + 1}/{epocas} completada")
+
+    if not hasattr(modelo, "cluster_centers_"):
+        raise SystemExit(f"Se necesitan al menos {n_clusters} embeddings en {TABLA} para entrenar")
+
+    version = guardar_clusters(
+        modelo.cluster_centers_,
+        n_clusters=n_clusters,
+        dim=EMBEDDING_DIM,
+        modo=EMBEDDING_MODO,
+        filas=total,
+    )
+    print(f"✅ Centroides ({n_clusters} clusters, {total} filas) guardados en {CLUSTERS_PATH} (versión {version})")
+    return ClusteringGlobal(modelo.cluster_centers_, version)
+
+
+def asignar(modelo: ClusteringGlobal, batch_size: int) -> int:
+    """Guarda el cluster_id de todas las filas de la tabla"""
+    total = 0
+    for ids, lote in recorrer_tabla(batch_size):
+        actualizar_clusters(dict(zip(ids, modelo.asignar(lote))))
+        total += len(ids)
+        print(f"  {total} filas asignadas")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrena los clusters globales de candidatos")
+    parser.add_argument("--n-clusters", type=int, default=N_CLUSTERS)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--epocas", type=int, default=1, help="Pasadas de partial_fit sobre la tabla")
+    parser.add_argument("--solo-asignar", action="store_true", help="No re-entrenar; usar los centroides guardados")
+    args = parser.parse_args()
+    requerir_bd()
+
+    if args.solo_asignar:
+        modelo = RegistroClusters(intervalo_s=0).obtener()
+        if modelo is None:
+            raise SystemExit(f"No hay centroides válidos en {CLUSTERS_PATH}")
+    else:
+        modelo = entrenar(args.n_clusters, args.batch_size, args.epocas)
+
+    total = asignar(modelo, args.batch_size)
+    print(f"✅ cluster_id asignado a {total} candidatos")
+
+
+if __name__ == "__main__":
+    main()
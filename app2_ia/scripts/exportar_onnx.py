@@ -0,0 +1,140 @@
+# app2_ia/scripts/exportar_onnx.py
+"""
+Exporta el modelo de embeddings (all-mpnet-base-v2, desde el cache local de
+sentence-transformers) a ONNX y lo cuantiza con cuantización dinámica int8
+para el backend "onnx" (services/embedding_backend.py).
+
+1. Carga el SentenceTransformer y comprueba que su pipeline es
+   transformer + mean pooling (+ normalización), lo que reproduce el backend.
+2. Exporta el transformer (input_ids, attention_mask -> última capa) con
+   ejes dinámicos de lote y secuencia.
+3. Cuantiza los pesos a int8 con onnxruntime.quantization.quantize_dynamic.
+4. Guarda el tokenizador y metadatos.json (dimensión, longitud máxima,
+   normalización y huella del fichero, que forma parte de la clave del cache).
+
+Uso:
+    python -m app2_ia.scripts.exportar_onnx
+    python -m app2_ia.scripts.exportar_onnx --salida models/onnx/mpnet-fp32 --sin-cuantizar
+
+Después conviene medir la deriva frente a fp32 antes de activarlo:
+    python -m app2_ia.scripts.paridad_embeddings --csv datos.csv
+    EVALIA_EMBEDDING_BACKEND=onnx python -m uvicorn app2_ia.main:app
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import argparse
+import tempfile
+from datetime import datetime
+
+from app2_ia.services.embedding import MODELO_BASE, BASE_DIM
+from app2_ia.services.embedding_backend import ONNX_DIR, FICHERO_METADATOS
+
+
+def _huella(ruta: str) -> str:
+    sha = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def _describir_pipeline(modelo) -> dict:
+    """Comprueba que el SentenceTransformer es transformer + mean pooling (+ normalización)"""
+    from sentence_transformers.models import Normalize, Pooling, Transformer
+
+    modulos = list(modelo)
+    if not isinstance(modulos[0], Transformer) or len(modulos) < 2 or not isinstance(modulos[1], Pooling):
+        raise SystemExit(f"Pipeline no soportado: {[type(m).__name__ for m in modulos]}")
+    if modulos[1].get_pooling_mode_str() != "mean":
+        raise SystemExit(f"Pooling no soportado: {modulos[1].get_pooling_mode_str()} (solo mean)")
+    return {
+        "max_seq_length": modelo.max_seq_length,
+        "normalizar": any(isinstance(m, Normalize) for m in modulos[2:]),
+    }
+
+
+def exportar(salida: str, cuantizar: bool, opset: int) -> dict:
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    modelo = SentenceTransformer(MODELO_BASE, device="cpu")
+    pipeline = _describir_pipeline(modelo)
+    transformer = modelo[0].auto_model.eval()
+    tokenizer = modelo.tokenizer
+
+    class _UltimaCapa(torch.nn.Module):
+        """El grafo exportado devuelve solo la última capa oculta; el pooling va en NumPy"""
+
+        def __init__(self, modelo_hf):
+            super().__init__()
+            self.modelo_hf = modelo_hf
+
+        def forward(self, input_ids, attention_mask):
+            return self.modelo_hf(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+    ejemplo = tokenizer(["Texto de ejemplo para la exportación"], return_tensors="pt")
+    os.makedirs(salida, exist_ok=True)
+    with tempfile.TemporaryDirectory() as temporal:
+        ruta_fp32 = os.path.join(temporal, "model_fp32.onnx")
+        with torch.no_grad():
+            torch.onnx.export(
+                _UltimaCapa(transformer),
+                (ejemplo["input_ids"], ejemplo["attention_mask"]),
+                ruta_fp32,
+                input_names=["input_ids", "attention_mask"],
+                output_names=["last_hidden_state"],
+                dynamic_axes={
+                    "input_ids": {0: "lote", 1: "secuencia"},
+                    "attention_mask": {0: "lote", 1: "secuencia"},
+                    "last_hidden_state": {0: "lote", 1: "secuencia"},
+                },
+                opset_version=opset,
+            )
+        print(f"  Grafo fp32 exportado ({os.path.getsize(ruta_fp32) / 1e6:.0f} MB)")
+
+        if cuantizar:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            fichero = "model_int8.onnx"
+            quantize_dynamic(ruta_fp32, os.path.join(salida, fichero), weight_type=QuantType.QInt8)
+            cuantizacion = "int8"
+        else:
+            fichero = "model_fp32.onnx"
+            shutil.copyfile(ruta_fp32, os.path.join(salida, fichero))
+            cuantizacion = "fp32"
+
+    tokenizer.save_pretrained(salida)
+    ruta_modelo = os.path.join(salida, fichero)
+    metadatos = {
+        "modelo_base": MODELO_BASE,
+        "fichero": fichero,
+        "cuantizacion": cuantizacion,
+        "dim": BASE_DIM,
+        "max_seq_length": pipeline["max_seq_length"],
+        "normalizar": pipeline["normalizar"],
+        "opset": opset,
+        "huella": _huella(ruta_modelo),
+        "creado": datetime.now().isoformat(timespec="seconds"),
+    }
+    with open(os.path.join(salida, FICHERO_METADATOS), "w", encoding="utf-8") as f:
+        json.dump(metadatos, f, indent=2)
+    print(f"  Modelo {cuantizacion} guardado ({os.path.getsize(ruta_modelo) / 1e6:.0f} MB)")
+    return metadatos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta el modelo de embeddings a ONNX (int8)")
+    parser.add_argument("--salida", default=ONNX_DIR, help="Directorio destino (por defecto EVALIA_ONNX_DIR)")
+    parser.add_argument("--sin-cuantizar", action="store_true", help="Exportar en fp32, sin cuantización int8")
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args()
+
+    metadatos = exportar(args.salida, cuantizar=not args.sin_cuantizar, opset=args.opset)
+    print(f"✅ Modelo ONNX ({metadatos['cuantizacion']}) exportado en {args.salida}")
+    print("   Antes de activarlo: python -m app2_ia.scripts.paridad_embeddings --csv <candidatos.csv>")
+
+
+if __name__ == "__main__":
+    main()
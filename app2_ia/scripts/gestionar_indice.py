@@ -0,0 +1,43 @@
+# app2_ia/scripts/gestionar_indice.py
+"""
+Mantenimiento del índice ANN de evalia_embeddings.
+
+Uso:
+    python -m app2_ia.scripts.gestionar_indice estado
+    python -m app2_ia.scripts.gestionar_indice crear [--tipo hnsw|ivfflat]
+    python -m app2_ia.scripts.gestionar_indice reconstruir [--tipo hnsw|ivfflat|ninguno]
+    python -m app2_ia.scripts.gestionar_indice analizar
+"""
+
+import argparse
+import json
+
+from app2_ia.services.vector_index import (
+    TIPOS_INDICE,
+    crear_indice,
+    reconstruir_indice,
+    analizar_tabla,
+    estado_indice
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gestión del índice ANN de embeddings")
+    parser.add_argument("accion", choices=["estado", "crear", "reconstruir", "analizar"])
+    parser.add_argument("--tipo", choices=sorted(TIPOS_INDICE), default=None)
+    args = parser.parse_args()
+
+    if args.accion == "crear":
+        crear_indice(args.tipo)
+        analizar_tabla()
+    elif args.accion == "reconstruir":
+        reconstruir_indice(args.tipo)
+        analizar_tabla()
+    elif args.accion == "analizar":
+        analizar_tabla()
+
+    print(json.dumps(estado_indice(), indent=2, ensure_ascii=False, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# app2_ia/scripts/migrar_compresion.py
+"""
+Cambia la representación que indexa la primera etapa de búsqueda
+(EVALIA_VECTOR_COMPRESION) en una tabla evalia_embeddings ya cargada.
+
+La columna embedding conserva siempre el vector completo (se usa para la
+re-puntuación exacta), así que la migración no reescribe filas: reconstruye
+el índice ANN sobre la nueva expresión (embedding::halfvec o
+binary_quantize(embedding)) sin cortar el servicio y, después, mide sobre
+una muestra de la tabla el recall@k de la búsqueda en dos etapas frente a
+la búsqueda exacta.
+
+Uso:
+    python -m app2_ia.scripts.migrar_compresion --destino halfvec
+    python -m app2_ia.scripts.migrar_compresion --destino binaria --muestras 200 --k 10
+    python -m app2_ia.scripts.migrar_compresion --destino ninguna   # marcha atrás
+    EVALIA_RESCORE_FACTOR=20 python -m app2_ia.scripts.migrar_compresion --destino binaria --solo-recall
+
+Después de migrar hay que arrancar la aplicación con
+EVALIA_VECTOR_COMPRESION igual al destino. Hasta entonces las búsquedas de
+la aplicación en marcha no usan el índice nuevo (recorrido secuencial), así
+que conviene migrar y reiniciar en la misma ventana.
+"""
+
+import time
+import argparse
+from typing import List
+
+import numpy as np
+from sqlalchemy import text
+from pgvector.sqlalchemy import Vector
+
+from app2_ia.config import EMBEDDING_DIM
+from app2_ia.services.vector_db import (
+    engine,
+    COMPRESIONES,
+    buscar_vecinos,
+    describir_almacenamiento,
+    dimension_embedding_almacenada,
+    requerir_bd
+)
+from app2_ia.services.vector_index import (
+    INDEX_TIPO,
+    analizar_tabla,
+    configurar_busqueda,
+    reconstruir_indice
+)
+
+TABLA = "evalia_embeddings"
+
+
+def _muestra_consultas(muestras: int) -> List[List[float]]:
+    """Embeddings guardados que se usan como consultas de prueba"""
+    seleccion = text(
+        f"SELECT embedding FROM {TABLA} ORDER BY random() LIMIT :limite"
+    ).columns(embedding=Vector())
+    with engine.connect() as conn:
+        return [list(fila.embedding) for fila in conn.execute(seleccion, {"limite": muestras})]
+
+
+def medir_recall(compresion: str, muestras: int, k: int) -> dict:
+    """
+    Recall@k de la búsqueda en dos etapas con `compresion` frente al top-k
+    exacto (sin índice) sobre toda la tabla, y tiempo medio de cada una.
+    """
+    consultas = _muestra_consultas(muestras)
+    aciertos, t_exacta, t_comprimida = [], 0.0, 0.0
+    for consulta in consultas:
+        with engine.begin() as conn:
+            # Referencia: recorrido secuencial con la distancia exacta
+            conn.execute(text("SELECT set_config('enable_indexscan', 'off', true)"))
+            inicio = time.perf_counter()
+            exactos = buscar_vecinos(conn, consulta, None, k=k, compresion="ninguna")
+            t_exacta += time.perf_counter() - inicio
+        with engine.begin() as conn:
+            configurar_busqueda(conn, k=k, compresion=compresion)
+            inicio = time.perf_counter()
+            aproximados = buscar_vecinos(conn, consulta, None, k=k, compresion=compresion)
+            t_comprimida += time.perf_counter() - inicio
+        referencia = {fila.candidato_id for fila in exactos}
+        if referencia:
+            aciertos.append(len(referencia & {fila.candidato_id for fila in aproximados}) / len(referencia))
+    n = max(len(consultas), 1)
+    return {
+        "consultas": len(consultas),
+        "recall": float(np.mean(aciertos)) if aciertos else None,
+        "ms_exacta": round(1000 * t_exacta / n, 2),
+        "ms_dos_etapas": round(1000 * t_comprimida / n, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cambia la compresión del índice de evalia_embeddings")
+    parser.add_argument("--destino", choices=sorted(COMPRESIONES), required=True)
+    parser.add_argument("--muestras", type=int, default=100, help="Consultas para medir el recall (0 = no medir)")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--umbral-recall", type=float, default=0.95)
+    parser.add_argument("--solo-recall", action="store_true", help="No reconstruir el índice, solo medir")
+    args = parser.parse_args()
+    requerir_bd()
+
+    # 1) Comprobar la tabla
+    dim_actual = dimension_embedding_almacenada()
+    if dim_actual is None:
+        raise SystemExit(f"No existe la tabla {TABLA}")
+    if dim_actual != EMBEDDING_DIM:
+        raise SystemExit(
+            f"La columna embedding tiene {dim_actual} dimensiones y EVALIA_EMBEDDING_MODO espera "
+            f"{EMBEDDING_DIM}: migra antes el modo con scripts/migrar_embeddings.py"
+        )
+
+    almacenamiento = describir_almacenamiento(args.destino)
+    print(
+        f"Compresión '{args.destino}': {almacenamiento['bytes_primera_etapa']} bytes por fila en el índice "
+        f"(vector completo: {almacenamiento['bytes_vector_completo']}), "
+        f"factor de re-puntuación {almacenamiento['factor_rescore']}"
+    )
+
+    # 2) Reconstruir el índice ANN sobre la nueva representación
+    if not args.solo_recall:
+        if INDEX_TIPO == "ninguno":
+            print("⚠️  EVALIA_INDEX_TIPO=ninguno: no hay índice que reconstruir; la primera etapa será secuencial")
+        inicio = time.perf_counter()
+        estado = reconstruir_indice(compresion=args.destino)
+        analizar_tabla()
+        print(
+            f"  Índice {estado['indice']} reconstruido en {time.perf_counter() - inicio:.1f}s "
+            f"({estado.get('bytes', 0) / 1e6:.1f} MB)"
+        )
+
+    # 3) Recall de la búsqueda en dos etapas frente a la exacta
+    if args.muestras > 0:
+        informe = medir_recall(args.destino, args.muestras, args.k)
+        if informe["recall"] is None:
+            print("  Tabla vacía: no se puede medir el recall")
+        else:
+            print(
+                f"  Recall@{args.k} sobre {informe['consultas']} consultas: {informe['recall']:.3f} "
+                f"({informe['ms_dos_etapas']} ms/consulta frente a {informe['ms_exacta']} ms exacta)"
+            )
+            if informe["recall"] < args.umbral_recall:
+                print(
+                    f"⚠️  Recall por debajo de {args.umbral_recall}: sube EVALIA_RESCORE_FACTOR "
+                    "(o EVALIA_HNSW_EF_SEARCH) y vuelve a medir con --solo-recall"
+                )
+
+    if not args.solo_recall:
+        print(f"✅ Índice migrado. Arranca la aplicación con EVALIA_VECTOR_COMPRESION={args.destino}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# app2_ia/scripts/migrar_embeddings.py
+"""
+Convierte la columna 'embedding' de evalia_embeddings entre los modos de
+almacenamiento "proyectado" (1536D) y "nativo" (768D) sin re-generar embeddings.
+
+La matriz de proyección P (768x1536, semilla 42) tiene rango completo por
+filas, así que el vector nativo se recupera con su pseudo-inversa:
+    y = x·P / |x·P|   =>   x / |x| = normalizar(y · pinv(P))
+
+Uso:
+    python -m app2_ia.scripts.migrar_embeddings --destino nativo
+    python -m app2_ia.scripts.migrar_embeddings --destino proyectado   # marcha atrás
+    python -m app2_ia.scripts.migrar_embeddings --destino nativo --dry-run
+
+Después de migrar hay que arrancar la aplicación con EVALIA_EMBEDDING_MODO
+igual al destino. La migración es reanudable: si se interrumpe, vuelve a
+lanzarla y continuará por las filas pendientes.
+"""
+
+import argparse
+
+import numpy as np
+from sqlalchemy import Integer, text, bindparam
+from pgvector.sqlalchemy import Vector
+
+from app2_ia.config import EMBEDDING_MODOS
+from app2_ia.services.embedding import crear_matriz_proyeccion, BASE_DIM
+from app2_ia.services.vector_db import engine, dimension_embedding_almacenada, requerir_bd
+from app2_ia.services.vector_index import crear_indice
+
+TABLA = "evalia_embeddings"
+COLUMNA_TEMPORAL = "embedding_migrado"
+
+
+def _normalizar(matriz: np.ndarray) -> np.ndarray:
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return matriz / normas
+
+
+def construir_conversor(destino: str):
+    """
+    Devuelve una función que convierte un lote (n, dim_origen) al modo destino
+    y otra que mide el error de reconstrucción del lote convertido.
+    """
+    proyeccion = crear_matriz_proyeccion(BASE_DIM, EMBEDDING_MODOS["proyectado"]).astype(np.float64)
+
+    if destino == "nativo":
+        inversa = np.linalg.pinv(proyeccion)  # (1536, 768)
+
+        def convertir(lote: np.ndarray) -> np.ndarray:
+            return _normalizar(lote @ inversa)
+
+        def error(lote: np.ndarray, convertido: np.ndarray) -> float:
+            reconstruido = _normalizar(convertido @ proyeccion)
+            return float(np.abs(reconstruido - lote).max())
+    else:
+        def convertir(lote: np.ndarray) -> np.ndarray:
+            return _normalizar(lote @ proyeccion)
+
+        def error(lote: np.ndarray, convertido: np.ndarray) -> float:
+            return 0.0
+
+    return convertir, error
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra evalia_embeddings entre modos de almacenamiento")
+    parser.add_argument("--destino", choices=sorted(EMBEDDING_MODOS), default="nativo")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="Solo convierte el primer lote e informa del error")
+    args = parser.parse_args()
+    requerir_bd()
+
+    dim_destino = EMBEDDING_MODOS[args.destino]
+    origen = "nativo" if args.destino == "proyectado" else "proyectado"
+    dim_origen = EMBEDDING_MODOS[origen]
+
+    # 1) Comprobar el estado actual de la tabla
+    dim_actual = dimension_embedding_almacenada()
+    if dim_actual is None:
+        raise SystemExit(f"No existe la tabla {TABLA}")
+    if dim_actual == dim_destino:
+        print(f"✅ La columna embedding ya tiene {dim_destino} dimensiones. Nada que hacer.")
+        return
+    if dim_actual != dim_origen:
+        raise SystemExit(f"Dimensión inesperada en la columna embedding: {dim_actual}")
+
+    convertir, error = construir_conversor(args.destino)
+
+    seleccion = text(
+        f"SELECT id, embedding FROM {TABLA} "
+        f"WHERE id > :ultimo AND {COLUMNA_TEMPORAL} IS NULL "
+        f"ORDER BY id LIMIT :limite"
+    ).columns(id=Integer, embedding=Vector())
+    actualizacion = text(
+        f"UPDATE {TABLA} SET {COLUMNA_TEMPORAL} = :vector WHERE id = :id"
+    ).bindparams(bindparam("vector", type_=Vector(dim_destino)))
+
+    # 2) Columna temporal con la nueva dimensión
+    if not args.dry_run:
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"ALTER TABLE {TABLA} ADD COLUMN IF NOT EXISTS "
+                f"{COLUMNA_TEMPORAL} vector({dim_destino})"
+            ))
+    else:
+        # En dry-run la columna temporal puede no existir
+        seleccion = text(
+            f"SELECT id, embedding FROM {TABLA} WHERE id > :ultimo ORDER BY id LIMIT :limite"
+        ).columns(id=Integer, embedding=Vector())
+
+    # 3) Conversión por lotes (una transacción por lote)
+    ultimo, total, peor_error = 0, 0, 0.0
+    while True:
+        with engine.begin() as conn:
+            filas = conn.execute(seleccion, {"ultimo": ultimo, "limite": args.batch_size}).all()
+            if not filas:
+                break
+            ids = [fila.id for fila in filas]
+            lote = np.array([np.asarray(fila.embedding, dtype=np.float64) for fila in filas])
+            convertido = convertir(lote)
+            peor_error = max(peor_error, error(lote, convertido))
+
+            if args.dry_run:
+                print(f"Dry-run: {len(ids)} filas convertidas, error máximo de reconstrucción {peor_error:.2e}")
+                return
+
+            conn.execute(
+                actualizacion,
+                [{"id": i, "vector": v} for i, v in zip(ids, convertido.astype(np.float32))]
+            )
+        ultimo = ids[-1]
+        total += len(ids)
+        print(f"  {total} filas convertidas (último id {ultimo})")
+
+    if peor_error > 1e-3:
+        print(
+            f"⚠️  Error máximo de reconstrucción {peor_error:.2e}: algunas filas no parecen "
+            "generadas con la proyección estándar"
+        )
+
+    # 4) Sustituir la columna original (los índices sobre ella se eliminan con la columna)
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {TABLA} DROP COLUMN embedding"))
+        conn.execute(text(f"ALTER TABLE {TABLA} RENAME COLUMN {COLUMNA_TEMPORAL} TO embedding"))
+        conn.execute(text(f"ALTER TABLE {TABLA} ALTER COLUMN embedding SET NOT NULL"))
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"ANALYZE {TABLA}"))
+
+    # 5) Recrear el índice ANN sobre la nueva columna
+    crear_indice()
+
+    print(
+        f"✅ {total} embeddings migrados a {dim_destino}D. "
+        f"Arranca la aplicación con EVALIA_EMBEDDING_MODO={args.destino}."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# app2_ia/scripts/paridad_embeddings.py
+"""
+Mide la deriva del backend ONNX (int8) frente a los vectores fp32 de
+PyTorch antes de cambiar EVALIA_EMBEDDING_BACKEND.
+
+Sobre una muestra de textos reales (valoracion_gpt de un CSV de carga,
+limpiados como en la ingesta) calcula:
+  - Coseno entre el vector fp32 y el ONNX de cada texto (media, p1, mínimo).
+  - Recall@k mixto: consultas con ONNX contra los vectores fp32 ya
+    guardados frente al top-k todo fp32. Es lo que vería la búsqueda si se
+    cambia de backend sin re-embeber la tabla.
+  - Recall@k re-embebiendo: todo ONNX frente a todo fp32.
+  - Textos por segundo de cada backend.
+
+Se comparan los vectores base (768D): la proyección del modo "proyectado"
+es la misma matriz para los dos backends.
+
+Uso:
+    python -m app2_ia.scripts.paridad_embeddings --csv datos/candidatos.csv
+    python -m app2_ia.scripts.paridad_embeddings --csv datos/candidatos.csv --muestras 500 --umbral 0.995
+
+Sale con código 1 si el coseno medio es menor que --umbral o el recall
+mixto menor que --umbral-recall: en ese caso, o se re-embebe la tabla con
+el nuevo backend o se mantiene "torch".
+"""
+
+import json
+import time
+import argparse
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from app2_ia.services.embedding import MODELO_BASE, EMBEDDING_BATCH_SIZE
+from app2_ia.services.embedding_backend import ONNX_DIR, BackendOnnx, crear_backend
+
+
+def leer_textos(ruta_csv: str, muestras: int, semilla: int, limpiar: bool) -> List[str]:
+    """Muestra de valoracion_gpt del CSV, limpiada como en la ingesta"""
+    df = pd.read_csv(ruta_csv, dtype=str)
+    df.columns = df.columns.str.lower()
+    textos = df["valoracion_gpt"].dropna()
+    textos = textos[textos.str.strip() != ""]
+    if len(textos) > muestras:
+        textos = textos.sample(muestras, random_state=semilla)
+    textos = textos.tolist()
+    if limpiar:
+        from app2_ia.utils.limpieza import limpiar_textos_para_embedding
+        textos = limpiar_textos_para_embedding(textos)
+    return [t if t.strip() else " " for t in textos]
+
+
+def codificar(modelo, textos: List[str], batch_size: int) -> Dict[str, object]:
+    inicio = time.perf_counter()
+    vectores = np.asarray(
+        modelo.encode(textos, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False),
+        dtype=np.float32
+    )
+    segundos = time.perf_counter() - inicio
+    normas = np.linalg.norm(vectores, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return {"vectores": vectores / normas, "textos_por_s": len(textos) / segundos}
+
+
+def recall_k(consultas: np.ndarray, corpus: np.ndarray, referencia: np.ndarray, k: int) -> float:
+    """Fracción media del top-k de referencia que recupera consultas x corpus (sin contarse a sí mismo)"""
+    similitudes = consultas @ corpus.T
+    np.fill_diagonal(similitudes, -np.inf)
+    top = np.argpartition(-similitudes, k, axis=1)[:, :k]
+    aciertos = [len(set(fila) & set(ref)) for fila, ref in zip(top, referencia)]
+    return float(np.mean(aciertos)) / k
+
+
+def comparar(fp32: np.ndarray, onnx: np.ndarray, k: int) -> Dict[str, float]:
+    cosenos = np.sum(fp32 * onnx, axis=1)
+    k = min(k, len(fp32) - 1)
+    similitudes = fp32 @ fp32.T
+    np.fill_diagonal(similitudes, -np.inf)
+    referencia = np.argpartition(-similitudes, k, axis=1)[:, :k]
+    return {
+        "coseno_medio": float(cosenos.mean()),
+        "coseno_p1": float(np.percentile(cosenos, 1)),
+        "coseno_min": float(cosenos.min()),
+        "k": k,
+        "recall_mixto": recall_k(onnx, fp32, referencia, k),
+        "recall_reembebiendo": recall_k(onnx, onnx, referencia, k),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deriva de los embeddings ONNX int8 frente a fp32")
+    parser.add_argument("--csv", required=True, help="CSV con el formato de carga (columna valoracion_gpt)")
+    parser.add_argument("--onnx-dir", default=ONNX_DIR, help="Modelo exportado (por defecto EVALIA_ONNX_DIR)")
+    parser.add_argument("--muestras", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--umbral", type=float, default=0.99, help="Coseno medio mínimo")
+    parser.add_argument("--umbral-recall", type=float, default=0.9, help="Recall@k mixto mínimo")
+    parser.add_argument("--sin-limpieza", action="store_true", help="No limpiar los textos con spaCy")
+    parser.add_argument("--salida", help="Guardar el informe en un fichero JSON")
+    args = parser.parse_args()
+
+    textos = leer_textos(args.csv, args.muestras, args.semilla, limpiar=not args.sin_limpieza)
+    if len(textos) < 2:
+        raise SystemExit(f"Se necesitan al menos 2 textos en {args.csv}")
+    print(f"Comparando {len(textos)} textos...")
+
+    fp32 = codificar(crear_backend("torch", MODELO_BASE), textos, args.batch_size)
+    onnx_backend = BackendOnnx(args.onnx_dir)
+    onnx = codificar(onnx_backend, textos, args.batch_size)
+
+    informe = comparar(fp32["vectores"], onnx["vectores"], args.k)
+    informe.update({
+        "textos": len(textos),
+        "textos_por_s_torch": round(fp32["textos_por_s"], 1),
+        "textos_por_s_onnx": round(onnx["textos_por_s"], 1),
+    })
+
+    print(f"  Coseno fp32 vs ONNX: media {informe['coseno_medio']:.5f}, "
+          f"p1 {informe['coseno_p1']:.5f}, mínimo {informe['coseno_min']:.5f}")
+    print(f"  Recall@{informe['k']} consultas ONNX sobre vectores fp32 (sin re-embeber): {informe['recall_mixto']:.3f}")
+    print(f"  Recall@{informe['k']} todo ONNX (re-embebiendo): {informe['recall_reembebiendo']:.3f}")
+    print(f"  Velocidad: torch {informe['textos_por_s_torch']} textos/s, ONNX {informe['textos_por_s_onnx']} textos/s")
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(informe, f, indent=2)
+
+    if informe["coseno_medio"] < args.umbral or informe["recall_mixto"] < args.umbral_recall:
+        print("❌ La deriva supera los umbrales: re-embeber la tabla con el nuevo backend o mantener torch")
+        raise SystemExit(1)
+    print("✅ Deriva dentro de los umbrales: se puede cambiar de backend sin re-embeber")
+
+
+if __name__ == "__main__":
+    main()
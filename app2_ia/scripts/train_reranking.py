@@ -6,6 +6,8 @@ import joblib
 import numpy as np
 from sklearn.model_selection import train_test_split
 import xgboost as xgb
+from app2_ia.services.clustering_service import obtener_clusters
+from app2_ia.services.reranking_service import features_reranking
 
 # Rutas de datos y modelo
 TRAIN_JSON = os.path.join("data", "reranking_train.json")
@@ -18,18 +20,21 @@ def main():
     with open(TRAIN_JSON, "r", encoding="utf-8") as f:
         raw = json.load(f)
 
-    # 2) Construcción de X e y
+    # 2) Construcción de X e y (un cluster_id ausente va como NaN, no como 0)
     X, y = [], []
     for item in raw:
-        feats = [
-            item["similitud"],
-            item.get("cluster_id", 0),
-        ]
-        X.append(feats)
+        X.append(features_reranking(item["similitud"], item.get("cluster_id")))
         y.append(item["label_score"])
-    X = np.array(X)
+    X = np.array(X, dtype=float)
     y = np.array(y)
 
+    # Los cluster_id de los datos deben ser de los clusters globales activos:
+    # se guarda su versión con el modelo y el servicio rechaza el modelo si
+    # los clusters cambian
+    clusters = obtener_clusters()
+    if clusters is None:
+        print("⚠️ No hay clusters globales: el modelo se entrena sin cluster_id útil")
+
     # 3) División en train/validation
     X_train, X_val, y_train, y_val = train_test_split(
         X, y, test_size=0.2, random_state=42
@@ -56,10 +61,22 @@ def main():
         verbose_eval=True
     )
 
-    # 7) Guardar el Booster entrenado
+    # 7) Guardar el Booster entrenado junto con los clusters que usa
+    # Se escribe en un temporal y se renombra: el servicio en marcha detecta
+    # el cambio y nunca lee un fichero a medio escribir
+    datos = {
+        "modelo": bst,
+        "clusters_version": clusters.version if clusters is not None else None,
+        "n_clusters": clusters.n_clusters if clusters is not None else None,
+    }
     os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
-    joblib.dump(bst, MODEL_PATH)
-    print(f"✅ Booster entrenado y guardado en {MODEL_PATH}")
+    tmp_path = MODEL_PATH + ".tmp"
+    joblib.dump(datos, tmp_path)
+    os.replace(tmp_path, MODEL_PATH)
+    print(
+        f"✅ Booster entrenado y guardado en {MODEL_PATH} "
+        f"(clusters versión {datos['clusters_version']}, {datos['n_clusters']} clusters)"
+    )
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,204 @@
+# app2_ia/services/arranque.py
+"""
+Arranque y calentamiento del servicio.
+
+Importar la aplicación ya no carga modelos ni toca la base de datos; todo
+ese trabajo se hace aquí, una sola vez, con tiempos medidos por etapa:
+  1. Inicializar el almacén de vectores (pgvector: tablas, esquema e índice ANN).
+  2. Cargar spaCy y limpiar un texto de prueba.
+  3. Cargar SentenceTransformer y codificar un texto de prueba (y arrancar
+     el pool de procesos de embeddings, si está activo).
+  4. Cargar el modelo de reranking y los centroides de los clusters globales.
+
+Modos (EVALIA_WARMUP_MODO):
+  - "fondo" (por defecto): el calentamiento corre en un hilo; /health/live
+    responde desde el primer momento y /health/ready devuelve 503 hasta
+    que termina.
+  - "bloqueante": el evento de startup espera al calentamiento.
+  - "desactivado": solo la etapa 1 (el esquema y el almacén se inicializan
+    siempre), en el evento de startup; los modelos se cargan con la primera
+    petición que los use.
+
+Si una etapa falla (p. ej. la BD aún no acepta conexiones), el calentamiento
+se reintenta en un hilo con espera exponencial (EVALIA_WARMUP_REINTENTO_S,
+duplicándose hasta EVALIA_WARMUP_REINTENTO_MAX_S) y sin repetir las etapas
+ya completadas. /health/ready devuelve 503 con el último error mientras tanto.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+MODOS_WARMUP = {"fondo", "bloqueante", "desactivado"}
+WARMUP_MODO = os.getenv("EVALIA_WARMUP_MODO", "fondo").strip().lower()
+INDEX_AUTO_CREAR = os.getenv("EVALIA_INDEX_AUTO_CREAR", "1") == "1"
+# Espera antes del primer reintento del calentamiento y espera máxima
+WARMUP_REINTENTO_S = float(os.getenv("EVALIA_WARMUP_REINTENTO_S", "2"))
+WARMUP_REINTENTO_MAX_S = float(os.getenv("EVALIA_WARMUP_REINTENTO_MAX_S", "60"))
+
+TEXTO_CALENTAMIENTO = "Candidata con buena comunicación y experiencia en el puesto."
+
+
+class EstadoArranque:
+    """Estado del calentamiento, consultado por /health/ready"""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.listo = False
+        self.en_curso = False
+        self.error: Optional[str] = None
+        self.intentos = 0
+        self.etapas: Dict[str, float] = {}
+        self.segundos_hasta_listo: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def como_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "listo": self.listo,
+                "en_curso": self.en_curso,
+                "modo": WARMUP_MODO,
+                "error": self.error,
+                "intentos": self.intentos,
+                "etapas_s": dict(self.etapas),
+                "arranque_en_frio_s": self.segundos_hasta_listo,
+            }
+
+
+_estado = EstadoArranque()
+
+
+def _etapa(nombre: str, funcion: Callable[[], None]) -> None:
+    t0 = time.perf_counter()
+    funcion()
+    duracion = round(time.perf_counter() - t0, 3)
+    with _estado._lock:
+        _estado.etapas[nombre] = duracion
+    logger.info("Arranque: etapa '%s' completada en %.3fs", nombre, duracion)
+
+
+def _inicializar_bd() -> None:
+    from app2_ia.services.vector_store import obtener_store
+    obtener_store().inicializar(crear_indice_ann=INDEX_AUTO_CREAR)
+
+
+def _calentar_limpieza() -> None:
+    from app2_ia.utils.limpieza import limpiar_texto_para_embedding
+    limpiar_texto_para_embedding(TEXTO_CALENTAMIENTO)
+
+
+def _cargar_reranker() -> None:
+    from app2_ia.services.reranking_service import obtener_reranker
+    if obtener_reranker() is not None:
+        # reranking_service importa xgboost de forma diferida: que no lo pague la primera búsqueda
+        import xgboost  # noqa: F401
+
+
+def _cargar_clusters() -> None:
+    from app2_ia.services.clustering_service import obtener_clusters
+    obtener_clusters()
+
+
+def _calentar_embeddings() -> None:
+    from app2_ia.services.embedding import obtener_modulo
+    # Se llama al modelo directamente: el cache podría evitar la inferencia
+    modulo = obtener_modulo()
+    modulo.model.encode([TEXTO_CALENTAMIENTO], show_progress_bar=False)
+    if modulo.pool is not None:
+        # Los trabajadores cargan su copia del modelo antes del primer lote
+        modulo.pool.calentar()
+
+
+ETAPAS_BD = [("base_de_datos", _inicializar_bd)]
+ETAPAS_MODELOS = [
+    ("limpieza_spacy", _calentar_limpieza),
+    ("modelo_embeddings", _calentar_embeddings),
+    ("reranker", _cargar_reranker),
+    ("clusters", _cargar_clusters),
+]
+
+
+def _etapas_del_modo():
+    """El modo solo decide si se calientan los modelos; la BD se inicializa siempre"""
+    if WARMUP_MODO == "desactivado":
+        return ETAPAS_BD
+    return ETAPAS_BD + ETAPAS_MODELOS
+
+
+def calentar() -> bool:
+    """
+    Ejecuta las etapas del calentamiento que aún no se completaron.
+    :return: True si el servicio quedó listo para recibir tráfico.
+    """
+    with _estado._lock:
+        if _estado.en_curso or _estado.listo:
+            return _estado.listo
+        _estado.en_curso = True
+        _estado.intentos += 1
+        completadas = set(_estado.etapas)
+    try:
+        for nombre, funcion in _etapas_del_modo():
+            if nombre not in completadas:
+                _etapa(nombre, funcion)
+    except Exception as e:
+        logger.error("Error en el calentamiento del servicio (intento %d): %s", _estado.intentos, e)
+        with _estado._lock:
+            _estado.error = str(e)
+            _estado.en_curso = False
+        return False
+
+    with _estado._lock:
+        _estado.listo = True
+        _estado.en_curso = False
+        _estado.error = None
+        _estado.segundos_hasta_listo = round(time.perf_counter() - _estado.inicio, 3)
+    logger.info(
+        "Servicio listo: arranque en frío de %.3fs "
+        "(etapas: %s)", _estado.segundos_hasta_listo, _estado.etapas
+    )
+    return True
+
+
+def calentar_con_reintentos(espera_s: float = WARMUP_REINTENTO_S) -> None:
+    """
+    Repite calentar() hasta que el servicio quede listo, con espera
+    exponencial entre intentos (hasta WARMUP_REINTENTO_MAX_S).
+    """
+    while not calentar():
+        logger.warning("Calentamiento incompleto: nuevo intento en %.1fs", espera_s)
+        time.sleep(espera_s)
+        espera_s = min(espera_s * 2, WARMUP_REINTENTO_MAX_S)
+
+
+def _reintentar_en_fondo() -> None:
+    threading.Thread(target=calentar_con_reintentos, name="calentamiento", daemon=True).start()
+
+
+def iniciar(inicio: Optional[float] = None) -> None:
+    """
+    Lanza el calentamiento según WARMUP_MODO.
+    :param inicio: time.perf_counter() del comienzo del proceso, para medir el arranque completo.
+    """
+    if inicio is not None:
+        _estado.inicio = inicio
+    if WARMUP_MODO not in MODOS_WARMUP:
+        logger.warning("EVALIA_WARMUP_MODO inválido ('%s'); se usa 'fondo'", WARMUP_MODO)
+
+    if WARMUP_MODO in ("bloqueante", "desactivado"):
+        if not calentar():
+            # El proceso arranca igualmente (no listo) y sigue intentándolo
+            _reintentar_en_fondo()
+    else:
+        _reintentar_en_fondo()
+
+
+def esta_listo() -> bool:
+    return _estado.listo
+
+
+def estado_arranque() -> Dict[str, Any]:
+    return _estado.como_dict()
@@ -1,21 +1,47 @@
 # app2_ia/services/clustering_service.py
+"""
+Clustering de candidatos.
 
+- ClusteringGlobal: centroides calculados offline sobre toda la tabla
+  (scripts/entrenar_clusters.py, MiniBatchKMeans con partial_fit) y
+  guardados en EVALIA_CLUSTERS_PATH. Cada candidato guarda su cluster_id
+  en la BD (asignado en la ingesta), así que el cluster_id tiene el mismo
+  significado en todas las búsquedas.
+- ClusteringService: KMeans sobre una lista concreta de embeddings (análisis
+  puntual; la búsqueda ya no lo usa).
+"""
+
+import os
+import time
 import logging
-from typing import List
-from sklearn.cluster import KMeans
+import threading
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+import joblib
+import numpy as np
+from app2_ia.config import EMBEDDING_DIM
 from app2_ia.models.schemas import EmbeddingCandidato, ClusterAssignment
 
 logger = logging.getLogger(__name__)
 
+# Fichero de centroides, número de clusters por defecto y cada cuánto se
+# comprueba si el fichero ha cambiado
+CLUSTERS_PATH = os.getenv("EVALIA_CLUSTERS_PATH", os.path.join("models", "clusters.joblib"))
+N_CLUSTERS = int(os.getenv("EVALIA_N_CLUSTERS", "8"))
+CLUSTERS_INTERVALO_S = float(os.getenv("EVALIA_CLUSTERS_INTERVALO_S", "30"))
+
 class ClusteringService:
     def __init__(self, n_clusters: int = 3):
         """
         Inicializa el servicio de clustering con el número de clústeres deseado.
         :param n_clusters: Número de clústeres para KMeans.
         """
+        from sklearn.cluster import KMeans  # Importación diferida: sklearn es pesado
+
         self.n_clusters = n_clusters
         self.model = KMeans(n_clusters=self.n_clusters, random_state=42)
-        logger.info(f"ClusteringService inicializado con KMeans (n_clusters={n_clusters})")
+        logger.info("ClusteringService inicializado con KMeans (n_clusters=%s)", n_clusters)
 
     def fit_predict(self, candidatos: List[EmbeddingCandidato]) -> List[ClusterAssignment]:
         """
@@ -31,8 +57,8 @@ class ClusteringService:
         # Si hay menos muestras que clústeres, asignamos todos al cluster 0
         if n_samples < self.n_clusters:
             logger.warning(
-                f"Muestras ({n_samples}) < n_clusters ({self.n_clusters}), "
-                "asignando cluster_id=0 a todos"
+                "Muestras (%s) < n_clusters (%s), "
+                "asignando cluster_id=0 a todos", n_samples, self.n_clusters
             )
             return [
                 ClusterAssignment(candidato_id=c.candidato_id, cluster_id=0)
@@ -42,7 +68,7 @@ class ClusteringService:
         embeddings = [c.embedding for c in candidatos]
         candidato_ids = [c.candidato_id for c in candidatos]
 
-        logger.debug(f"Aplicando KMeans a {n_samples} embeddings...")
+        logger.debug("Aplicando KMeans a %s embeddings...", n_samples)
         cluster_ids = self.model.fit_predict(embeddings)
 
         resultado = [
@@ -52,3 +78,144 @@ class ClusteringService:
 
         logger.info("Clustering completado. Clusters asignados.")
         return resultado
+
+
+class ClusteringGlobal:
+    """Asigna embeddings al centroide global más cercano (distancia euclídea)"""
+
+    def __init__(self, centroides: np.ndarray, version: str):
+        self.centroides = np.ascontiguousarray(centroides, dtype=np.float32)
+        self.n_clusters, self.dim = self.centroides.shape
+        self.version = version
+        # |c|^2 precalculado: argmin |x-c|^2 = argmin (|c|^2 - 2 x·c)
+        self._normas2 = (self.centroides ** 2).sum(axis=1)
+
+    def asignar(self, embeddings: Sequence[Sequence[float]]) -> List[int]:
+        """Devuelve el cluster_id de cada embedding"""
+        if len(embeddings) == 0:
+            return []
+        matriz = np.asarray(embeddings, dtype=np.float32)
+        distancias = self._normas2[None, :] - 2.0 * (matriz @ self.centroides.T)
+        return [int(c) for c in distancias.argmin(axis=1)]
+
+
+def guardar_clusters(centroides: np.ndarray, ruta: str = CLUSTERS_PATH, **metadatos: Any) -> str:
+    """
+    Guarda los centroides de forma atómica (temporal + rename) para que el
+    servicio en marcha nunca lea un fichero a medio escribir.
+    :return: Versión asignada a este conjunto de centroides.
+    """
+    version = datetime.now().strftime("%Y%m%d%H%M%S")
+    datos = {
+        "version": version,
+        "centroides": np.asarray(centroides, dtype=np.float32),
+        **metadatos,
+    }
+    directorio = os.path.dirname(ruta)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    temporal = ruta + ".tmp"
+    joblib.dump(datos, temporal)
+    os.replace(temporal, ruta)
+    return version
+
+
+class RegistroClusters:
+    """
+    Carga los centroides una vez y los recarga si el fichero cambia
+    (comprobación como mucho cada `intervalo_s` segundos). Si no hay fichero,
+    o su dimensión no coincide con EMBEDDING_DIM, no hay modelo y los
+    candidatos se guardan con cluster_id NULL. Si el fichero no se puede
+    cargar, se mantienen los centroides anteriores y se reintenta en cada
+    comprobación.
+    """
+
+    def __init__(self, ruta: str = CLUSTERS_PATH, intervalo_s: float = CLUSTERS_INTERVALO_S):
+        self.ruta = ruta
+        self.intervalo_s = intervalo_s
+        self._modelo: Optional[ClusteringGlobal] = None
+        self._firma: Optional[Tuple[int, int]] = None
+        self._firma_fallida: Optional[Tuple[int, int]] = None
+        self._comprobado = False
+        self._ultima_comprobacion = 0.0
+        self._lock = threading.Lock()
+
+    def _recargar_si_cambia(self) -> None:
+        try:
+            st = os.stat(self.ruta)
+            firma: Optional[Tuple[int, int]] = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            firma = None
+        if self._comprobado and firma == self._firma:
+            return
+
+        if firma is None:
+            logger.warning(
+                "No hay centroides en %s: los candidatos no tendrán cluster_id "
+                "(ejecutar scripts/entrenar_clusters.py)", self.ruta
+            )
+            self._modelo = None
+        else:
+            try:
+                datos = joblib.load(self.ruta)
+                modelo = ClusteringGlobal(datos["centroides"], str(datos.get("version")))
+                if modelo.dim != EMBEDDING_DIM:
+                    logger.warning(
+                        "Centroides de %sD y embeddings de %sD: "
+                        "hay que volver a entrenar los clusters", modelo.dim, EMBEDDING_DIM
+                    )
+                    modelo = None
+                else:
+                    logger.info(
+                        "Clusters globales cargados: %s clusters, "
+                        "versión %s", modelo.n_clusters, modelo.version
+                    )
+                self._modelo = modelo
+            except Exception as e:
+                # La firma no se da por vista: se reintenta en la próxima comprobación
+                if firma != self._firma_fallida:
+                    logger.error("No se pudieron cargar los centroides: %s", e)
+                    self._firma_fallida = firma
+                self._comprobado = True
+                return
+
+        self._firma = firma
+        self._firma_fallida = None
+        self._comprobado = True
+
+    def obtener(self) -> Optional[ClusteringGlobal]:
+        """Devuelve el modelo de clusters activo, o None si no hay"""
+        ahora = time.monotonic()
+        if self._comprobado and ahora - self._ultima_comprobacion < self.intervalo_s:
+            return self._modelo
+        with self._lock:
+            if not self._comprobado or ahora - self._ultima_comprobacion >= self.intervalo_s:
+                self._recargar_si_cambia()
+                self._ultima_comprobacion = ahora
+        return self._modelo
+
+
+# Instancia global del registro (singleton pattern)
+_registro_singleton: Optional[RegistroClusters] = None
+_registro_lock = threading.Lock()
+
+
+def obtener_clusters() -> Optional[ClusteringGlobal]:
+    """Modelo de clusters globales activo, o None si no hay centroides"""
+    global _registro_singleton
+    if _registro_singleton is None:
+        with _registro_lock:
+            if _registro_singleton is None:
+                _registro_singleton = RegistroClusters()
+    return _registro_singleton.obtener()
+
+
+def asignar_clusters(embeddings: Sequence[Sequence[float]]) -> List[Optional[int]]:
+    """
+    Asigna el cluster global a cada embedding.
+    :return: Lista de cluster_id (None para todos si no hay centroides).
+    """
+    modelo = obtener_clusters()
+    if modelo is None:
+        return [None] * len(embeddings)
+    return modelo.asignar(embeddings)
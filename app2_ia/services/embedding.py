@@ -1,163 +1,412 @@
-# service/embedding.py
-"""
-Módulo 3: Sistema de Embeddings con 1536 dimensiones
-Aplicación App2 - Evaluación de Candidatos mediante IA
-
-Este módulo genera embeddings de 1536 dimensiones usando Sentence-Transformers
-con una capa de proyección adicional para alcanzar las dimensiones deseadas.
-"""
-
-import logging
-from typing import List
-import hashlib
-import numpy as np
-from sentence_transformers import SentenceTransformer
-
-# Configuración de logging
-logger = logging.getLogger(__name__)
-
-
-class EmbeddingModule:
-    """
-    Módulo 3: Generador de Embeddings de 1536 dimensiones
-    
-    Usa Sentence-Transformers con proyección lineal para generar
-    embeddings de exactamente 1536 dimensiones.
-    """
-    
-    def __init__(self):
-        """
-        Inicializa el módulo de embeddings
-        """
-        self.target_dim = 1536  # Dimensiones objetivo
-        self._cache = {}  # Cache manual para embeddings
-        self._initialize_model()
-        logger.info(f"Módulo 3 inicializado - Embeddings de {self.target_dim} dimensiones")
-    
-    def _initialize_model(self):
-        """Inicializa el modelo y la matriz de proyección"""
-        # Usar un modelo de 768 dimensiones como base
-        self.model = SentenceTransformer('all-mpnet-base-v2')
-        self.base_dim = 768  # Dimensiones del modelo base
-        
-        # Crear matriz de proyección para expandir a 1536 dimensiones
-        # Usar una inicialización determinista
-        np.random.seed(42)
-        self.projection_matrix = np.random.randn(self.base_dim, self.target_dim)
-        # Normalizar la matriz para evitar explosión de gradientes
-        self.projection_matrix = self.projection_matrix / np.sqrt(self.base_dim)
-        
-        logger.info(f"Modelo base cargado ({self.base_dim}D) con proyección a {self.target_dim}D")
-    
-    def _project_to_target_dim(self, embedding: np.ndarray) -> List[float]:
-        """
-        Proyecta el embedding a las dimensiones objetivo (1536)
-        
-        Args:
-            embedding: Embedding original del modelo base
-            
-        Returns:
-            Embedding proyectado a 1536 dimensiones
-        """
-        # Proyectar usando multiplicación matricial
-        projected = np.dot(embedding, self.projection_matrix)
-        
-        # Normalizar para mantener la magnitud
-        norm = np.linalg.norm(projected)
-        if norm > 0:
-            projected = projected / norm
-        
-        return projected.tolist()
-    
-    def _generate_cache_key(self, texto: str) -> str:
-        """Genera una clave única para el cache basada en el texto"""
-        return hashlib.md5(texto.encode()).hexdigest()
-    
-    def _cached_embedding(self, cache_key: str, texto: str) -> List[float]:
-        """
-        Genera embedding con cache para evitar recálculos
-        
-        Args:
-            cache_key: Clave única para el cache
-            texto: Texto a procesar
-            
-        Returns:
-            Lista de floats representando el embedding de 1536 dimensiones
-        """
-        # Verificar si está en cache
-        if cache_key in self._cache:
-            return self._cache[cache_key]
-        
-        # Generar embedding base
-        embedding_base = self.model.encode(texto)
-        
-        # Proyectar a 1536 dimensiones
-        embedding_1536 = self._project_to_target_dim(embedding_base)
-        
-        # Guardar en cache
-        self._cache[cache_key] = embedding_1536
-        
-        # Limitar tamaño del cache
-        if len(self._cache) > 1000:
-            # Eliminar el primer elemento (FIFO)
-            first_key = next(iter(self._cache))
-            del self._cache[first_key]
-        
-        return embedding_1536
-    
-    def generar_embedding(self, texto_limpio: str) -> List[float]:
-        """
-        Genera embedding para un texto limpio
-        
-        Args:
-            texto_limpio: Texto preprocesado a convertir en embedding
-            
-        Returns:
-            Lista de floats de 1536 dimensiones
-        """
-        # Manejo de texto vacío
-        if not texto_limpio.strip():
-            texto_limpio = " "
-        
-        # Generar clave de cache
-        cache_key = self._generate_cache_key(texto_limpio)
-        
-        # Generar embedding (con cache)
-        embedding = self._cached_embedding(cache_key, texto_limpio)
-        
-        # Retornar directamente la lista
-        return embedding
-
-
-# Instancia global del módulo (singleton pattern)
-_modulo_singleton = None
-
-def obtener_modulo() -> EmbeddingModule:
-    """
-    Obtiene la instancia singleton del módulo
-    
-    Returns:
-        Instancia del módulo de embeddings
-    """
-    global _modulo_singleton
-    if _modulo_singleton is None:
-        _modulo_singleton = EmbeddingModule()
-    return _modulo_singleton
-
-
-# Función principal para integración con pipeline
-def generar_embedding(texto_limpio: str) -> List[float]:
-    """
-    Función de interfaz para el pipeline
-    
-    Args:
-        texto_limpio: Texto preprocesado a convertir en embedding
-        
-    Returns:
-        Lista de floats de 1536 dimensiones
-    """
-    # Obtener instancia del módulo
-    modulo = obtener_modulo()
-    
-    # Generar embedding
-    return modulo.generar_embedding(texto_limpio)
\ No newline at end of file
+# service/embedding.py
+"""
+Módulo 3: Sistema de Embeddings
+Aplicación App2 - Evaluación de Candidatos mediante IA
+
+Este módulo genera embeddings usando Sentence-Transformers. Según
+EVALIA_EMBEDDING_MODO trabaja en uno de dos modos:
+  - "proyectado": proyección lineal adicional de 768 a 1536 dimensiones.
+  - "nativo": vectores nativos de 768 dimensiones en float32, sin proyección.
+
+El modelo se ejecuta con el backend de EVALIA_EMBEDDING_BACKEND (PyTorch
+fp32 u ONNX int8, ver services/embedding_backend.py).
+Los lotes pueden codificarse en un pool de procesos (services/embedding_pool.py,
+EVALIA_EMBEDDING_PROCESOS); la proyección y el cache siguen en este proceso.
+"""
+
+import os
+import logging
+import threading
+from typing import Callable, List, Optional
+import numpy as np
+
+from app2_ia.config import EMBEDDING_MODO, EMBEDDING_DIM
+from app2_ia.services.embedding_backend import EMBEDDING_BACKEND, crear_backend, version_backend
+from app2_ia.services.embedding_cache import EmbeddingCache
+from app2_ia.services.embedding_pool import obtener_pool
+from app2_ia.utils.metricas import registrar_indicador
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+# Tamaño de lote por defecto para SentenceTransformer.encode
+EMBEDDING_BATCH_SIZE = int(os.getenv("EVALIA_EMBEDDING_BATCH_SIZE", "64"))
+
+# Modelo base, backend y versión de la proyección (forman parte de la clave del cache)
+MODELO_BASE = "all-mpnet-base-v2"
+BASE_DIM = 768  # Dimensiones del modelo base
+PROJECTION_VERSION = (
+    "gauss-seed42-768x1536" if EMBEDDING_MODO == "proyectado" else "nativo-768"
+)
+
+# Configuración del cache de embeddings
+CACHE_MAX_MB = float(os.getenv("EVALIA_EMBEDDING_CACHE_MB", "64"))
+CACHE_RUTA_DISCO = os.getenv("EVALIA_EMBEDDING_CACHE_PATH")  # p. ej. /var/cache/evalia/embeddings.sqlite
+CACHE_MAX_MB_DISCO = float(os.getenv("EVALIA_EMBEDDING_CACHE_DISK_MB", "1024"))
+
+
+def crear_matriz_proyeccion(base_dim: int = BASE_DIM, target_dim: int = 1536) -> np.ndarray:
+    """
+    Construye la matriz de proyección determinista (semilla 42) del modo "proyectado"
+    
+    Args:
+        base_dim: Dimensiones del modelo base
+        target_dim: Dimensiones objetivo
+        
+    Returns:
+        Matriz float32 de forma (base_dim, target_dim)
+    """
+    # Usar una inicialización determinista
+    np.random.seed(42)
+    matriz = np.random.randn(base_dim, target_dim)
+    # Normalizar la matriz para evitar explosión de gradientes
+    matriz = matriz / np.sqrt(base_dim)
+    return matriz.astype(np.float32)
+
+
+class EmbeddingsEnCurso:
+    """
+    Resultado diferido de EmbeddingModule.enviar_embeddings: resultado()
+    espera a la codificación (en el pool, si está activo), proyecta y
+    guarda en el cache. Se puede llamar varias veces.
+    """
+
+    def __init__(self, completar: Callable[[], List[List[float]]]):
+        self._completar = completar
+        self._resultado: Optional[List[List[float]]] = None
+
+    def resultado(self) -> List[List[float]]:
+        if self._resultado is None:
+            self._resultado = self._completar()
+        return self._resultado
+
+
+class EmbeddingModule:
+    """
+    Módulo 3: Generador de Embeddings
+    
+    Usa Sentence-Transformers para generar embeddings de EMBEDDING_DIM
+    dimensiones: 1536 con proyección lineal o 768 nativas.
+    """
+    
+    def __init__(self):
+        """
+        Inicializa el módulo de embeddings
+        """
+        self.target_dim = EMBEDDING_DIM  # Dimensiones objetivo
+        self._cache = EmbeddingCache(
+            namespace=f"{MODELO_BASE}:{version_backend()}:{PROJECTION_VERSION}",
+            max_bytes=int(CACHE_MAX_MB * 1024 * 1024),
+            ruta_disco=CACHE_RUTA_DISCO,
+            max_bytes_disco=int(CACHE_MAX_MB_DISCO * 1024 * 1024)
+        )
+        self._initialize_model()
+        # Pool de procesos para lotes grandes (None si EVALIA_EMBEDDING_PROCESOS=0)
+        self.pool = obtener_pool(EMBEDDING_BACKEND, MODELO_BASE, self.base_dim)
+        logger.info(
+            "Módulo 3 inicializado - Embeddings de %s dimensiones "
+            "(modo %s)", self.target_dim, EMBEDDING_MODO
+        )
+    
+    def _initialize_model(self):
+        """Inicializa el modelo y, en modo "proyectado", la matriz de proyección"""
+        # Usar un modelo de 768 dimensiones como base (importación diferida
+        # dentro de crear_backend: torch y transformers son lo más lento del arranque)
+        self.model = crear_backend(EMBEDDING_BACKEND, MODELO_BASE)
+        self.base_dim = BASE_DIM
+        
+        if EMBEDDING_MODO == "proyectado":
+            # Crear matriz de proyección para expandir a 1536 dimensiones
+            self.projection_matrix = crear_matriz_proyeccion(self.base_dim, self.target_dim)
+            logger.info(
+                "Modelo base cargado (%sD, backend %s) con proyección a %sD",
+                self.base_dim, EMBEDDING_BACKEND, self.target_dim
+            )
+        else:
+            self.projection_matrix = None
+            logger.info("Modelo base cargado (%sD, backend %s) sin proyección", self.base_dim, EMBEDDING_BACKEND)
+    
+    def _project_to_target_dim(self, embedding: np.ndarray) -> List[float]:
+        """
+        Proyecta el embedding a las dimensiones objetivo (EMBEDDING_DIM)
+        
+        Args:
+            embedding: Embedding original del modelo base
+            
+        Returns:
+            Embedding proyectado y normalizado
+        """
+        return self._project_batch(np.atleast_2d(embedding))[0].tolist()
+    
+    def _project_batch(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Proyecta un lote de embeddings con una única multiplicación matricial
+        y normaliza cada fila. En modo "nativo" solo normaliza.
+        
+        Args:
+            embeddings: Matriz (n, base_dim) con los embeddings del modelo base
+            
+        Returns:
+            Matriz float32 (n, target_dim) con las filas normalizadas
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self.projection_matrix is None:
+            projected = embeddings
+        else:
+            projected = embeddings @ self.projection_matrix
+        
+        # Normalizar por filas, dejando intactas las filas nulas
+        norms = np.linalg.norm(projected, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return projected / norms
+    
+    def _generate_cache_key(self, texto: str) -> str:
+        """Genera una clave única para el cache basada en el texto, el modelo y la proyección"""
+        return self._cache.clave(texto)
+    
+    def _cached_embedding(self, cache_key: str, texto: str) -> List[float]:
+        """
+        Genera embedding con cache para evitar recálculos
+        
+        Args:
+            cache_key: Clave única para el cache
+            texto: Texto a procesar
+            
+        Returns:
+            Lista de floats representando el embedding
+        """
+        # Verificar si está en cache
+        cacheado = self._cache.get(cache_key)
+        if cacheado is not None:
+            return cacheado.tolist()
+        
+        # Generar embedding base
+        embedding_base = self.model.encode(texto)
+        
+        # Proyectar a las dimensiones objetivo
+        embedding_final = self._project_to_target_dim(embedding_base)
+        
+        # Guardar en cache (float32 compacto)
+        self._cache.put(cache_key, np.asarray(embedding_final, dtype=np.float32))
+        
+        return embedding_final
+    
+    def estadisticas_cache(self) -> dict:
+        """Devuelve aciertos, fallos y expulsiones del cache de embeddings"""
+        return self._cache.stats()
+    
+    def generar_embedding(self, texto_limpio: str) -> List[float]:
+        """
+        Genera embedding para un texto limpio
+        
+        Args:
+            texto_limpio: Texto preprocesado a convertir en embedding
+            
+        Returns:
+            Lista de floats de EMBEDDING_DIM dimensiones
+        """
+        # Manejo de texto vacío
+        if not texto_limpio.strip():
+            texto_limpio = " "
+        
+        # Generar clave de cache
+        cache_key = self._generate_cache_key(texto_limpio)
+        
+        # Generar embedding (con cache)
+        embedding = self._cached_embedding(cache_key, texto_limpio)
+        
+        # Retornar directamente la lista
+        return embedding
+    
+    def generar_embeddings(
+        self,
+        textos_limpios: List[str],
+        batch_size: Optional[int] = None
+    ) -> List[List[float]]:
+        """
+        Genera embeddings para un lote de textos limpios
+        
+        Los textos ya presentes en el cache se resuelven sin pasar por el
+        modelo; el resto se codifica en lotes con SentenceTransformer (o en
+        el pool de procesos) y se proyecta con una sola multiplicación matricial.
+        
+        Args:
+            textos_limpios: Textos preprocesados a convertir en embeddings
+            batch_size: Tamaño de lote para el modelo (por defecto EMBEDDING_BATCH_SIZE)
+            
+        Returns:
+            Lista de embeddings de EMBEDDING_DIM dimensiones, en el mismo orden que la entrada
+        """
+        return self.enviar_embeddings(textos_limpios, batch_size).resultado()
+    
+    def enviar_embeddings(
+        self,
+        textos_limpios: List[str],
+        batch_size: Optional[int] = None
+    ) -> EmbeddingsEnCurso:
+        """
+        Como generar_embeddings, pero sin esperar: con el pool activo, los
+        textos que no están en el cache se envían a los trabajadores y la
+        llamada vuelve enseguida. Sin pool, la codificación se hace al pedir
+        el resultado.
+        
+        Args:
+            textos_limpios: Textos preprocesados a convertir en embeddings
+            batch_size: Tamaño de lote para el modelo (por defecto EMBEDDING_BATCH_SIZE)
+            
+        Returns:
+            EmbeddingsEnCurso cuyo resultado() es la lista de embeddings, en el orden de entrada
+        """
+        if not textos_limpios:
+            return EmbeddingsEnCurso(lambda: [])
+        
+        # Manejo de textos vacíos
+        textos = [t if t and t.strip() else " " for t in textos_limpios]
+        cache_keys = [self._generate_cache_key(t) for t in textos]
+        
+        # Resolver aciertos de cache y reunir los textos pendientes (sin repetir)
+        resultados: List[Optional[List[float]]] = [None] * len(textos)
+        cacheados = self._cache.get_many(set(cache_keys))
+        pendientes = {}
+        for i, (cache_key, texto) in enumerate(zip(cache_keys, textos)):
+            if cache_key in cacheados:
+                resultados[i] = cacheados[cache_key].tolist()
+            elif cache_key not in pendientes:
+                pendientes[cache_key] = texto
+        
+        if not pendientes:
+            return EmbeddingsEnCurso(lambda: resultados)
+        
+        textos_pendientes = list(pendientes.values())
+        batch_size = batch_size or EMBEDDING_BATCH_SIZE
+        
+        def codificar_en_proceso() -> np.ndarray:
+            return self.model.encode(
+                textos_pendientes,
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+        
+        # Un solo texto no compensa el viaje al pool
+        lote = None
+        if self.pool is not None and len(textos_pendientes) > 1:
+            lote = self.pool.enviar(textos_pendientes, batch_size, codificar_en_proceso)
+        
+        def completar() -> List[List[float]]:
+            # Codificar y proyectar el lote completo
+            embeddings_base = lote.resultado() if lote is not None else codificar_en_proceso()
+            proyectados = self._project_batch(embeddings_base)
+            self._cache.put_many(zip(pendientes.keys(), proyectados))
+            calculados = dict(zip(pendientes.keys(), proyectados.tolist()))
+            
+            for i, cache_key in enumerate(cache_keys):
+                if resultados[i] is None:
+                    resultados[i] = calculados[cache_key]
+            
+            logger.debug(
+                "Lote de %d textos: %d en cache, %d codificados%s",
+                len(textos), len(textos) - len(pendientes), len(pendientes),
+                " en el pool" if lote is not None else ""
+            )
+            return resultados
+        
+        return EmbeddingsEnCurso(completar)
+
+
+# Instancia global del módulo (singleton pattern)
+_modulo_singleton = None
+_modulo_lock = threading.Lock()
+
+def obtener_modulo() -> EmbeddingModule:
+    """
+    Obtiene la instancia singleton del módulo
+    
+    Returns:
+        Instancia del módulo de embeddings
+    """
+    global _modulo_singleton
+    if _modulo_singleton is None:
+        # El calentamiento del arranque y la primera petición pueden coincidir
+        with _modulo_lock:
+            if _modulo_singleton is None:
+                _modulo_singleton = EmbeddingModule()
+    return _modulo_singleton
+
+
+def _consultas_cache() -> Optional[dict]:
+    if _modulo_singleton is None:
+        return None
+    stats = _modulo_singleton.estadisticas_cache()
+    return {
+        ("hit_memoria",): stats["hits_memoria"],
+        ("hit_disco",): stats["hits_disco"],
+        ("miss",): stats["misses"],
+    }
+
+
+def _ocupacion_cache() -> Optional[float]:
+    if _modulo_singleton is None:
+        return None
+    return _modulo_singleton.estadisticas_cache()["bytes"]
+
+
+# Tasa de aciertos del cache (PromQL): hits / (hits + miss)
+registrar_indicador(
+    "evalia_embedding_cache_consultas_total",
+    "Consultas al cache de embeddings por resultado",
+    _consultas_cache,
+    etiquetas=("resultado",),
+    tipo="counter"
+)
+registrar_indicador(
+    "evalia_embedding_cache_bytes",
+    "Bytes ocupados por el nivel en memoria del cache de embeddings",
+    _ocupacion_cache
+)
+
+
+# Función principal para integración con pipeline
+def generar_embedding(texto_limpio: str) -> List[float]:
+    """
+    Función de interfaz para el pipeline
+    
+    Args:
+        texto_limpio: Texto preprocesado a convertir en embedding
+        
+    Returns:
+        Lista de floats de EMBEDDING_DIM dimensiones
+    """
+    # Obtener instancia del módulo
+    modulo = obtener_modulo()
+    
+    # Generar embedding
+    return modulo.generar_embedding(texto_limpio)
+
+
+def generar_embeddings(textos_limpios: List[str]) -> List[List[float]]:
+    """
+    Función de interfaz para el pipeline (versión por lotes)
+    
+    Args:
+        textos_limpios: Textos preprocesados a convertir en embeddings
+        
+    Returns:
+        Lista de embeddings de EMBEDDING_DIM dimensiones, en el mismo orden que la entrada
+    """
+    modulo = obtener_modulo()
+    return modulo.generar_embeddings(textos_limpios)
+
+
+def enviar_embeddings(textos_limpios: List[str]) -> EmbeddingsEnCurso:
+    """
+    Función de interfaz para el pipeline (versión por lotes sin espera)
+    
+    Args:
+        textos_limpios: Textos preprocesados a convertir en embeddings
+        
+    Returns:
+        EmbeddingsEnCurso; su resultado() devuelve los embeddings en el orden de entrada
+    """
+    modulo = obtener_modulo()
+    return modulo.enviar_embeddings(textos_limpios)
\ No newline at end of file
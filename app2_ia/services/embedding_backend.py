@@ -0,0 +1,147 @@
+# services/embedding_backend.py
+"""
+Backends de inferencia del modelo de embeddings (EVALIA_EMBEDDING_BACKEND).
+
+  - "torch" (por defecto): SentenceTransformer en PyTorch fp32.
+  - "onnx": el mismo modelo exportado a ONNX con cuantización dinámica int8
+    de los pesos, ejecutado con ONNX Runtime en CPU. Se genera una vez a
+    partir del modelo en cache local con scripts/exportar_onnx.py.
+
+Los dos exponen encode() con la firma de SentenceTransformer que usa
+EmbeddingModule y devuelven los vectores base (768D) ya normalizados; la
+proyección y el cache no cambian. La versión del backend forma parte de la
+clave del cache de embeddings, así que cambiar de backend no sirve
+vectores calculados con el otro.
+
+Los vectores int8 no son idénticos a los fp32. Antes de cambiar de backend
+con datos ya cargados, scripts/paridad_embeddings.py mide la deriva
+(coseno con los vectores fp32 y recall de vecinos) para decidir si hace
+falta re-embeber la tabla.
+
+Configuración (variables de entorno):
+  - EVALIA_EMBEDDING_BACKEND: "torch" u "onnx"
+  - EVALIA_ONNX_DIR: directorio del modelo exportado
+  - EVALIA_ONNX_HILOS: hilos de ONNX Runtime por sesión (0 = los decide ONNX Runtime)
+"""
+
+import os
+import json
+import logging
+from typing import Any, Dict, List, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = {"torch", "onnx"}
+EMBEDDING_BACKEND = os.getenv("EVALIA_EMBEDDING_BACKEND", "torch").strip().lower()
+if EMBEDDING_BACKEND not in BACKENDS:
+    raise RuntimeError(
+        f"EVALIA_EMBEDDING_BACKEND inválido ('{EMBEDDING_BACKEND}'). "
+        f"Valores permitidos: {sorted(BACKENDS)}"
+    )
+
+ONNX_DIR = os.getenv("EVALIA_ONNX_DIR", "models/onnx/all-mpnet-base-v2-int8")
+ONNX_HILOS = int(os.getenv("EVALIA_ONNX_HILOS", "0"))
+
+# Fichero con la descripción del modelo exportado (lo escribe scripts/exportar_onnx.py)
+FICHERO_METADATOS = "metadatos.json"
+
+
+def leer_metadatos_onnx(directorio: str = ONNX_DIR) -> Dict[str, Any]:
+    """Metadatos del modelo exportado; error claro si aún no se ha exportado"""
+    ruta = os.path.join(directorio, FICHERO_METADATOS)
+    if not os.path.exists(ruta):
+        raise RuntimeError(
+            f"No hay modelo ONNX en {directorio}. Expórtalo con: "
+            f"python -m app2_ia.scripts.exportar_onnx --salida {directorio}"
+        )
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def version_backend(nombre: str = EMBEDDING_BACKEND, directorio: str = ONNX_DIR) -> str:
+    """
+    Identificador de los vectores que produce el backend (parte de la clave
+    del cache). Para ONNX incluye la huella del fichero exportado: una
+    nueva exportación invalida el cache.
+    """
+    if nombre == "torch":
+        return "torch-fp32"
+    metadatos = leer_metadatos_onnx(directorio)
+    return f"onnx-{metadatos['cuantizacion']}-{metadatos['huella'][:12]}"
+
+
+class BackendOnnx:
+    """
+    Modelo exportado por scripts/exportar_onnx.py: tokenizador de
+    transformers, transformer en ONNX Runtime y mean pooling + normalización
+    en NumPy (los mismos pasos que el pipeline de SentenceTransformer).
+    """
+
+    def __init__(self, directorio: str = ONNX_DIR, hilos: int = ONNX_HILOS):
+        # Importación diferida: solo se necesitan con este backend
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        metadatos = leer_metadatos_onnx(directorio)
+        opciones = ort.SessionOptions()
+        opciones.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if hilos > 0:
+            opciones.intra_op_num_threads = hilos
+        self._sesion = ort.InferenceSession(
+            os.path.join(directorio, metadatos["fichero"]), opciones, providers=["CPUExecutionProvider"]
+        )
+        self._entradas = {entrada.name for entrada in self._sesion.get_inputs()}
+        self._tokenizer = AutoTokenizer.from_pretrained(directorio)
+        self.dim = int(metadatos["dim"])
+        self.max_seq_length = int(metadatos["max_seq_length"])
+        self.normalizar = bool(metadatos["normalizar"])
+        logger.info(
+            "Modelo ONNX cargado desde %s (%s, %dD)", directorio, metadatos["cuantizacion"], self.dim
+        )
+
+    def _codificar_lote(self, textos: List[str]) -> np.ndarray:
+        tokens = self._tokenizer(
+            textos, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors="np"
+        )
+        entradas = {nombre: valor.astype(np.int64) for nombre, valor in tokens.items() if nombre in self._entradas}
+        ultima_capa = self._sesion.run(None, entradas)[0]
+
+        # Mean pooling sobre los tokens reales (sin relleno)
+        mascara = tokens["attention_mask"][..., None].astype(np.float32)
+        medias = (ultima_capa * mascara).sum(axis=1) / np.clip(mascara.sum(axis=1), 1e-9, None)
+        if self.normalizar:
+            medias /= np.clip(np.linalg.norm(medias, axis=1, keepdims=True), 1e-12, None)
+        return medias.astype(np.float32)
+
+    def encode(
+        self,
+        textos: Union[str, List[str]],
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        show_progress_bar: bool = False,
+        **_
+    ) -> np.ndarray:
+        """Misma interfaz que SentenceTransformer.encode (siempre devuelve NumPy)"""
+        unico = isinstance(textos, str)
+        lista = [textos] if unico else list(textos)
+        salida = np.empty((len(lista), self.dim), dtype=np.float32)
+        # Lotes de longitud parecida: menos relleno por lote
+        orden = np.argsort([-len(t) for t in lista], kind="stable")
+        for inicio in range(0, len(lista), batch_size):
+            indices = orden[inicio:inicio + batch_size]
+            salida[indices] = self._codificar_lote([lista[i] for i in indices])
+        return salida[0] if unico else salida
+
+
+def crear_backend(nombre: str, modelo_base: str, hilos: int = 0):
+    """
+    Crea el modelo con el backend pedido.
+    :param hilos: con "onnx", hilos de la sesión (0 = ONNX_HILOS); con
+        "torch" los hilos se fijan con torch.set_num_threads fuera de aquí.
+    """
+    if nombre == "onnx":
+        return BackendOnnx(ONNX_DIR, hilos or ONNX_HILOS)
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(modelo_base)
@@ -0,0 +1,281 @@
+# services/embedding_cache.py
+"""
+Cache de embeddings para el Módulo 3
+
+Dos niveles:
+  - Memoria: LRU acotado por bytes que guarda vectores float32 compactos.
+  - Disco (opcional): SQLite en modo WAL compartido por todos los workers
+    de la máquina, de modo que el cache sobrevive a reinicios. También es
+    LRU: cada fila guarda su último uso y la poda elimina las menos usadas.
+
+Las claves incluyen el nombre del modelo y la versión de la proyección,
+así que cambiar cualquiera de los dos invalida el cache automáticamente.
+"""
+
+import os
+import logging
+import sqlite3
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Sobrecoste aproximado por entrada (objeto ndarray, clave y nodo del OrderedDict)
+_OVERHEAD_ENTRADA = 200
+# Aciertos en disco que se acumulan antes de actualizar su último uso
+_LOTE_USOS_DISCO = 256
+
+
+def _ahora_ms() -> int:
+    """Marca de último uso: reloj de pared, común a todos los workers"""
+    return int(time.time() * 1000)
+
+
+class EmbeddingCache:
+    """
+    Cache LRU de embeddings acotado por bytes, con nivel opcional en disco.
+    Es seguro para uso concurrente desde varios hilos. La E/S de SQLite se
+    hace fuera del lock del LRU (con su propio lock, porque la conexión es
+    compartida): una lectura lenta en disco no bloquea los aciertos en memoria.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        max_bytes: int = 64 * 1024 * 1024,
+        ruta_disco: Optional[str] = None,
+        max_bytes_disco: int = 1024 * 1024 * 1024
+    ):
+        """
+        :param namespace: Prefijo de las claves (modelo + versión de proyección).
+        :param max_bytes: Tamaño máximo del nivel en memoria.
+        :param ruta_disco: Ruta del fichero SQLite; None desactiva el nivel en disco.
+        :param max_bytes_disco: Tamaño máximo aproximado del nivel en disco.
+        """
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.max_bytes_disco = max_bytes_disco
+        self._memoria: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Protege la conexión SQLite, los usos pendientes y el contador de
+        # escrituras. Orden: _lock_disco antes que _lock, nunca al revés
+        self._lock_disco = threading.Lock()
+        self._stats = {
+            "hits_memoria": 0, "hits_disco": 0, "misses": 0,
+            "evictions": 0, "evictions_disco": 0,
+        }
+        self._escrituras_disco = 0
+        # clave -> último uso de los aciertos en disco aún no guardados
+        self._usos_disco: Dict[str, int] = {}
+
+        self._disco: Optional[sqlite3.Connection] = None
+        if ruta_disco:
+            self._abrir_disco(ruta_disco)
+
+    # ------------------------------------------------------------------
+    # Claves
+    # ------------------------------------------------------------------
+    def clave(self, texto: str) -> str:
+        """Genera la clave de cache para un texto dentro del namespace"""
+        return hashlib.md5(f"{self.namespace}\x00{texto}".encode()).hexdigest()
+
+    # ------------------------------------------------------------------
+    # Nivel en disco
+    # ------------------------------------------------------------------
+    def _abrir_disco(self, ruta: str) -> None:
+        """Abre (o crea) la base SQLite compartida entre procesos"""
+        try:
+            directorio = os.path.dirname(ruta)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            conn = sqlite3.connect(ruta, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " clave TEXT PRIMARY KEY,"
+                " vector BLOB NOT NULL,"
+                " ultimo_uso INTEGER NOT NULL DEFAULT 0)"
+            )
+            columnas = {fila[1] for fila in conn.execute("PRAGMA table_info(embeddings)")}
+            if "ultimo_uso" not in columnas:
+                # Cache creado antes del LRU en disco: sus filas cuentan como
+                # las más antiguas hasta que se vuelvan a usar
+                conn.execute("ALTER TABLE embeddings ADD COLUMN ultimo_uso INTEGER NOT NULL DEFAULT 0")
+            # La poda recorre este índice y no lee los vectores
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_ultimo_uso ON embeddings (ultimo_uso)")
+            conn.commit()
+            self._disco = conn
+            logger.info("Cache de embeddings en disco: %s", ruta)
+        except sqlite3.Error as e:
+            logger.warning("No se pudo abrir el cache en disco (%s): %s", ruta, e)
+            self._disco = None
+
+    def _leer_disco(self, claves: List[str]) -> Dict[str, np.ndarray]:
+        if self._disco is None or not claves:
+            return {}
+        encontrados: Dict[str, np.ndarray] = {}
+        try:
+            with self._lock_disco:
+                # SQLite limita el número de parámetros por sentencia
+                for inicio in range(0, len(claves), 500):
+                    trozo = claves[inicio:inicio + 500]
+                    marcadores = ",".join("?" * len(trozo))
+                    filas = self._disco.execute(
+                        f"SELECT clave, vector FROM embeddings WHERE clave IN ({marcadores})",
+                        trozo
+                    ).fetchall()
+                    for clave, blob in filas:
+                        encontrados[clave] = np.frombuffer(blob, dtype=np.float32)
+                if encontrados:
+                    ahora = _ahora_ms()
+                    self._usos_disco.update(dict.fromkeys(encontrados, ahora))
+                    if len(self._usos_disco) >= _LOTE_USOS_DISCO:
+                        self._guardar_usos_disco()
+                        self._disco.commit()
+        except sqlite3.Error as e:
+            logger.warning("Error leyendo el cache en disco: %s", e)
+        return encontrados
+
+    def _guardar_usos_disco(self) -> None:
+        """Actualiza el último uso de los aciertos en disco acumulados (sin commit; requiere _lock_disco)"""
+        if not self._usos_disco:
+            return
+        usos, self._usos_disco = self._usos_disco, {}
+        self._disco.executemany(
+            "UPDATE embeddings SET ultimo_uso = ? WHERE clave = ?",
+            [(uso, clave) for clave, uso in usos.items()]
+        )
+
+    def _escribir_disco(self, items: List[Tuple[str, np.ndarray]]) -> None:
+        if self._disco is None or not items:
+            return
+        filas = [(clave, vector.tobytes(), _ahora_ms()) for clave, vector in items]
+        try:
+            with self._lock_disco:
+                self._disco.executemany(
+                    "INSERT OR REPLACE INTO embeddings (clave, vector, ultimo_uso) VALUES (?, ?, ?)",
+                    filas
+                )
+                self._disco.commit()
+                self._escrituras_disco += len(items)
+                if self._escrituras_disco >= 1000:
+                    self._escrituras_disco = 0
+                    self._podar_disco()
+        except sqlite3.Error as e:
+            logger.warning("Error escribiendo en el cache en disco: %s", e)
+
+    def _podar_disco(self) -> None:
+        """Elimina las entradas usadas hace más tiempo si el disco supera su límite (requiere _lock_disco)"""
+        # Los usos pendientes cuentan: sin ellos se podarían entradas recién leídas
+        self._guardar_usos_disco()
+        self._disco.commit()
+        fila = self._disco.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()
+        n, total = fila
+        if n == 0 or total <= self.max_bytes_disco:
+            return
+        media = total / n
+        sobrantes = int((total - self.max_bytes_disco) / media) + 1
+        eliminadas = self._disco.execute(
+            "DELETE FROM embeddings WHERE rowid IN "
+            "(SELECT rowid FROM embeddings ORDER BY ultimo_uso LIMIT ?)",
+            (sobrantes,)
+        ).rowcount
+        self._disco.commit()
+        with self._lock:
+            self._stats["evictions_disco"] += eliminadas
+        logger.info("Cache en disco podado: %s entradas eliminadas", eliminadas)
+
+    # ------------------------------------------------------------------
+    # Nivel en memoria
+    # ------------------------------------------------------------------
+    def _insertar_memoria(self, clave: str, vector: np.ndarray) -> None:
+        """Inserta en el LRU y expulsa las entradas menos usadas (requiere lock)"""
+        anterior = self._memoria.pop(clave, None)
+        if anterior is not None:
+            self._bytes -= anterior.nbytes + _OVERHEAD_ENTRADA
+        self._memoria[clave] = vector
+        self._bytes += vector.nbytes + _OVERHEAD_ENTRADA
+        while self._bytes > self.max_bytes and len(self._memoria) > 1:
+            _, expulsado = self._memoria.popitem(last=False)
+            self._bytes -= expulsado.nbytes + _OVERHEAD_ENTRADA
+            self._stats["evictions"] += 1
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+    def get_many(self, claves: Iterable[str]) -> Dict[str, np.ndarray]:
+        """
+        Busca varias claves; primero en memoria y después en disco.
+        :return: Diccionario clave -> vector float32 con los aciertos.
+        """
+        encontrados: Dict[str, np.ndarray] = {}
+        faltan: List[str] = []
+        with self._lock:
+            for clave in claves:
+                vector = self._memoria.get(clave)
+                if vector is not None:
+                    self._memoria.move_to_end(clave)
+                    self._stats["hits_memoria"] += 1
+                    encontrados[clave] = vector
+                else:
+                    faltan.append(clave)
+            if faltan and self._disco is None:
+                self._stats["misses"] += len(faltan)
+                return encontrados
+        if not faltan:
+            return encontrados
+
+        # Fuera del lock: las demás peticiones siguen leyendo de memoria
+        de_disco = self._leer_disco(faltan)
+        with self._lock:
+            for clave, vector in de_disco.items():
+                self._insertar_memoria(clave, vector)
+                encontrados[clave] = vector
+            self._stats["hits_disco"] += len(de_disco)
+            self._stats["misses"] += len(faltan) - len(de_disco)
+        return encontrados
+
+    def get(self, clave: str) -> Optional[np.ndarray]:
+        """Busca una clave en el cache"""
+        return self.get_many([clave]).get(clave)
+
+    def put_many(self, items: Iterable[Tuple[str, np.ndarray]]) -> None:
+        """Guarda varios vectores (se convierten a float32) en ambos niveles"""
+        compactos = [
+            (clave, np.ascontiguousarray(vector, dtype=np.float32))
+            for clave, vector in items
+        ]
+        with self._lock:
+            for clave, vector in compactos:
+                self._insertar_memoria(clave, vector)
+        self._escribir_disco(compactos)
+
+    def put(self, clave: str, vector: np.ndarray) -> None:
+        """Guarda un vector en el cache"""
+        self.put_many([(clave, vector)])
+
+    def stats(self) -> Dict[str, int]:
+        """Devuelve las estadísticas de uso del cache"""
+        with self._lock:
+            return {
+                **self._stats,
+                "entradas": len(self._memoria),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disco": self._disco is not None,
+            }
+
+    def clear(self) -> None:
+        """Vacía el nivel en memoria (el nivel en disco se conserva)"""
+        with self._lock:
+            self._memoria.clear()
+            self._bytes = 0
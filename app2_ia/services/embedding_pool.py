@@ -0,0 +1,271 @@
+# services/embedding_pool.py
+"""
+Pool de procesos para codificar embeddings en varios núcleos.
+
+Un único proceso de uvicorn ejecuta SentenceTransformer.encode en un solo
+intérprete y los hilos de torch compiten con el bucle de eventos. Con
+EVALIA_EMBEDDING_PROCESOS > 0, los lotes grandes (ingesta y búsqueda por
+lotes) se reparten entre procesos trabajadores:
+  - Cada trabajador carga el modelo una sola vez (initializer), con el
+    mismo backend que el proceso principal, y se limita a
+    EVALIA_EMBEDDING_HILOS_PROCESO hilos (torch u ONNX Runtime), para que
+    N procesos ocupen N núcleos sin sobresuscribir la CPU.
+  - Los vectores vuelven por memoria compartida: el proceso principal crea
+    un segmento por lote, cada trabajador escribe su tramo de filas y solo
+    se envía por pickle la lista de textos de ida.
+  - enviar() no bloquea: devuelve un LoteEnCurso cuyo resultado() espera a
+    los trabajadores. La ingesta lo usa para limpiar e insertar otros
+    bloques mientras se codifica el actual.
+
+Sin pool (EVALIA_EMBEDDING_PROCESOS=0, por defecto) el modelo se ejecuta en
+el propio proceso, como hasta ahora. Las consultas de un solo texto
+siempre se codifican en el proceso principal: el viaje al pool costaría
+más que la inferencia.
+
+Configuración (variables de entorno):
+  - EVALIA_EMBEDDING_PROCESOS: procesos trabajadores (0 desactiva el pool)
+  - EVALIA_EMBEDDING_HILOS_PROCESO: hilos de torch por trabajador
+  - EVALIA_EMBEDDING_TEXTOS_TAREA: textos por tarea enviada a un trabajador
+"""
+
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from app2_ia.utils.metricas import registrar_indicador
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_PROCESOS = int(os.getenv("EVALIA_EMBEDDING_PROCESOS", "0"))
+EMBEDDING_HILOS_PROCESO = int(os.getenv("EVALIA_EMBEDDING_HILOS_PROCESO", "1"))
+EMBEDDING_TEXTOS_TAREA = int(os.getenv("EVALIA_EMBEDDING_TEXTOS_TAREA", "32"))
+
+
+# --------------------------------------------------
+# Lado del trabajador
+# --------------------------------------------------
+
+_modelo_trabajador = None
+
+
+def _inicializar_trabajador(backend: str, nombre_modelo: str, hilos: int) -> None:
+    """Initializer de cada proceso: limita los hilos y carga el modelo una vez"""
+    global _modelo_trabajador
+    from app2_ia.services.embedding_backend import crear_backend
+
+    hilos = max(1, hilos)
+    if backend == "torch":
+        import torch
+        torch.set_num_threads(hilos)
+    _modelo_trabajador = crear_backend(backend, nombre_modelo, hilos)
+
+
+def _codificar_tramo(
+    textos: List[str],
+    nombre_segmento: str,
+    forma: Tuple[int, int],
+    inicio: int,
+    batch_size: int
+) -> int:
+    """Codifica `textos` y los escribe en las filas [inicio, inicio + len) del segmento compartido"""
+    segmento = shared_memory.SharedMemory(name=nombre_segmento)
+    try:
+        destino = np.ndarray(forma, dtype=np.float32, buffer=segmento.buf)
+        destino[inicio:inicio + len(textos)] = _modelo_trabajador.encode(
+            textos, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False
+        )
+        del destino  # Liberar la vista antes de cerrar el segmento
+    finally:
+        segmento.close()
+    return len(textos)
+
+
+def _calentar_trabajador() -> int:
+    return os.getpid()
+
+
+# --------------------------------------------------
+# Lado del proceso principal
+# --------------------------------------------------
+
+class LoteEnCurso:
+    """
+    Lote enviado al pool. resultado() espera a que terminen sus tareas y
+    devuelve la matriz (n, dim) float32.
+    """
+
+    def __init__(
+        self,
+        tareas: List[Future],
+        segmento: Optional[shared_memory.SharedMemory],
+        forma: Tuple[int, int],
+        alternativa: Callable[[], np.ndarray],
+        al_terminar: Callable[[], None] = lambda: None
+    ):
+        self._tareas = tareas
+        self._segmento = segmento
+        self._forma = forma
+        self._alternativa = alternativa
+        self._al_terminar = al_terminar
+        self._resultado: Optional[np.ndarray] = None
+
+    def resultado(self) -> np.ndarray:
+        if self._resultado is not None:
+            return self._resultado
+        try:
+            for tarea in self._tareas:
+                tarea.result()
+            matriz = np.ndarray(self._forma, dtype=np.float32, buffer=self._segmento.buf)
+            # Copia propia: el segmento se libera a continuación
+            self._resultado = matriz.copy()
+            del matriz
+        except BrokenProcessPool as e:
+            # Un trabajador murió (p. ej. sin memoria): este lote se codifica aquí
+            logger.error("Pool de embeddings caído (%s); lote de %d textos codificado en el proceso", e, self._forma[0])
+            self._resultado = self._alternativa()
+        finally:
+            self._liberar()
+        return self._resultado
+
+    def _liberar(self) -> None:
+        if self._segmento is not None:
+            self._segmento.close()
+            self._segmento.unlink()
+            self._segmento = None
+            self._al_terminar()
+
+    def __del__(self):
+        # Lote abandonado (error en otra etapa): no dejar el segmento en /dev/shm.
+        # Los trabajadores que ya lo tengan abierto conservan su mapeo.
+        try:
+            for tarea in self._tareas:
+                tarea.cancel()
+            self._liberar()
+        except Exception:
+            pass
+
+
+class PoolEmbeddings:
+    """Procesos trabajadores con el modelo cargado; reparte cada lote en tareas"""
+
+    def __init__(
+        self,
+        backend: str,
+        nombre_modelo: str,
+        dim: int,
+        procesos: int = EMBEDDING_PROCESOS,
+        hilos_por_proceso: int = EMBEDDING_HILOS_PROCESO,
+        textos_por_tarea: int = EMBEDDING_TEXTOS_TAREA
+    ):
+        self.backend = backend
+        self.nombre_modelo = nombre_modelo
+        self.dim = dim
+        self.procesos = procesos
+        self.hilos_por_proceso = hilos_por_proceso
+        self.textos_por_tarea = max(1, textos_por_tarea)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._tareas_en_curso = 0
+
+    def _obtener_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            # Un pool roto (trabajador muerto) no acepta más tareas: se recrea
+            if self._executor is None or getattr(self._executor, "_broken", False):
+                # spawn: hacer fork de un proceso con hilos de torch no es seguro
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.procesos,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_inicializar_trabajador,
+                    initargs=(self.backend, self.nombre_modelo, self.hilos_por_proceso)
+                )
+                logger.info(
+                    "Pool de embeddings: %d procesos x %d hilos (modelo %s, backend %s)",
+                    self.procesos, self.hilos_por_proceso, self.nombre_modelo, self.backend
+                )
+            return self._executor
+
+    def calentar(self) -> None:
+        """Arranca todos los trabajadores y espera a que tengan el modelo cargado"""
+        executor = self._obtener_executor()
+        pids = {f.result() for f in [executor.submit(_calentar_trabajador) for _ in range(self.procesos)]}
+        logger.info("Pool de embeddings listo (%d procesos arrancados)", len(pids))
+
+    def enviar(
+        self,
+        textos: List[str],
+        batch_size: int,
+        alternativa: Callable[[], np.ndarray]
+    ) -> LoteEnCurso:
+        """
+        Reparte `textos` en tareas de textos_por_tarea y las envía sin esperar.
+        `alternativa` codifica el lote en el proceso si el pool se cae.
+        """
+        forma = (len(textos), self.dim)
+        segmento = shared_memory.SharedMemory(create=True, size=max(1, forma[0] * forma[1] * 4))
+        try:
+            executor = self._obtener_executor()
+            tareas = [
+                executor.submit(
+                    _codificar_tramo, textos[inicio:inicio + self.textos_por_tarea],
+                    segmento.name, forma, inicio, batch_size
+                )
+                for inicio in range(0, len(textos), self.textos_por_tarea)
+            ]
+        except BaseException:
+            segmento.close()
+            segmento.unlink()
+            raise
+        with self._lock:
+            self._tareas_en_curso += len(tareas)
+        return LoteEnCurso(tareas, segmento, forma, alternativa, lambda: self._terminar(len(tareas)))
+
+    def _terminar(self, tareas: int) -> None:
+        with self._lock:
+            self._tareas_en_curso -= tareas
+
+    @property
+    def tareas_en_curso(self) -> int:
+        return self._tareas_en_curso
+
+    def cerrar(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+
+# Instancia global (singleton pattern); None si el pool está desactivado
+_pool_singleton: Optional[PoolEmbeddings] = None
+_pool_lock = threading.Lock()
+
+
+def obtener_pool(backend: str, nombre_modelo: str, dim: int) -> Optional[PoolEmbeddings]:
+    """Pool de embeddings del proceso, o None con EVALIA_EMBEDDING_PROCESOS=0"""
+    global _pool_singleton
+    if EMBEDDING_PROCESOS <= 0:
+        return None
+    if _pool_singleton is None:
+        with _pool_lock:
+            if _pool_singleton is None:
+                _pool_singleton = PoolEmbeddings(backend, nombre_modelo, dim)
+    return _pool_singleton
+
+
+def cerrar_pool() -> None:
+    """Detiene los trabajadores (evento de shutdown de la aplicación)"""
+    if _pool_singleton is not None:
+        _pool_singleton.cerrar()
+
+
+registrar_indicador(
+    "evalia_embedding_pool_tareas",
+    "Tareas de codificación enviadas al pool de embeddings y aún sin recoger",
+    lambda: _pool_singleton.tareas_en_curso if _pool_singleton is not None else None
+)
@@ -1,111 +1,517 @@
-import os
-import logging
-import pandas as pd
-from datetime import datetime
-from typing import Tuple, List
-
-from app2_ia.utils.validacion import validar_filas
-from app2_ia.utils.limpieza import limpiar_texto_para_embedding
-from app2_ia.services.embedding import generar_embedding
-from app2_ia.models.schemas import CandidatoCrudo, ResultadoCarga
-from app2_ia.services.vector_db import insertar_en_vectordb, existe_candidato
-
-
-logger = logging.getLogger(__name__)
-
-def cargar_y_validar_csv(file) -> Tuple[List[CandidatoCrudo], List[str]]:
-    """
-    Lee un CSV desde UploadFile, valida filas y devuelve:
-      - Lista de CandidatoCrudo ya tipados.
-      - Lista de errores (strings) si los hay.
-    """
-    # Leemos el CSV
-    df = pd.read_csv(file.file)
-
-    # Validamos con nuestra función; resulta en dos listas de dicts y errores
-    filas_validas, errores = validar_filas(df)
-
-    # Convertimos cada fila válida en un objeto Pydantic
-    candidatos: List[CandidatoCrudo] = []
-    for fila in filas_validas:
-        try:
-            candidato = CandidatoCrudo(
-                candidato_id=fila["candidato_id"],
-                puesto=fila["puesto"],
-                fortalezas=fila["fortalezas"],
-                debilidades=fila["debilidades"],
-                valoracion_gpt=fila["valoracion_gpt"]
-            )
-            candidatos.append(candidato)
-        except Exception as e:
-            # Capturamos cualquier error inesperado de Pydantic
-            error_msg = f"Error al parsear fila {fila}: {e}"
-            logger.error(error_msg)
-            errores.append(error_msg)
-
-    # Si hubo errores, los volcamos a un archivo de log
-    if errores:
-        os.makedirs("logs", exist_ok=True)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        ruta_log = os.path.join("logs", f"errores_{timestamp}.log")
-        with open(ruta_log, "w", encoding="utf-8") as f:
-            for err in errores:
-                f.write(err + "\n")
-        logger.info(f"Log de errores guardado en {ruta_log}")
-
-    return candidatos, errores
-
-
-def procesar_y_guardar_candidatos(candidatos: List[CandidatoCrudo]) -> ResultadoCarga:
-    """
-    Recorre cada candidato:
-      1. Limpia su texto con SpaCy.
-      2. Genera embedding.
-      3. Inserta en la BD vectorial (pgvector).
-    Devuelve un ResultadoCarga con totales y datos procesados.
-    """
-    insertados = 0
-    descartados = 0
-    duplicados: List[str] = []
-    datos_procesados: List[dict] = []
-    for candidato in candidatos:
-        if existe_candidato(int(candidato.candidato_id)):
-            msg = f"Candidato duplicado (ID: {candidato.candidato_id})"
-            logger.warning(msg)
-            duplicados.append(str(candidato.candidato_id))
-            descartados += 1
-            continue
-        
-        # 1. Preprocesamiento
-        texto_limpio = limpiar_texto_para_embedding(candidato.valoracion_gpt)
-        logger.debug(f"Texto limpio para {candidato.candidato_id}: {texto_limpio[:50]}...")
-
-        # 2. Generación de embedding
-        embedding = generar_embedding(texto_limpio)
-        logger.debug(f"Embedding generado para {candidato.candidato_id}")
-
-        # 3. Preparar objeto para BD vectorial
-        objeto_final = {
-            "candidato_id": candidato.candidato_id,
-            "puesto": candidato.puesto,
-            "embedding": embedding,
-            "metadata": {
-                "fortalezas": candidato.fortalezas,
-                "debilidades": candidato.debilidades,
-                "fuente": "entrevista GPT"
-            }
-        }
-
-        # 4. Inserción en la BD
-        insertar_en_vectordb(objeto_final)
-        insertados += 1
-        datos_procesados.append(candidato.dict())  # Solo los que se insertan
-        logger.info(f"Candidato {candidato.candidato_id} insertado en VectorDB")
-
-
-    return ResultadoCarga(
-        validados=insertados,
-        descartados=0,
-        datos=datos_procesados,
-        duplicados= duplicados
-    )
+import os
+import queue
+import asyncio
+import logging
+import threading
+import pandas as pd
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, Tuple, List, Optional, Set, TextIO
+
+from app2_ia.utils.validacion import validar_filas
+from app2_ia.utils.limpieza import limpiar_textos_para_embedding
+from app2_ia.services.embedding import EmbeddingsEnCurso, enviar_embeddings
+from app2_ia.services.clustering_service import asignar_clusters
+from app2_ia.services.result_cache import incrementar_version_datos
+from app2_ia.models.schemas import CandidatoCrudo, ResultadoCarga
+from app2_ia.services.vector_store import obtener_store
+from app2_ia.utils.metricas import BLOQUES_INGESTA, CANDIDATOS_INGESTA, medir_etapa
+
+
+logger = logging.getLogger(__name__)
+
+# Número de candidatos que se leen, deduplican, embeben e insertan juntos
+INGEST_CHUNK_SIZE = int(os.getenv("EVALIA_INGEST_CHUNK_SIZE", "500"))
+# Bloques leídos y validados por adelantado mientras se procesa el actual
+INGEST_PREFETCH = int(os.getenv("EVALIA_INGEST_PREFETCH", "2"))
+
+# Callback de progreso: recibe la etapa ("validadas", "errores", "embebidas",
+# "insertadas" o "duplicados") y el número de filas que acaban de completarla
+Progreso = Callable[[str, int], None]
+
+
+def _sin_progreso(etapa: str, cantidad: int) -> None:
+    pass
+
+
+def _filas_a_candidatos(filas_validas: List[dict], errores: List[str]) -> List[CandidatoCrudo]:
+    """Convierte cada fila válida en un objeto Pydantic (añade a errores las que fallen)"""
+    candidatos: List[CandidatoCrudo] = []
+    for fila in filas_validas:
+        try:
+            candidato = CandidatoCrudo(
+                candidato_id=fila["candidato_id"],
+                puesto=fila["puesto"],
+                fortalezas=fila["fortalezas"],
+                debilidades=fila["debilidades"],
+                valoracion_gpt=fila["valoracion_gpt"]
+            )
+            candidatos.append(candidato)
+        except Exception as e:
+            # Capturamos cualquier error inesperado de Pydantic
+            error_msg = f"Error al parsear fila {fila}: {e}"
+            logger.error(error_msg)
+            errores.append(error_msg)
+    return candidatos
+
+
+class _LogErrores:
+    """
+    Vuelca los errores de validación a logs/errores_TIMESTAMP.log a medida
+    que aparecen. El fichero solo se crea si hay algún error.
+    """
+
+    def __init__(self):
+        self._fichero: Optional[TextIO] = None
+        self.ruta: Optional[str] = None
+
+    def escribir(self, errores: List[str]) -> None:
+        if not errores:
+            return
+        if self._fichero is None:
+            os.makedirs("logs", exist_ok=True)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            self.ruta = os.path.join("logs", f"errores_{timestamp}.log")
+            self._fichero = open(self.ruta, "w", encoding="utf-8")
+        for err in errores:
+            self._fichero.write(err + "\n")
+
+    def cerrar(self) -> None:
+        if self._fichero is not None:
+            self._fichero.close()
+            self._fichero = None
+            logger.info("Log de errores guardado en %s", self.ruta)
+
+
+def leer_csv_por_bloques(
+    fuente,
+    chunksize: int = INGEST_CHUNK_SIZE
+) -> Iterator[Tuple[List[CandidatoCrudo], List[str]]]:
+    """
+    Lee el CSV en bloques de `chunksize` filas y valida cada bloque.
+    El número de línea de los errores se mantiene entre bloques porque
+    pandas continúa el índice de un bloque al siguiente. Las columnas se leen
+    como texto para que la inferencia de tipos no dependa de cómo caen los
+    bloques (un ID vacío convertiría a float solo los IDs de su bloque).
+
+    Yields:
+      (candidatos válidos del bloque, errores del bloque)
+    """
+    for df in pd.read_csv(fuente, chunksize=chunksize, dtype=str):
+        with medir_etapa("ingesta", "validacion"):
+            filas_validas, errores = validar_filas(df)
+            candidatos = _filas_a_candidatos(filas_validas, errores)
+        if errores:
+            CANDIDATOS_INGESTA.inc(len(errores), resultado="error")
+        yield candidatos, errores
+
+
+def cargar_y_validar_csv(file) -> Tuple[List[CandidatoCrudo], List[str]]:
+    """
+    Lee un CSV desde UploadFile, valida filas y devuelve:
+      - Lista de CandidatoCrudo ya tipados.
+      - Lista de errores (strings) si los hay.
+    Carga el fichero completo en memoria; para ficheros grandes usar
+    procesar_csv_en_streaming.
+    """
+    candidatos: List[CandidatoCrudo] = []
+    errores: List[str] = []
+    log_errores = _LogErrores()
+    try:
+        for candidatos_bloque, errores_bloque in leer_csv_por_bloques(file.file):
+            candidatos.extend(candidatos_bloque)
+            errores.extend(errores_bloque)
+            log_errores.escribir(errores_bloque)
+    finally:
+        log_errores.cerrar()
+
+    return candidatos, errores
+
+
+class _EstadoCarga:
+    """Acumula el resultado de una carga que se procesa por bloques"""
+
+    def __init__(self):
+        self.insertados = 0
+        self.duplicados: List[str] = []
+        self.datos_procesados: List[dict] = []
+        self.ids_vistos = set()
+
+    def resultado(self) -> ResultadoCarga:
+        return ResultadoCarga(
+            validados=self.insertados,
+            descartados=0,
+            datos=self.datos_procesados,
+            duplicados= self.duplicados
+        )
+
+
+def _registrar_duplicados(estado: _EstadoCarga, duplicados: List[str]) -> None:
+    """Acumula los duplicados de un bloque con un único aviso agregado"""
+    if not duplicados:
+        return
+    estado.duplicados.extend(duplicados)
+    CANDIDATOS_INGESTA.inc(len(duplicados), resultado="duplicado")
+    logger.warning(
+        "%d candidatos duplicados en el bloque (IDs: %s%s)",
+        len(duplicados), ", ".join(duplicados[:10]), "..." if len(duplicados) > 10 else ""
+    )
+
+
+class _BloqueEnCurso:
+    """Bloque deduplicado y limpio cuyos embeddings se están generando"""
+
+    def __init__(self, pendientes: List[CandidatoCrudo], embeddings: EmbeddingsEnCurso):
+        self.pendientes = pendientes
+        self.embeddings = embeddings
+
+
+def _descartar_duplicados(
+    bloque: List[CandidatoCrudo],
+    existentes: Set[int],
+    estado: _EstadoCarga,
+    progreso: Progreso
+) -> List[CandidatoCrudo]:
+    """
+    Candidatos del bloque que no están repetidos en el CSV ni ya en BD (`existentes`).
+
+    Contrato: si un candidato_id aparece varias veces en el CSV se inserta la
+    primera aparición y las siguientes se cuentan como duplicadas. Es lo que
+    hacía la inserción fila a fila (cada fila se insertaba antes de comprobar
+    la siguiente); al insertar por bloques hay que recordar los IDs ya vistos,
+    porque la primera aparición aún no está en BD.
+    """
+    pendientes: List[CandidatoCrudo] = []
+    duplicados: List[str] = []
+    for candidato in bloque:
+        cid = int(candidato.candidato_id)
+        if cid in estado.ids_vistos or cid in existentes:
+            duplicados.append(str(candidato.candidato_id))
+            continue
+        estado.ids_vistos.add(cid)
+        pendientes.append(candidato)
+
+    _registrar_duplicados(estado, duplicados)
+    progreso("duplicados", len(duplicados))
+    return pendientes
+
+
+def _enviar_bloque(pendientes: List[CandidatoCrudo]) -> _BloqueEnCurso:
+    """Limpia el texto del bloque y envía los embeddings sin esperar"""
+    # 2. Preprocesamiento (todo el bloque en una pasada de nlp.pipe)
+    with medir_etapa("ingesta", "limpieza"):
+        textos_limpios = limpiar_textos_para_embedding(
+            [candidato.valoracion_gpt for candidato in pendientes]
+        )
+
+    # 3. Generación de embeddings en lote (sin esperar)
+    return _BloqueEnCurso(pendientes, enviar_embeddings(textos_limpios))
+
+
+def _preparar_bloque(
+    bloque: List[CandidatoCrudo],
+    estado: _EstadoCarga,
+    progreso: Progreso = _sin_progreso
+) -> Optional[_BloqueEnCurso]:
+    """
+    Primera mitad de un bloque:
+      1. Descarta duplicados (repetidos en el CSV o ya en BD, con una sola consulta).
+      2. Limpia su texto con SpaCy.
+      3. Envía los textos a generar embeddings sin esperar (pool de procesos
+         si EVALIA_EMBEDDING_PROCESOS > 0).
+    Devuelve None si no queda ningún candidato nuevo.
+    """
+    # 1. Filtrar duplicados antes de hacer el trabajo costoso
+    BLOQUES_INGESTA.inc()
+    with medir_etapa("ingesta", "duplicados"):
+        existentes = obtener_store().existentes(int(c.candidato_id) for c in bloque)
+    pendientes = _descartar_duplicados(bloque, existentes, estado, progreso)
+    if not pendientes:
+        return None
+    return _enviar_bloque(pendientes)
+
+
+async def _preparar_bloque_async(
+    bloque: List[CandidatoCrudo],
+    estado: _EstadoCarga,
+    progreso: Progreso = _sin_progreso
+) -> Optional[_BloqueEnCurso]:
+    """_preparar_bloque esperando la consulta de duplicados y con la limpieza en un hilo"""
+    BLOQUES_INGESTA.inc()
+    with medir_etapa("ingesta", "duplicados"):
+        existentes = await obtener_store().existentes_async([int(c.candidato_id) for c in bloque])
+    pendientes = _descartar_duplicados(bloque, existentes, estado, progreso)
+    if not pendientes:
+        return None
+    return await asyncio.to_thread(_enviar_bloque, pendientes)
+
+
+def _objetos_bloque(en_curso: _BloqueEnCurso, progreso: Progreso) -> List[dict]:
+    """Espera los embeddings del bloque, les asigna su cluster y prepara las filas a insertar"""
+    with medir_etapa("ingesta", "embedding"):
+        embeddings = en_curso.embeddings.resultado()
+    logger.debug("Embeddings generados para %d candidatos", len(embeddings))
+    progreso("embebidas", len(embeddings))
+    with medir_etapa("ingesta", "clusters"):
+        clusters = asignar_clusters(embeddings)
+
+    # Preparar objetos para BD vectorial
+    return [
+        {
+            "candidato_id": candidato.candidato_id,
+            "puesto": candidato.puesto,
+            "embedding": embedding,
+            "cluster_id": cluster_id,
+            "metadata": {
+                "fortalezas": candidato.fortalezas,
+                "debilidades": candidato.debilidades,
+                "fuente": "entrevista GPT"
+            }
+        }
+        for candidato, embedding, cluster_id in zip(en_curso.pendientes, embeddings, clusters)
+    ]
+
+
+def _registrar_insercion(
+    pendientes: List[CandidatoCrudo],
+    ids_insertados: Set[int],
+    estado: _EstadoCarga,
+    progreso: Progreso
+) -> None:
+    """Acumula en el estado los candidatos insertados y los que ganó una carga concurrente"""
+    if ids_insertados:
+        # Hay candidatos nuevos: los resultados de búsqueda cacheados ya no valen
+        incrementar_version_datos()
+    concurrentes: List[str] = []
+    for candidato in pendientes:
+        if int(candidato.candidato_id) in ids_insertados:
+            estado.insertados += 1
+            estado.datos_procesados.append(candidato.dict())  # Solo los que se insertan
+        else:
+            # Insertado entretanto por otra carga concurrente
+            concurrentes.append(str(candidato.candidato_id))
+    _registrar_duplicados(estado, concurrentes)
+    progreso("insertadas", len(ids_insertados))
+    progreso("duplicados", len(concurrentes))
+    CANDIDATOS_INGESTA.inc(len(ids_insertados), resultado="insertado")
+    logger.info("Bloque insertado en VectorDB: %d candidatos", len(ids_insertados))
+
+
+def _completar_bloque(
+    en_curso: _BloqueEnCurso,
+    estado: _EstadoCarga,
+    progreso: Progreso = _sin_progreso
+) -> None:
+    """
+    Segunda mitad de un bloque:
+      4. Espera sus embeddings y les asigna su cluster global.
+      5. Inserta el bloque en el almacén de vectores (pgvector: una transacción).
+    """
+    objetos = _objetos_bloque(en_curso, progreso)
+
+    # Inserción del bloque en la BD
+    with medir_etapa("ingesta", "insercion"):
+        ids_insertados = obtener_store().insertar_lote(objetos)
+    _registrar_insercion(en_curso.pendientes, ids_insertados, estado, progreso)
+
+
+async def _completar_bloque_async(
+    en_curso: _BloqueEnCurso,
+    estado: _EstadoCarga,
+    progreso: Progreso = _sin_progreso
+) -> None:
+    """_completar_bloque con la espera de embeddings en un hilo y la inserción esperada"""
+    objetos = await asyncio.to_thread(_objetos_bloque, en_curso, progreso)
+    with medir_etapa("ingesta", "insercion"):
+        ids_insertados = await obtener_store().insertar_lote_async(objetos)
+    _registrar_insercion(en_curso.pendientes, ids_insertados, estado, progreso)
+
+
+def _procesar_bloque(
+    bloque: List[CandidatoCrudo],
+    estado: _EstadoCarga,
+    progreso: Progreso = _sin_progreso
+) -> None:
+    """Procesa un bloque completo: _preparar_bloque y, a continuación, _completar_bloque"""
+    en_curso = _preparar_bloque(bloque, estado, progreso)
+    if en_curso is not None:
+        _completar_bloque(en_curso, estado, progreso)
+
+
+def _procesar_bloques(
+    bloques: Iterable[List[CandidatoCrudo]],
+    estado: _EstadoCarga,
+    progreso: Progreso = _sin_progreso
+) -> None:
+    """
+    Procesa los bloques con uno en vuelo: mientras se generan los
+    embeddings del bloque N, se limpia el N+1 y después se inserta el N.
+    Con el pool de procesos, la CPU del proceso principal (spaCy, BD) y
+    la de los trabajadores (modelo) se usan a la vez.
+    """
+    anterior: Optional[_BloqueEnCurso] = None
+    for bloque in bloques:
+        actual = _preparar_bloque(bloque, estado, progreso)
+        if anterior is not None:
+            _completar_bloque(anterior, estado, progreso)
+        anterior = actual
+    if anterior is not None:
+        _completar_bloque(anterior, estado, progreso)
+
+
+async def _procesar_bloques_async(
+    bloques: Iterator[List[CandidatoCrudo]],
+    estado: _EstadoCarga,
+    progreso: Progreso = _sin_progreso
+) -> None:
+    """
+    _procesar_bloques para el bucle de eventos: la lectura del siguiente
+    bloque y las etapas de CPU van en hilos y las consultas a la BD se
+    esperan, con el mismo bloque en vuelo.
+    """
+    anterior: Optional[_BloqueEnCurso] = None
+    while True:
+        bloque = await asyncio.to_thread(next, bloques, None)
+        if bloque is None:
+            break
+        actual = await _preparar_bloque_async(bloque, estado, progreso)
+        if anterior is not None:
+            await _completar_bloque_async(anterior, estado, progreso)
+        anterior = actual
+    if anterior is not None:
+        await _completar_bloque_async(anterior, estado, progreso)
+
+
+def procesar_y_guardar_candidatos(candidatos: List[CandidatoCrudo]) -> ResultadoCarga:
+    """
+    Procesa una lista de candidatos ya validados en bloques de INGEST_CHUNK_SIZE
+    (ver _procesar_bloques). Devuelve un ResultadoCarga con totales y datos procesados.
+    """
+    estado = _EstadoCarga()
+    _procesar_bloques(
+        (candidatos[inicio:inicio + INGEST_CHUNK_SIZE] for inicio in range(0, len(candidatos), INGEST_CHUNK_SIZE)),
+        estado
+    )
+    return estado.resultado()
+
+
+_FIN = object()
+
+
+class _ErrorProductor:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def _prefetch(iterable: Iterable, max_pendientes: int) -> Iterator:
+    """
+    Consume `iterable` en un hilo productor y entrega sus elementos a través
+    de una cola acotada: el productor se adelanta como mucho `max_pendientes`
+    elementos (contrapresión) y las excepciones se propagan al consumidor.
+    """
+    if max_pendientes <= 0:
+        yield from iterable
+        return
+
+    cola: "queue.Queue" = queue.Queue(maxsize=max_pendientes)
+    detener = threading.Event()
+
+    def poner(item) -> bool:
+        while not detener.is_set():
+            try:
+                cola.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def productor():
+        try:
+            for item in iterable:
+                if not poner(item):
+                    return
+            poner(_FIN)
+        except BaseException as e:
+            poner(_ErrorProductor(e))
+
+    hilo = threading.Thread(target=productor, name="ingesta-lectura", daemon=True)
+    hilo.start()
+    try:
+        while True:
+            item = cola.get()
+            if item is _FIN:
+                break
+            if isinstance(item, _ErrorProductor):
+                raise item.error
+            yield item
+    finally:
+        detener.set()
+        hilo.join(timeout=5)
+
+
+def _bloques_validados(
+    fuente,
+    errores: List[str],
+    log_errores: _LogErrores,
+    progreso: Progreso
+) -> Iterator[List[CandidatoCrudo]]:
+    """Candidatos válidos de cada bloque del CSV (leído por adelantado); acumula los errores"""
+    for candidatos_bloque, errores_bloque in _prefetch(leer_csv_por_bloques(fuente), INGEST_PREFETCH):
+        errores.extend(errores_bloque)
+        log_errores.escribir(errores_bloque)
+        progreso("validadas", len(candidatos_bloque))
+        progreso("errores", len(errores_bloque))
+        yield candidatos_bloque
+
+
+def _resultado_streaming(estado: _EstadoCarga, errores: List[str]) -> ResultadoCarga:
+    resultado = estado.resultado()
+    resultado.descartados = len(errores)
+    resultado.errores = errores
+    return resultado
+
+
+def procesar_csv_en_streaming(fuente, progreso: Progreso = _sin_progreso) -> ResultadoCarga:
+    """
+    Pipeline de carga con memoria acotada. El CSV se lee por bloques de
+    INGEST_CHUNK_SIZE filas y cada bloque pasa por validación, limpieza,
+    embedding e inserción antes de leer más allá de INGEST_PREFETCH bloques
+    (más el bloque cuyos embeddings se están generando).
+    El pico de memoria depende del tamaño de bloque, no del fichero
+    (salvo la lista de datos insertados que devuelve ResultadoCarga).
+
+    Args:
+      fuente: Ruta o fichero abierto con el CSV (p. ej. UploadFile.file).
+      progreso: Callback opcional para informar del avance por etapas.
+
+    Devuelve el ResultadoCarga completo, incluidos errores y descartados.
+    """
+    estado = _EstadoCarga()
+    errores: List[str] = []
+    log_errores = _LogErrores()
+    try:
+        _procesar_bloques(_bloques_validados(fuente, errores, log_errores, progreso), estado, progreso)
+    finally:
+        log_errores.cerrar()
+    return _resultado_streaming(estado, errores)
+
+
+async def procesar_csv_en_streaming_async(fuente, progreso: Progreso = _sin_progreso) -> ResultadoCarga:
+    """
+    Versión asíncrona de procesar_csv_en_streaming para los endpoints: la
+    lectura, la limpieza y la espera de embeddings se ejecutan en hilos y
+    las consultas de duplicados e inserción usan el motor asíncrono de la
+    BD, así que otras peticiones se atienden mientras dura la carga. Las
+    cargas en segundo plano (job_service) siguen usando la versión síncrona
+    en su propio hilo.
+    """
+    estado = _EstadoCarga()
+    errores: List[str] = []
+    log_errores = _LogErrores()
+    bloques = _bloques_validados(fuente, errores, log_errores, progreso)
+    try:
+        await _procesar_bloques_async(bloques, estado, progreso)
+    finally:
+        # Detiene el hilo de lectura por adelantado si la carga falla a medias
+        await asyncio.to_thread(bloques.close)
+        log_errores.cerrar()
+    return _resultado_streaming(estado, errores)
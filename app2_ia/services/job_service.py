@@ -0,0 +1,162 @@
+# app2_ia/services/job_service.py
+"""
+Trabajos de carga de CSV en segundo plano.
+
+La subida devuelve un job_id inmediatamente y un pool de hilos procesa el
+fichero fuera del bucle de eventos. El estado vive en memoria del proceso:
+con varios workers de uvicorn, el sondeo debe llegar al mismo worker que
+recibió la subida (afinidad de sesión) o usarse un único worker de ingesta.
+"""
+
+import os
+import uuid
+import logging
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from app2_ia.models.schemas import EstadoTrabajo, ResultadoCarga
+from app2_ia.services.ingest_service import procesar_csv_en_streaming
+from app2_ia.utils.metricas import registrar_indicador
+
+logger = logging.getLogger(__name__)
+
+# Cargas simultáneas por proceso
+INGEST_WORKERS = int(os.getenv("EVALIA_INGEST_WORKERS", "1"))
+# Tiempo que se conservan los trabajos terminados
+JOB_TTL = timedelta(seconds=int(os.getenv("EVALIA_JOB_TTL_S", "3600")))
+
+# Etapas del pipeline -> campo de EstadoTrabajo
+_CAMPOS_PROGRESO = {
+    "validadas": "filas_validadas",
+    "embebidas": "filas_embebidas",
+    "insertadas": "filas_insertadas",
+    "duplicados": "duplicados",
+    "errores": "errores",
+}
+
+
+class _Trabajo:
+    def __init__(self, job_id: str, ruta_csv: str):
+        self.ruta_csv = ruta_csv
+        self.resultado: Optional[ResultadoCarga] = None
+        ahora = datetime.now()
+        self.estado = EstadoTrabajo(
+            job_id=job_id, estado="pendiente", creado=ahora, actualizado=ahora
+        )
+
+
+class GestorTrabajos:
+    """Registro de trabajos de carga y pool de hilos que los ejecuta"""
+
+    def __init__(self, max_workers: int = INGEST_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingesta")
+        self._trabajos: Dict[str, _Trabajo] = {}
+        self._lock = threading.Lock()
+
+    def encolar(self, ruta_csv: str) -> EstadoTrabajo:
+        """
+        Registra un trabajo para el CSV en `ruta_csv` (el gestor borra el
+        fichero al terminar) y lo encola.
+        """
+        self._purgar()
+        trabajo = _Trabajo(uuid.uuid4().hex, ruta_csv)
+        with self._lock:
+            self._trabajos[trabajo.estado.job_id] = trabajo
+            estado_inicial = trabajo.estado.model_copy()
+        self._executor.submit(self._ejecutar, trabajo)
+        logger.info("Trabajo de carga %s encolado", trabajo.estado.job_id)
+        return estado_inicial
+
+    def estado(self, job_id: str) -> Optional[EstadoTrabajo]:
+        with self._lock:
+            trabajo = self._trabajos.get(job_id)
+            return trabajo.estado.model_copy() if trabajo else None
+
+    def resultado(self, job_id: str) -> Optional[ResultadoCarga]:
+        with self._lock:
+            trabajo = self._trabajos.get(job_id)
+            return trabajo.resultado if trabajo else None
+
+    def conteo_por_estado(self) -> Dict[str, int]:
+        """Número de trabajos por estado (pendiente + en_proceso = backlog de ingesta)"""
+        conteo = {"pendiente": 0, "en_proceso": 0, "completado": 0, "fallido": 0}
+        with self._lock:
+            for trabajo in self._trabajos.values():
+                conteo[trabajo.estado.estado] = conteo.get(trabajo.estado.estado, 0) + 1
+        return conteo
+
+    def _actualizar(self, trabajo: _Trabajo, **cambios) -> None:
+        with self._lock:
+            for campo, valor in cambios.items():
+                setattr(trabajo.estado, campo, valor)
+            trabajo.estado.actualizado = datetime.now()
+
+    def _ejecutar(self, trabajo: _Trabajo) -> None:
+        job_id = trabajo.estado.job_id
+        self._actualizar(trabajo, estado="en_proceso")
+
+        def progreso(etapa: str, cantidad: int) -> None:
+            campo = _CAMPOS_PROGRESO.get(etapa)
+            if campo and cantidad:
+                with self._lock:
+                    setattr(trabajo.estado, campo, getattr(trabajo.estado, campo) + cantidad)
+                    trabajo.estado.actualizado = datetime.now()
+
+        try:
+            resultado = procesar_csv_en_streaming(trabajo.ruta_csv, progreso)
+            with self._lock:
+                trabajo.resultado = resultado
+            self._actualizar(trabajo, estado="completado")
+            logger.info(
+                "Trabajo %s completado: %d insertados, %d descartados, %d duplicados",
+                job_id, resultado.validados, resultado.descartados, len(resultado.duplicados)
+            )
+        except Exception as e:
+            logger.error("Trabajo %s fallido: %s", job_id, e)
+            self._actualizar(trabajo, estado="fallido", detalle_error=str(e))
+        finally:
+            try:
+                os.remove(trabajo.ruta_csv)
+            except OSError:
+                pass
+
+    def _purgar(self) -> None:
+        """Elimina los trabajos terminados hace más de JOB_TTL"""
+        limite = datetime.now() - JOB_TTL
+        with self._lock:
+            caducados = [
+                job_id for job_id, t in self._trabajos.items()
+                if t.estado.estado in ("completado", "fallido") and t.estado.actualizado < limite
+            ]
+            for job_id in caducados:
+                del self._trabajos[job_id]
+
+
+# Instancia global (singleton pattern)
+_gestor_singleton: Optional[GestorTrabajos] = None
+_gestor_lock = threading.Lock()
+
+
+def obtener_gestor() -> GestorTrabajos:
+    """Obtiene el gestor de trabajos del proceso"""
+    global _gestor_singleton
+    with _gestor_lock:
+        if _gestor_singleton is None:
+            _gestor_singleton = GestorTrabajos()
+        return _gestor_singleton
+
+
+def _trabajos_por_estado() -> Optional[Dict[tuple, float]]:
+    if _gestor_singleton is None:
+        return None
+    return {(estado,): n for estado, n in _gestor_singleton.conteo_por_estado().items()}
+
+
+registrar_indicador(
+    "evalia_ingesta_trabajos",
+    "Trabajos de carga por estado (pendiente y en_proceso forman el backlog)",
+    _trabajos_por_estado,
+    etiquetas=("estado",)
+)
@@ -1,14 +1,31 @@
 """Servicio para refinar el ranking inicial usando un modelo de ML (XGBoost)."""
 
+import os
+import time
+import hashlib
 import logging
-from typing import List
+import threading
+from typing import Any, List, Optional, Tuple
 import joblib  # pip install joblib
 import numpy as np
-import xgboost as xgb
 from app2_ia.models.schemas import ResultadoRanking
+from app2_ia.services.clustering_service import obtener_clusters
 
 logger = logging.getLogger(__name__)
 
+# Ruta del modelo y cada cuánto se comprueba si ha cambiado en disco
+RERANKER_PATH = os.getenv("EVALIA_RERANKER_PATH", os.path.join("models", "reranker.joblib"))
+RERANKER_INTERVALO_S = float(os.getenv("EVALIA_RERANKER_INTERVALO_S", "5"))
+
+
+def features_reranking(similitud: float, cluster_id: Optional[int]) -> List[float]:
+    """
+    Features del reranker: [similitud, cluster_id]. Un cluster_id ausente va
+    como NaN (valor ausente para XGBoost), no como el cluster 0, que es válido.
+    """
+    return [similitud, float("nan") if cluster_id is None else cluster_id]
+
+
 class RerankingService:
     """
     Servicio para refinar el ranking inicial usando un modelo de ML (XGBoost).
@@ -17,14 +34,49 @@ class RerankingService:
     def __init__(self, model_path: str):
         """
         Carga el modelo de XGBoost previamente entrenado.
-        :param model_path: ruta al archivo .joblib del modelo (Booster o sklearn).
+        :param model_path: ruta al archivo .joblib. scripts/train_reranking.py
+            guarda un dict con el modelo y la versión y n_clusters de los
+            clusters con los que se entrenó; un modelo suelto (Booster o
+            sklearn) es del formato anterior y no trae esa información.
         """
         try:
-            self.model = joblib.load(model_path)
-            logger.info(f"RerankingService cargó modelo de {model_path}")
+            datos = joblib.load(model_path)
+            logger.info("RerankingService cargó modelo de %s", model_path)
         except Exception as e:
-            logger.error(f"No se pudo cargar el modelo de reranking: {e}")
+            logger.error("No se pudo cargar el modelo de reranking: %s", e)
             raise
+        if isinstance(datos, dict) and "modelo" in datos:
+            self.model = datos["modelo"]
+            self.clusters_version: Optional[str] = datos.get("clusters_version")
+            self.n_clusters: Optional[int] = datos.get("n_clusters")
+            self.con_metadatos = True
+        else:
+            self.model = datos
+            self.clusters_version, self.n_clusters = None, None
+            self.con_metadatos = False
+
+    def incompatibilidad(self, clusters: Any) -> Optional[str]:
+        """
+        Comprueba que el modelo se entrenó con los clusters activos: el
+        cluster_id es una feature y su significado cambia con cada
+        entrenamiento de los centroides.
+        :param clusters: ClusteringGlobal activo (o None si no hay centroides).
+        :return: Motivo de la incompatibilidad, o None si es compatible.
+        """
+        if not self.con_metadatos:
+            return (
+                "el modelo no indica con qué clusters se entrenó "
+                "(formato anterior a los clusters globales)"
+            )
+        version = clusters.version if clusters is not None else None
+        n_clusters = clusters.n_clusters if clusters is not None else None
+        if self.clusters_version != version or self.n_clusters != n_clusters:
+            return (
+                f"entrenado con clusters versión {self.clusters_version} "
+                f"({self.n_clusters} clusters) y los activos son versión "
+                f"{version} ({n_clusters} clusters)"
+            )
+        return None
 
     def predict(self, items: List[ResultadoRanking]) -> List[ResultadoRanking]:
         """
@@ -35,16 +87,45 @@ class RerankingService:
         if not items:
             return []
 
+        scores = self._puntuar(items)
+        self._reordenar(items, scores)
+        logger.debug("Reranking completado correctamente")
+        return items
+
+    def predict_lotes(self, listas: List[List[ResultadoRanking]]) -> List[List[ResultadoRanking]]:
+        """
+        Reranking de varias búsquedas con una sola llamada al modelo: se
+        concatenan las features de todas las listas y cada lista se reordena
+        por separado.
+        :param listas: una lista de ResultadoRanking por búsqueda.
+        :return: las mismas listas con adjusted_score y ranking re-asignado.
+        """
+        todos = [r for items in listas for r in items]
+        if not todos:
+            return listas
+
+        scores = self._puntuar(todos)
+        inicio = 0
+        for items in listas:
+            self._reordenar(items, scores[inicio:inicio + len(items)])
+            inicio += len(items)
+        logger.debug("Reranking por lotes completado (%d búsquedas)", len(listas))
+        return listas
+
+    def _puntuar(self, items: List[ResultadoRanking]) -> np.ndarray:
         # 1) Construir matriz de features X
-        X = np.array([[r.similitud, r.cluster_id or 0] for r in items])
+        X = np.array([features_reranking(r.similitud, r.cluster_id) for r in items], dtype=float)
 
         # 2) Predecir adjusted_scores
+        import xgboost as xgb  # Importación diferida: ya cargado al deserializar el modelo
+
         if isinstance(self.model, xgb.core.Booster):
             dmat = xgb.DMatrix(X)
-            scores = self.model.predict(dmat)
-        else:
-            scores = self.model.predict(X)
+            return self.model.predict(dmat)
+        return self.model.predict(X)
 
+    @staticmethod
+    def _reordenar(items: List[ResultadoRanking], scores) -> None:
         # 3) Asignar adjusted_score y reordenar
         for r, sc in zip(items, scores):
             r.adjusted_score = float(sc)
@@ -54,5 +135,140 @@ class RerankingService:
         for idx, r in enumerate(items, start=1):
             r.ranking = idx
 
-        logger.info("Reranking completado correctamente")
-        return items
+
+class RegistroReranker:
+    """
+    Registro del modelo de reranking del proceso.
+
+    Carga el modelo una sola vez y, como mucho cada `intervalo_s` segundos,
+    comprueba la firma del fichero (mtime y tamaño). Si cambia (p. ej. tras
+    ejecutar scripts/train_reranking.py) carga el nuevo modelo y lo sustituye
+    de forma atómica; las peticiones en curso siguen usando el anterior.
+    Si el fichero no existe, ese resultado también se cachea: no se avisa en
+    cada petición. Si existe pero no se puede cargar, se mantiene el modelo
+    anterior y se reintenta en cada comprobación (avisando una vez por firma).
+    El modelo solo se activa si se entrenó con los clusters globales activos
+    (misma versión y n_clusters); si no, se avisa una vez y la búsqueda
+    devuelve el orden por similitud hasta que se re-entrene.
+    """
+
+    def __init__(self, model_path: str = RERANKER_PATH, intervalo_s: float = RERANKER_INTERVALO_S):
+        self.model_path = model_path
+        self.intervalo_s = intervalo_s
+        self._servicio: Optional[RerankingService] = None
+        self._version: Optional[str] = None
+        self._cargado: Optional[RerankingService] = None
+        self._version_cargada: Optional[str] = None
+        self._aviso_incompatible: Optional[Tuple[Optional[str], Optional[str]]] = None
+        self._firma: Optional[Tuple[int, int]] = None
+        self._firma_fallida: Optional[Tuple[int, int]] = None
+        self._comprobado = False
+        self._ultima_comprobacion = 0.0
+        self._lock = threading.Lock()
+
+    def _firma_fichero(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.model_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _recargar_si_cambia(self) -> None:
+        firma = self._firma_fichero()
+        if not self._comprobado or firma != self._firma:
+            # La firma solo se da por vista si la carga funcionó
+            if self._cargar(firma):
+                self._firma = firma
+            self._comprobado = True
+        # Los clusters pueden cambiar aunque el modelo no cambie
+        self._activar()
+
+    def _cargar(self, firma: Optional[Tuple[int, int]]) -> bool:
+        """:return: False si el fichero no se pudo cargar"""
+        if firma is None:
+            if self._cargado is not None or not self._comprobado:
+                logger.warning(
+                    "Modelo de reranking no encontrado en %s; "
+                    "se devolverá el ranking por similitud", self.model_path
+                )
+            self._cargado, self._version_cargada = None, None
+            return True
+        try:
+            with open(self.model_path, "rb") as f:
+                version = hashlib.sha1(f.read()).hexdigest()[:12]
+            if version != self._version_cargada:
+                self._cargado, self._version_cargada = RerankingService(self.model_path), version
+        except Exception as e:
+            # Se mantiene el modelo anterior (si lo hay) y se reintenta en la
+            # próxima comprobación: el fallo puede ser pasajero
+            if firma != self._firma_fallida:
+                logger.error(
+                    "No se pudo cargar el nuevo modelo de reranking: %s "
+                    "(se reintentará cada %s s)", e, self.intervalo_s
+                )
+                self._firma_fallida = firma
+            else:
+                logger.debug("Reintento fallido de carga del modelo de reranking: %s", e)
+            return False
+        self._firma_fallida = None
+        return True
+
+    def _activar(self) -> None:
+        cargado, version = self._cargado, self._version_cargada
+        if cargado is None:
+            self._servicio, self._version = None, None
+            return
+        clusters = obtener_clusters()
+        motivo = cargado.incompatibilidad(clusters)
+        if motivo is not None:
+            aviso = (version, clusters.version if clusters is not None else None)
+            if aviso != self._aviso_incompatible:
+                logger.warning(
+                    "Modelo de reranking %s descartado: %s. Se devolverá el ranking "
+                    "por similitud hasta re-entrenarlo (scripts/train_reranking.py)",
+                    version, motivo
+                )
+                self._aviso_incompatible = aviso
+            self._servicio, self._version = None, None
+            return
+        if self._servicio is not cargado:
+            # Sustitución atómica: una única asignación de referencia
+            self._servicio, self._version = cargado, version
+            logger.info("Modelo de reranking activo: versión %s", version)
+
+    def obtener(self) -> Optional[RerankingService]:
+        """Devuelve el servicio de reranking activo, o None si no hay modelo"""
+        ahora = time.monotonic()
+        if self._comprobado and ahora - self._ultima_comprobacion < self.intervalo_s:
+            return self._servicio
+        with self._lock:
+            if not self._comprobado or ahora - self._ultima_comprobacion >= self.intervalo_s:
+                self._recargar_si_cambia()
+                self._ultima_comprobacion = ahora
+        return self._servicio
+
+    @property
+    def version(self) -> Optional[str]:
+        """Hash corto del contenido del modelo activo (None si no hay modelo)"""
+        self.obtener()
+        return self._version
+
+
+# Instancia global del registro (singleton pattern)
+_registro_singleton: Optional[RegistroReranker] = None
+_registro_lock = threading.Lock()
+
+
+def obtener_registro() -> RegistroReranker:
+    """Obtiene el registro de reranking del proceso"""
+    global _registro_singleton
+    if _registro_singleton is None:
+        with _registro_lock:
+            if _registro_singleton is None:
+                _registro_singleton = RegistroReranker()
+    return _registro_singleton
+
+
+def obtener_reranker() -> Optional[RerankingService]:
+    """Atajo: servicio de reranking activo o None si no hay modelo"""
+    return obtener_registro().obtener()
@@ -0,0 +1,172 @@
+# services/result_cache.py
+"""
+Cache de resultados de búsqueda.
+
+Durante una campaña se buscan una y otra vez las mismas descripciones; el
+cache guarda el ranking final (tras clustering y reranking) para no repetir
+limpieza, embedding, consulta vectorial y reranking.
+
+- Clave: tipo de búsqueda (página o lote), puesto, descripción normalizada,
+  k, cursor, versión del reranker y versión de los clusters (cambiar de
+  modelo invalida automáticamente). La búsqueda por lotes no guarda cursor,
+  así que nunca comparte entrada con la primera página.
+- Valor: el ranking y el cursor de la página siguiente (si lo hay).
+- Acotado por número de entradas (LRU) y por antigüedad (TTL).
+- Versión de datos: la ingesta la incrementa tras cada inserción y el cache
+  se vacía, así que nunca se sirven resultados anteriores a una carga
+  hecha en este proceso. Con varios workers, las cargas hechas en otro
+  worker solo se reflejan al caducar el TTL.
+
+Configuración (variables de entorno):
+  - EVALIA_RESULT_CACHE_MAX: entradas máximas (0 desactiva el cache)
+  - EVALIA_RESULT_CACHE_TTL_S: segundos de vida de cada entrada
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from app2_ia.models.schemas import ResultadoRanking
+from app2_ia.utils.metricas import registrar_indicador
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_MAX = int(os.getenv("EVALIA_RESULT_CACHE_MAX", "1024"))
+RESULT_CACHE_TTL_S = float(os.getenv("EVALIA_RESULT_CACHE_TTL_S", "300"))
+
+
+def normalizar_descripcion(descripcion: str) -> str:
+    """Normaliza mayúsculas y espacios para que variantes triviales compartan entrada"""
+    return " ".join(descripcion.lower().split())
+
+
+class CacheResultados:
+    """Cache LRU + TTL de rankings, seguro para uso concurrente"""
+
+    def __init__(self, max_entradas: int = RESULT_CACHE_MAX, ttl_s: float = RESULT_CACHE_TTL_S):
+        self.max_entradas = max_entradas
+        self.ttl_s = ttl_s
+        self._entradas: "OrderedDict[Hashable, Tuple[float, int, List[ResultadoRanking], Optional[str]]]" = OrderedDict()
+        self._version_datos = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expiradas": 0, "evictions": 0, "invalidaciones": 0}
+
+    @property
+    def activo(self) -> bool:
+        return self.max_entradas > 0
+
+    @property
+    def version_datos(self) -> int:
+        return self._version_datos
+
+    def get(self, clave: Hashable) -> Optional[Tuple[List[ResultadoRanking], Optional[str]]]:
+        """
+        Devuelve (copia del ranking, cursor siguiente) o None si no hay
+        entrada o caducó.
+        """
+        if not self.activo:
+            return None
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self._stats["misses"] += 1
+                return None
+            guardado, version, ranking, siguiente = entrada
+            if version != self._version_datos or time.monotonic() - guardado > self.ttl_s:
+                del self._entradas[clave]
+                self._stats["expiradas"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self._stats["hits"] += 1
+        # Copias: el llamante (o el reranker) puede modificar los objetos
+        return [r.model_copy() for r in ranking], siguiente
+
+    def put(
+        self,
+        clave: Hashable,
+        ranking: List[ResultadoRanking],
+        version_datos: int,
+        siguiente: Optional[str] = None
+    ) -> None:
+        """
+        Guarda un ranking calculado con la versión de datos `version_datos`
+        (leída antes de consultar la BD); si entretanto hubo una carga, no se guarda.
+        """
+        if not self.activo:
+            return
+        copia = [r.model_copy() for r in ranking]
+        with self._lock:
+            if version_datos != self._version_datos:
+                return
+            self._entradas[clave] = (time.monotonic(), version_datos, copia, siguiente)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidar(self) -> int:
+        """Incrementa la versión de datos y vacía el cache. Devuelve la nueva versión."""
+        with self._lock:
+            self._version_datos += 1
+            self._entradas.clear()
+            self._stats["invalidaciones"] += 1
+            return self._version_datos
+
+    def stats(self) -> Dict[str, int]:
+        """Devuelve las estadísticas de uso del cache"""
+        with self._lock:
+            return {
+                **self._stats,
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "version_datos": self._version_datos,
+            }
+
+
+# Instancia global (singleton pattern)
+_cache_singleton: Optional[CacheResultados] = None
+_cache_lock = threading.Lock()
+
+
+def obtener_cache_resultados() -> CacheResultados:
+    """Obtiene el cache de resultados del proceso"""
+    global _cache_singleton
+    if _cache_singleton is None:
+        with _cache_lock:
+            if _cache_singleton is None:
+                _cache_singleton = CacheResultados()
+    return _cache_singleton
+
+
+def incrementar_version_datos() -> int:
+    """La ingesta lo llama tras insertar candidatos: invalida los resultados cacheados"""
+    return obtener_cache_resultados().invalidar()
+
+
+def _eventos_cache() -> Optional[Dict[tuple, float]]:
+    if _cache_singleton is None:
+        return None
+    stats = _cache_singleton.stats()
+    return {(evento,): stats[evento] for evento in ("hits", "misses", "expiradas", "evictions", "invalidaciones")}
+
+
+def _entradas_cache() -> Optional[float]:
+    return _cache_singleton.stats()["entradas"] if _cache_singleton is not None else None
+
+
+registrar_indicador(
+    "evalia_result_cache_eventos_total",
+    "Eventos del cache de resultados de búsqueda",
+    _eventos_cache,
+    etiquetas=("evento",),
+    tipo="counter"
+)
+registrar_indicador(
+    "evalia_result_cache_entradas",
+    "Entradas en el cache de resultados de búsqueda",
+    _entradas_cache
+)
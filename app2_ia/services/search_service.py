@@ -1,138 +1,560 @@
 # app2_ia/services/search_service.py
 
+import os
+import json
+import asyncio
+import base64
+import hashlib
 import logging
-from typing import List, Optional
-
-from app2_ia.utils.limpieza import limpiar_texto_para_embedding
-from app2_ia.services.embedding import generar_embedding
-from app2_ia.services.vector_db import SessionLocal, EmbeddingCandidato as DBEmbeddingCandidato
-from app2_ia.models.schemas import (
-    ResultadoRanking,
-    EmbeddingCandidato as EmbeddingDTO,
-    ClusterAssignment
-)
-from app2_ia.services.clustering_service import ClusteringService
-from app2_ia.services.reranking_service import RerankingService
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app2_ia.utils.limpieza import limpiar_texto_para_embedding, limpiar_textos_para_embedding
+from app2_ia.services.embedding import generar_embeddings
+from app2_ia.services.vector_store import obtener_store, Posicion, FASE_PUESTO, FASE_GENERAL
+from app2_ia.models.schemas import ResultadoRanking
+from app2_ia.services.clustering_service import asignar_clusters, obtener_clusters
+from app2_ia.services.reranking_service import obtener_reranker, obtener_registro
+from app2_ia.services.result_cache import obtener_cache_resultados, normalizar_descripcion
+from app2_ia.utils.metricas import BUSQUEDAS, DURACION_BUSQUEDA, medir_etapa
+from app2_ia.utils.configuracion_logs import Muestreo
 
 logger = logging.getLogger(__name__)
 
-def buscar_candidatos_similares(puesto: Optional[str], descripcion: str) -> List[ResultadoRanking]:
+# Número de candidatos devueltos por búsqueda (por defecto) y máximo por página
+TOP_K = 10
+K_MAX = int(os.getenv("EVALIA_BUSQUEDA_K_MAX", "100"))
+
+# Los mensajes por petición se registran muestreados (los totales están en /metrics)
+_muestreo_busquedas = Muestreo()
+
+
+class PaginaResultados(NamedTuple):
+    """Una página de resultados y el cursor para pedir la siguiente (None si no hay más)"""
+    resultados: List[ResultadoRanking]
+    siguiente_cursor: Optional[str]
+    # Si no hay cursor porque la paginación llegó al máximo que recorre el
+    # índice (HNSW sin recorrido iterativo), ese máximo; si no, None
+    limite_profundidad: Optional[int] = None
+
+
+def _limite_alcanzado(servidos: int, en_pagina: int, k: int) -> Optional[int]:
     """
-    Busca candidatos similares a una descripción de perfil.
-    
-    Pasos:
-    1. Limpia el texto de la descripción
-    2. Genera un embedding del texto limpio
-    3. Busca en la BD vectorial los candidatos más similares
-    4. Realiza clustering y devuelve lista enriquecida
-    
-    Returns:
-        Lista de ResultadoRanking con los candidatos más similares
+    Máximo de resultados de la paginación si la página siguiente lo
+    superaría (no se emite cursor); None si se puede seguir paginando.
     """
-    # 1. Limpieza del texto
-    logger.info(
-        f"Procesando búsqueda para descripción"
-        + (f" y puesto: {puesto}" if puesto else "")
+    if en_pagina < k:
+        return None
+    limite = obtener_store().profundidad_maxima()
+    if limite is not None and servidos + en_pagina + k > limite:
+        return limite
+    return None
+
+
+# --------------------------------------------------
+# Cursores de paginación
+# --------------------------------------------------
+# El cursor es opaco para el cliente: codifica la fase de la búsqueda, la
+# posición (distancia, candidato_id) del último resultado servido, cuántos
+# resultados se han servido ya (para numerar el ranking) y una huella de la
+# búsqueda, para rechazar cursores usados con otra descripción o puesto.
+
+def _huella(puesto: Optional[str], descripcion: str) -> str:
+    return hashlib.md5(f"{puesto}\x00{normalizar_descripcion(descripcion)}".encode()).hexdigest()[:12]
+
+
+def codificar_cursor(posicion: Posicion, servidos: int, huella: str) -> str:
+    datos = {
+        "f": posicion.fase,
+        "d": posicion.distancia,
+        "id": posicion.candidato_id,
+        "n": servidos,
+        "h": huella,
+    }
+    return base64.urlsafe_b64encode(json.dumps(datos).encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str, huella: str) -> Tuple[Posicion, int]:
+    """
+    :return: (posición del último resultado servido, resultados servidos)
+    :raises ValueError: si el cursor está mal formado o es de otra búsqueda.
+    """
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        posicion = Posicion(str(datos["f"]), float(datos["d"]), int(datos["id"]))
+        servidos = int(datos["n"])
+        cursor_huella = datos["h"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Cursor inválido: {e}")
+    if posicion.fase not in (FASE_PUESTO, FASE_GENERAL):
+        raise ValueError("Cursor inválido: fase desconocida")
+    if cursor_huella != huella:
+        raise ValueError("El cursor no corresponde a esta búsqueda (puesto o descripción distintos)")
+    return posicion, servidos
+
+
+def _validar_k(k: int) -> None:
+    if not 1 <= k <= K_MAX:
+        raise ValueError(f"k debe estar entre 1 y {K_MAX}")
+
+
+# --------------------------------------------------
+# Construcción del ranking
+# --------------------------------------------------
+
+def _clusters_al_vuelo(filas) -> Dict[int, Optional[int]]:
+    """
+    Asigna cluster a las filas sin cluster_id (anteriores al entrenamiento de
+    los clusters) con los centroides, usando el embedding que trae la consulta.
+    """
+    sin_cluster = [fila for fila in filas if fila.cluster_id is None and fila.embedding is not None]
+    return dict(zip(
+        (fila.candidato_id for fila in sin_cluster),
+        asignar_clusters([fila.embedding for fila in sin_cluster])
+    ))
+
+
+def _construir_ranking(filas, asignados: Dict[int, Optional[int]]) -> List[ResultadoRanking]:
+    """Convierte los Vecino del almacén en ResultadoRanking"""
+    ranking_resultados: List[ResultadoRanking] = []
+    for i, fila in enumerate(filas):
+        distancia = fila.distancia
+        similitud = 1 - distancia if distancia <= 1 else 0
+        cluster_id = fila.cluster_id if fila.cluster_id is not None else asignados.get(fila.candidato_id)
+        ranking_resultados.append(ResultadoRanking(
+            candidato_id=str(fila.candidato_id),
+            similitud=round(similitud, 4),
+            ranking=i + 1,
+            puesto=fila.puesto,
+            cluster_id=cluster_id
+        ))
+    return ranking_resultados
+
+
+# Tipos de entrada del cache de resultados. Una página guarda el cursor
+# siguiente y la búsqueda por lotes no: no pueden compartir clave
+CLAVE_PAGINA = "pagina"
+CLAVE_LOTE = "lote"
+
+
+def _clave_resultados(
+    tipo: str,
+    puesto: Optional[str],
+    descripcion: str,
+    k: int,
+    cursor: Optional[str] = None
+) -> tuple:
+    """Clave del cache de resultados: cambia si cambia el reranker o los clusters"""
+    clusters = obtener_clusters()
+    return (
+        tipo,
+        puesto,
+        normalizar_descripcion(descripcion),
+        k,
+        cursor,
+        obtener_registro().version,
+        clusters.version if clusters is not None else None,
     )
-    texto_limpio = limpiar_texto_para_embedding(descripcion)
-    logger.debug(f"Texto limpio: {texto_limpio[:50]}...")
+
+
+# --------------------------------------------------
+# Búsqueda
+# --------------------------------------------------
+
+class _PaginaPendiente(NamedTuple):
+    """Página que no estaba en el cache de resultados y hay que calcular"""
+    huella: str
+    despues: Optional[Posicion]
+    servidos: int
+    clave: tuple
+    version_datos: int
+    # Traer embeddings para asignar clusters al vuelo (hay centroides)
+    con_embedding: bool
+
+
+def _iniciar_pagina(
+    puesto: Optional[str],
+    descripcion: str,
+    k: int,
+    cursor: Optional[str]
+) -> Tuple[Optional[PaginaResultados], Optional[_PaginaPendiente]]:
+    """
+    Valida la petición y consulta el cache de resultados. La clave consulta
+    los registros del reranker y de los clusters, que pueden leer ficheros
+    del disco: la versión asíncrona la ejecuta en un hilo.
+    :return: (página cacheada, None) o (None, página pendiente de calcular)
+    """
+    _validar_k(k)
+    huella = _huella(puesto, descripcion)
+    despues, servidos = decodificar_cursor(cursor, huella) if cursor else (None, 0)
+
+    # 0. Cache de resultados
+    cache = obtener_cache_resultados()
+    clave = _clave_resultados(CLAVE_PAGINA, puesto, descripcion, k, cursor)
+    cacheado = cache.get(clave)
+    if cacheado is not None:
+        logger.debug("Búsqueda servida desde el cache de resultados")
+        BUSQUEDAS.inc(tipo="pagina", resultado="cache")
+        ranking, siguiente = cacheado
+        limite = None if siguiente else _limite_alcanzado(servidos, len(ranking), k)
+        return PaginaResultados(ranking, siguiente, limite), None
+    return None, _PaginaPendiente(
+        huella, despues, servidos, clave, cache.version_datos, obtener_clusters() is not None
+    )
+
+
+def _embedding_consulta(descripcion: str, puesto: Optional[str], servidos: int) -> List[float]:
+    """Pasos 1 y 2 de la búsqueda: limpieza del texto y embedding"""
+    # 1. Limpieza del texto
+    logger.debug("Procesando búsqueda (puesto: %s, a partir del resultado %d)", puesto, servidos)
+    with medir_etapa("busqueda", "limpieza"):
+        texto_limpio = limpiar_texto_para_embedding(descripcion)
+    logger.debug("Texto limpio: %.50s...", texto_limpio)
 
     # 2. Generación del embedding
-    embedding_busqueda = generar_embedding(texto_limpio)
+    with medir_etapa("busqueda", "embedding"):
+        embedding_busqueda = generar_embeddings([texto_limpio])[0]
     logger.debug("Embedding generado para la búsqueda")
+    return embedding_busqueda
+
+
+def _completar_pagina(
+    pendiente: _PaginaPendiente,
+    puesto: Optional[str],
+    k: int,
+    filas: list,
+    fase: str
+) -> PaginaResultados:
+    """Pasos 4 y 5 de la búsqueda: cursor siguiente, clusters, reranking y cache"""
+    if puesto and fase == FASE_GENERAL and pendiente.despues is None:
+        logger.debug(
+            "No se encontraron resultados para el puesto '%s'. "
+            "Se buscó en todos los puestos.", puesto
+        )
+
+    # Cursor de la página siguiente: solo si la página está completa y el
+    # índice puede llegar hasta ella
+    siguiente = None
+    limite = _limite_alcanzado(pendiente.servidos, len(filas), k)
+    if limite is not None:
+        logger.debug("Paginación cortada en %d resultados (límite del índice)", limite)
+    elif len(filas) == k:
+        ultima = filas[-1]
+        siguiente = codificar_cursor(
+            Posicion(fase, ultima.distancia, ultima.candidato_id),
+            pendiente.servidos + len(filas), pendiente.huella
+        )
+
+    # 4. Construcción del ranking enriquecido con cluster_id
+    with medir_etapa("busqueda", "clusters"):
+        ranking_resultados = _construir_ranking(filas, _clusters_al_vuelo(filas))
+
+    # 5. Aplicar reranking si hay modelo cargado (solo dentro de la página)
+    # El registro carga el modelo una vez y lo recarga si cambia en disco
+    reranker = obtener_reranker()
+    if reranker is not None:
+        try:
+            with medir_etapa("busqueda", "reranking"):
+                ranking_resultados = reranker.predict(ranking_resultados)
+            logger.debug("Reranking aplicado correctamente")
+        except Exception as e:
+            logger.warning("No se aplicó reranking: %s", e)
+
+    # Numeración global del ranking en páginas siguientes
+    for r in ranking_resultados:
+        r.ranking += pendiente.servidos
+
+    obtener_cache_resultados().put(pendiente.clave, ranking_resultados, pendiente.version_datos, siguiente)
+    BUSQUEDAS.inc(tipo="pagina", resultado="calculada")
+    if _muestreo_busquedas.toca():
+        logger.info(
+            "Búsqueda completada: %d resultados (muestreo 1/%d)",
+            len(ranking_resultados), _muestreo_busquedas.cada
+        )
+    return PaginaResultados(ranking_resultados, siguiente, limite)
+
+
+def _fallo_vectorial(e: Exception) -> None:
+    logger.error("Error en búsqueda vectorial: %s", e)
+    BUSQUEDAS.inc(tipo="pagina", resultado="error")
+
+
+@DURACION_BUSQUEDA.cronometrar(tipo="pagina")
+def buscar_pagina_similares(
+    puesto: Optional[str],
+    descripcion: str,
+    k: int = TOP_K,
+    cursor: Optional[str] = None
+) -> PaginaResultados:
+    """
+    Busca candidatos similares a una descripción de perfil, por páginas.
+
+    Pasos:
+    0. Devuelve el resultado cacheado si la misma página se pidió hace poco
+    1. Limpia el texto de la descripción
+    2. Genera un embedding del texto limpio
+    3. Busca en el almacén los k candidatos siguientes a la posición del
+       cursor (keyset sobre (distancia, candidato_id), sin OFFSET; con HNSW
+       el coste crece con la profundidad, ver vector_index.profundidad_maxima)
+    4. Añade el cluster global de cada candidato y aplica reranking, solo
+       sobre la página pedida
+
+    Returns:
+        PaginaResultados con el ranking de la página y el cursor siguiente
 
-    # 3. Consulta en la base de datos
-    session = SessionLocal()
+    Raises:
+        ValueError: si k está fuera de rango o el cursor no es válido
+    """
+    cacheada, pendiente = _iniciar_pagina(puesto, descripcion, k, cursor)
+    if cacheada is not None:
+        return cacheada
+    embedding_busqueda = _embedding_consulta(descripcion, puesto, pendiente.servidos)
+
+    # 3. Consulta en el almacén de vectores (pgvector: un único viaje que
+    # prioriza el puesto y solo trae embeddings si hay que asignar clusters)
     try:
-        resultados = []
-        if puesto:
-            query = (
-                session.query(
-                    DBEmbeddingCandidato,
-                    DBEmbeddingCandidato.embedding.cosine_distance(embedding_busqueda).label("distancia")
-                )
-                .filter(DBEmbeddingCandidato.puesto == puesto)
-                .order_by("distancia")
-                .limit(10)
-                .all()
+        with medir_etapa("busqueda", "vectorial"):
+            filas, fase = obtener_store().buscar_pagina(
+                embedding_busqueda,
+                puesto,
+                k=k,
+                con_embedding=pendiente.con_embedding,
+                despues=pendiente.despues,
+                servidos=pendiente.servidos
             )
-            resultados = query
+    except Exception as e:
+        _fallo_vectorial(e)
+        raise
+    return _completar_pagina(pendiente, puesto, k, filas, fase)
 
-            if not resultados:
-                logger.info(
-                    f"No se encontraron resultados para el puesto '{puesto}'. "
-                    "Buscando en todos los puestos."
-                )
 
-        if not puesto or not resultados:
-            query = (
-                session.query(
-                    DBEmbeddingCandidato,
-                    DBEmbeddingCandidato.embedding.cosine_distance(embedding_busqueda).label("distancia")
+async def buscar_pagina_similares_async(
+    puesto: Optional[str],
+    descripcion: str,
+    k: int = TOP_K,
+    cursor: Optional[str] = None
+) -> PaginaResultados:
+    """
+    Versión asíncrona de buscar_pagina_similares para los endpoints: la
+    limpieza, el embedding y el ranking se ejecutan en un hilo y la consulta
+    al almacén se espera (motor asíncrono con pgvector), sin bloquear el
+    bucle de eventos.
+    """
+    with DURACION_BUSQUEDA.cronometrar(tipo="pagina"):
+        cacheada, pendiente = await asyncio.to_thread(_iniciar_pagina, puesto, descripcion, k, cursor)
+        if cacheada is not None:
+            return cacheada
+        embedding_busqueda = await asyncio.to_thread(
+            _embedding_consulta, descripcion, puesto, pendiente.servidos
+        )
+        try:
+            with medir_etapa("busqueda", "vectorial"):
+                filas, fase = await obtener_store().buscar_pagina_async(
+                    embedding_busqueda,
+                    puesto,
+                    k=k,
+                    con_embedding=pendiente.con_embedding,
+                    despues=pendiente.despues,
+                    servidos=pendiente.servidos
                 )
-                .order_by("distancia")
-                .limit(10)
-                .all()
+        except Exception as e:
+            _fallo_vectorial(e)
+            raise
+        return await asyncio.to_thread(_completar_pagina, pendiente, puesto, k, filas, fase)
+
+
+def buscar_candidatos_similares(
+    puesto: Optional[str],
+    descripcion: str,
+    k: int = TOP_K,
+    cursor: Optional[str] = None
+) -> List[ResultadoRanking]:
+    """
+    Busca candidatos similares a una descripción de perfil (ver
+    buscar_pagina_similares).
+
+    Returns:
+        Lista de ResultadoRanking con los candidatos más similares
+    """
+    return buscar_pagina_similares(puesto, descripcion, k, cursor).resultados
+
+
+class _LotePendiente(NamedTuple):
+    """Búsqueda por lotes tras consultar el cache de resultados"""
+    claves: List[tuple]
+    rankings: List[Optional[List[ResultadoRanking]]]
+    # Posiciones de las búsquedas que no estaban en el cache
+    pendientes: List[int]
+    version_datos: int
+    con_embedding: bool
+
+
+def _iniciar_lote(busquedas: List[Tuple[Optional[str], str]], ks: List[int]) -> _LotePendiente:
+    """
+    Valida los k y sirve desde el cache de resultados las búsquedas que estén
+    en él (como _iniciar_pagina, la versión asíncrona lo ejecuta en un hilo)
+    """
+    for k in ks:
+        _validar_k(k)
+
+    cache = obtener_cache_resultados()
+    claves = [
+        _clave_resultados(CLAVE_LOTE, puesto, descripcion, k)
+        for (puesto, descripcion), k in zip(busquedas, ks)
+    ]
+    cacheados = [cache.get(clave) for clave in claves]
+    rankings: List[Optional[List[ResultadoRanking]]] = [
+        c[0] if c is not None else None for c in cacheados
+    ]
+    pendientes = [i for i, ranking in enumerate(rankings) if ranking is None]
+    if len(pendientes) < len(busquedas):
+        logger.debug("Búsqueda por lotes: %d perfiles desde el cache", len(busquedas) - len(pendientes))
+        BUSQUEDAS.inc(len(busquedas) - len(pendientes), tipo="lote", resultado="cache")
+    return _LotePendiente(claves, rankings, pendientes, cache.version_datos, obtener_clusters() is not None)
+
+
+def _completar_lote(lote: _LotePendiente, calculados: List[List[ResultadoRanking]]) -> List[List[ResultadoRanking]]:
+    """Coloca los rankings calculados en su posición y los guarda en el cache"""
+    BUSQUEDAS.inc(len(lote.pendientes), tipo="lote", resultado="calculada")
+    cache = obtener_cache_resultados()
+    for i, ranking in zip(lote.pendientes, calculados):
+        lote.rankings[i] = ranking
+        cache.put(lote.claves[i], ranking, lote.version_datos)
+    return lote.rankings
+
+
+@DURACION_BUSQUEDA.cronometrar(tipo="lote")
+def buscar_candidatos_similares_lote(
+    busquedas: List[Tuple[Optional[str], str]],
+    ks: Optional[List[int]] = None
+) -> List[List[ResultadoRanking]]:
+    """
+    Versión por lotes de buscar_candidatos_similares para muchos perfiles a
+    la vez (solo primera página). Los perfiles en el cache de resultados se
+    sirven desde él; para el resto hay una pasada de limpieza (nlp.pipe), una
+    llamada al modelo de embeddings, una única consulta a la BD (JOIN
+    LATERAL), una asignación de clusters y una llamada al reranker.
+
+    Args:
+        busquedas: Lista de (puesto, descripcion).
+        ks: Top-k de cada búsqueda (por defecto TOP_K para todas).
+
+    Returns:
+        Una lista de ResultadoRanking por búsqueda, en el mismo orden.
+    """
+    ks = list(ks) if ks is not None else [TOP_K] * len(busquedas)
+    lote = _iniciar_lote(busquedas, ks)
+    if lote.pendientes:
+        try:
+            calculados = _buscar_lote_sin_cache(
+                [busquedas[i] for i in lote.pendientes], [ks[i] for i in lote.pendientes], lote.con_embedding
             )
-            resultados = query
-
-        # 4. Preparar objetos para clustering
-        candidatos_para_clustering: List[EmbeddingDTO] = []
-        for candidato, distancia in resultados:
-            vector = getattr(candidato, "embedding", None)
-            if vector is None:
-                logger.warning(
-                    f"No se encontró 'embedding' para el candidato {candidato.candidato_id}"
-                )
-                continue
-            candidatos_para_clustering.append(
-                EmbeddingDTO(
-                    candidato_id=str(candidato.candidato_id),
-                    embedding=vector.to_list() if hasattr(vector, "to_list") else list(vector)
+        except Exception:
+            BUSQUEDAS.inc(len(lote.pendientes), tipo="lote", resultado="error")
+            raise
+        _completar_lote(lote, calculados)
+    return lote.rankings
+
+
+async def buscar_candidatos_similares_lote_async(
+    busquedas: List[Tuple[Optional[str], str]],
+    ks: Optional[List[int]] = None
+) -> List[List[ResultadoRanking]]:
+    """
+    Versión asíncrona de buscar_candidatos_similares_lote para los
+    endpoints (mismo reparto que buscar_pagina_similares_async).
+    """
+    with DURACION_BUSQUEDA.cronometrar(tipo="lote"):
+        ks = list(ks) if ks is not None else [TOP_K] * len(busquedas)
+        lote = await asyncio.to_thread(_iniciar_lote, busquedas, ks)
+        if lote.pendientes:
+            try:
+                calculados = await _buscar_lote_sin_cache_async(
+                    [busquedas[i] for i in lote.pendientes], [ks[i] for i in lote.pendientes], lote.con_embedding
                 )
-            )
+            except Exception:
+                BUSQUEDAS.inc(len(lote.pendientes), tipo="lote", resultado="error")
+                raise
+            _completar_lote(lote, calculados)
+        return lote.rankings
 
-        # 5. Ejecutar clustering KMeans (maneja n_samples < n_clusters)
-        clustering_service = ClusteringService(n_clusters=3)
-        asignaciones: List[ClusterAssignment] = clustering_service.fit_predict(
-            candidatos_para_clustering
-        )
-        mapa_clusters = {a.candidato_id: a.cluster_id for a in asignaciones}
-
-        # 6. Construcción del ranking enriquecido con cluster_id
-        ranking_resultados: List[ResultadoRanking] = []
-        for i, (candidato, distancia) in enumerate(resultados):
-            similitud = 1 - distancia if distancia <= 1 else 0
-            cid = str(candidato.candidato_id)
-
-            ranking = ResultadoRanking(
-                candidato_id=cid,
-                similitud=round(similitud, 4),
-                ranking=i + 1,
-                puesto=candidato.puesto,
-                cluster_id=mapa_clusters.get(cid)
-            )
-            ranking_resultados.append(ranking)
 
-        
-        # 7. Aplicar reranking si se ha cargado el modelo
-        # Se asume que el modelo de reranking está en "models/reranker.joblib"
-        # y que la clase RerankingService está implementada
-        try:
-            reranker = RerankingService("models/reranker.joblib")
-            ranking_resultados = reranker.predict(ranking_resultados)
-            logger.info("Reranking aplicado correctamente")
-        except Exception as e:
-            logger.warning(f"No se aplicó reranking: {e}")
-        # Ahora ranking_resultados incluye adjusted_score y ranking re-asignado
-        return ranking_resultados
+def _buscar_lote_sin_cache(
+    busquedas: List[Tuple[Optional[str], str]],
+    ks: List[int],
+    con_embedding: bool
+) -> List[List[ResultadoRanking]]:
+    """Pipeline por lotes de buscar_candidatos_similares_lote, sin cache"""
+    if not busquedas:
+        return []
+    embeddings_busqueda = _embeddings_lote(busquedas)
 
+    # 3. Top-k de todas las búsquedas a la vez (pgvector: una consulta LATERAL;
+    # numpy: un único producto matricial)
+    try:
+        with medir_etapa("busqueda_lote", "vectorial"):
+            filas_por_busqueda = obtener_store().buscar_lote(
+                embeddings_busqueda,
+                [puesto for puesto, _ in busquedas],
+                k=ks,
+                con_embedding=con_embedding
+            )
+    except Exception as e:
+        logger.error("Error en búsqueda vectorial por lotes: %s", e)
+        raise
+    return _rankings_lote(filas_por_busqueda)
 
-        logger.info(f"Búsqueda completada: {len(ranking_resultados)} resultados")
-        return ranking_resultados
 
+async def _buscar_lote_sin_cache_async(
+    busquedas: List[Tuple[Optional[str], str]],
+    ks: List[int],
+    con_embedding: bool
+) -> List[List[ResultadoRanking]]:
+    """_buscar_lote_sin_cache con las etapas de CPU en un hilo y la consulta esperada"""
+    if not busquedas:
+        return []
+    embeddings_busqueda = await asyncio.to_thread(_embeddings_lote, busquedas)
+    try:
+        with medir_etapa("busqueda_lote", "vectorial"):
+            filas_por_busqueda = await obtener_store().buscar_lote_async(
+                embeddings_busqueda,
+                [puesto for puesto, _ in busquedas],
+                k=ks,
+                con_embedding=con_embedding
+            )
     except Exception as e:
-        logger.error(f"Error en búsqueda vectorial: {e}")
+        logger.error("Error en búsqueda vectorial por lotes: %s", e)
         raise
-    finally:
-        session.close()
+    return await asyncio.to_thread(_rankings_lote, filas_por_busqueda)
+
+
+def _embeddings_lote(busquedas: List[Tuple[Optional[str], str]]):
+    """Pasos 1 y 2 de la búsqueda por lotes: limpieza y embeddings del lote completo"""
+    logger.debug("Procesando búsqueda por lotes de %d perfiles", len(busquedas))
+    with medir_etapa("busqueda_lote", "limpieza"):
+        textos_limpios = limpiar_textos_para_embedding([descripcion for _, descripcion in busquedas])
+    with medir_etapa("busqueda_lote", "embedding"):
+        return generar_embeddings(textos_limpios)
+
+
+def _rankings_lote(filas_por_busqueda: List[list]) -> List[List[ResultadoRanking]]:
+    """Pasos 4 y 5 de la búsqueda por lotes: clusters y reranking de todo el lote"""
+    # 4. Clusters al vuelo de todas las filas del lote a la vez
+    with medir_etapa("busqueda_lote", "clusters"):
+        asignados = _clusters_al_vuelo([fila for filas in filas_por_busqueda for fila in filas])
+        rankings = [_construir_ranking(filas, asignados) for filas in filas_por_busqueda]
+
+    # 5. Reranking de todo el lote con una sola predicción
+    reranker = obtener_reranker()
+    if reranker is not None:
+        try:
+            with medir_etapa("busqueda_lote", "reranking"):
+                rankings = reranker.predict_lotes(rankings)
+        except Exception as e:
+            logger.warning("No se aplicó reranking: %s", e)
+
+    logger.info(
+        "Búsqueda por lotes completada: %d resultados para %d perfiles",
+        sum(len(r) for r in rankings), len(rankings)
+    )
+    return rankings
@@ -0,0 +1,444 @@
+# services/vector_index.py
+"""
+Gestión del índice ANN (HNSW / IVFFlat) sobre evalia_embeddings.embedding.
+
+Sin índice, cada búsqueda recorre la tabla entera calculando cosine_distance.
+Este módulo crea y reconstruye el índice con parámetros configurables,
+ajusta los parámetros de búsqueda por consulta y reporta su estado.
+
+Con EVALIA_VECTOR_COMPRESION (services/vector_db.py) el índice se construye
+sobre la representación comprimida (halfvec o binary_quantize) en lugar
+del vector completo.
+
+Configuración (variables de entorno):
+  - EVALIA_INDEX_TIPO: "hnsw" (por defecto), "ivfflat" o "ninguno"
+  - EVALIA_HNSW_M / EVALIA_HNSW_EF_CONSTRUCTION: parámetros de construcción HNSW
+  - EVALIA_HNSW_EF_SEARCH: candidatos explorados por consulta HNSW
+  - EVALIA_HNSW_ITERATIVE_SCAN: "auto" (por defecto), "off" o "strict_order".
+    Con "strict_order" (pgvector >= 0.8) el recorrido iterativo sigue
+    explorando el grafo hasta completar k filas que pasen los filtros
+    (puesto, cursor de paginación). Con "off", hnsw.ef_search se dimensiona
+    para llegar hasta la página pedida y la paginación se corta al alcanzar
+    el máximo de ef_search. "auto" usa "strict_order" si la versión de
+    pgvector lo admite y "off" si no
+  - EVALIA_IVFFLAT_LISTS: listas IVFFlat (0 = automático según nº de filas)
+  - EVALIA_IVFFLAT_PROBES: listas exploradas por consulta IVFFlat
+  - EVALIA_INDEX_MAINTENANCE_WORK_MEM: memoria para construir el índice (p. ej. "1GB")
+"""
+
+import os
+import math
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from app2_ia.services.vector_db import (
+    engine,
+    EmbeddingCandidato,
+    requerir_bd,
+    VECTOR_COMPRESION,
+    COMPRESIONES,
+    candidatos_primera_etapa,
+    describir_almacenamiento,
+    factor_rescore,
+    expresion_indexada
+)
+
+logger = logging.getLogger(__name__)
+
+TIPOS_INDICE = {"hnsw", "ivfflat", "ninguno"}
+
+INDEX_TIPO = os.getenv("EVALIA_INDEX_TIPO", "hnsw").strip().lower()
+HNSW_M = int(os.getenv("EVALIA_HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("EVALIA_HNSW_EF_CONSTRUCTION", "64"))
+HNSW_EF_SEARCH = int(os.getenv("EVALIA_HNSW_EF_SEARCH", "40"))
+HNSW_ITERATIVE_SCAN = os.getenv("EVALIA_HNSW_ITERATIVE_SCAN", "auto").strip().lower()
+IVFFLAT_LISTS = int(os.getenv("EVALIA_IVFFLAT_LISTS", "0"))
+IVFFLAT_PROBES = int(os.getenv("EVALIA_IVFFLAT_PROBES", "10"))
+MAINTENANCE_WORK_MEM = os.getenv("EVALIA_INDEX_MAINTENANCE_WORK_MEM")
+
+if INDEX_TIPO not in TIPOS_INDICE:
+    raise RuntimeError(
+        f"EVALIA_INDEX_TIPO inválido ('{INDEX_TIPO}'). Valores permitidos: {sorted(TIPOS_INDICE)}"
+    )
+# "relaxed_order" no se admite: puede devolver filas fuera de orden y romper
+# la paginación por (distancia, candidato_id)
+if HNSW_ITERATIVE_SCAN not in ("auto", "off", "strict_order"):
+    raise RuntimeError(
+        f"EVALIA_HNSW_ITERATIVE_SCAN inválido ('{HNSW_ITERATIVE_SCAN}'). Valores permitidos: auto, off, strict_order"
+    )
+
+TABLA = EmbeddingCandidato.__tablename__
+NOMBRE_INDICE = f"{TABLA}_embedding_ann_idx"
+
+# Máximo de hnsw.ef_search admitido por pgvector
+HNSW_EF_SEARCH_MAX = 1000
+# halfvec y binary_quantize aparecen en pgvector 0.7.0
+PGVECTOR_MINIMO_COMPRESION = (0, 7, 0)
+# hnsw.iterative_scan aparece en pgvector 0.8.0
+PGVECTOR_MINIMO_ITERATIVO = (0, 8, 0)
+
+# Clase de operadores del índice -> modo de compresión
+_COMPRESION_DE_OPCLASE = {
+    "vector_cosine_ops": "ninguna",
+    "halfvec_cosine_ops": "halfvec",
+    "bit_hamming_ops": "binaria",
+}
+
+
+@contextmanager
+def _conexion_autocommit():
+    """
+    CREATE/DROP INDEX CONCURRENTLY no puede ejecutarse dentro de una
+    transacción. Construir el índice puede durar más que
+    EVALIA_BD_STATEMENT_TIMEOUT_MS: en esta sesión no hay límite.
+    """
+    requerir_bd()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("SET statement_timeout = 0"))
+        try:
+            yield conn
+        finally:
+            # La conexión vuelve al pool con el límite de la configuración
+            conn.execute(text("RESET statement_timeout"))
+
+
+def _filas_estimadas(conn) -> int:
+    return int(conn.execute(
+        text("SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = to_regclass(:tabla)"),
+        {"tabla": TABLA}
+    ).scalar() or 0)
+
+
+def _listas_ivfflat(filas: int) -> int:
+    """Regla recomendada por pgvector: filas/1000 hasta 1M filas, sqrt(filas) a partir de ahí"""
+    if IVFFLAT_LISTS > 0:
+        return IVFFLAT_LISTS
+    if filas <= 1_000_000:
+        return max(1, filas // 1000)
+    return int(math.sqrt(filas))
+
+
+def _sql_crear_indice(nombre: str, tipo: str, filas: int, compresion: str) -> str:
+    if tipo == "hnsw":
+        opciones = f"m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION}"
+    else:
+        opciones = f"lists = {_listas_ivfflat(filas)}"
+    expresion, opclase = expresion_indexada(compresion)
+    return (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {nombre} ON {TABLA} "
+        f"USING {tipo} ({expresion} {opclase}) WITH ({opciones})"
+    )
+
+
+_SQL_VERSION_PGVECTOR = text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+
+
+def _parsear_version(version: Optional[str]) -> Optional[tuple]:
+    if version is None:
+        return None
+    return tuple(int(parte) for parte in version.split(".") if parte.isdigit())
+
+
+def version_pgvector(conn) -> Optional[tuple]:
+    """Versión instalada de la extensión vector, p. ej. (0, 8, 0); None si no está"""
+    return _parsear_version(conn.execute(_SQL_VERSION_PGVECTOR).scalar())
+
+
+# Modo de hnsw.iterative_scan decidido con EVALIA_HNSW_ITERATIVE_SCAN=auto
+# (se consulta la versión de pgvector una vez por proceso)
+_recorrido_resuelto: Optional[str] = None
+
+
+def _resolver_recorrido(version: Optional[tuple]) -> str:
+    global _recorrido_resuelto
+    if _recorrido_resuelto is None:
+        if version is not None and version >= PGVECTOR_MINIMO_ITERATIVO:
+            _recorrido_resuelto = "strict_order"
+            logger.info("Recorrido iterativo HNSW activado (pgvector %s)", ".".join(map(str, version)))
+        else:
+            _recorrido_resuelto = "off"
+            logger.warning(
+                "pgvector %s no admite hnsw.iterative_scan: la paginación llega como mucho a %d resultados",
+                ".".join(map(str, version)) if version else "desconocido", HNSW_EF_SEARCH_MAX // factor_rescore()
+            )
+    return _recorrido_resuelto
+
+
+def recorrido_iterativo(conn=None) -> str:
+    """
+    Modo efectivo de hnsw.iterative_scan ("off" o "strict_order"). Con
+    EVALIA_HNSW_ITERATIVE_SCAN=auto lo decide la versión de pgvector, que se
+    consulta con `conn` la primera vez; sin `conn` y aún sin decidir, "off".
+    """
+    if HNSW_ITERATIVE_SCAN != "auto":
+        return HNSW_ITERATIVE_SCAN
+    if _recorrido_resuelto is None and conn is not None:
+        return _resolver_recorrido(version_pgvector(conn))
+    return _recorrido_resuelto or "off"
+
+
+async def recorrido_iterativo_async(conn) -> str:
+    """recorrido_iterativo sobre una AsyncConnection"""
+    if HNSW_ITERATIVE_SCAN != "auto" or _recorrido_resuelto is not None:
+        return recorrido_iterativo()
+    version = (await conn.execute(_SQL_VERSION_PGVECTOR)).scalar()
+    return _resolver_recorrido(_parsear_version(version))
+
+
+def profundidad_maxima(compresion: str = VECTOR_COMPRESION) -> Optional[int]:
+    """
+    Resultados que puede recorrer la paginación (None = sin límite). Con
+    HNSW sin recorrido iterativo, el índice solo devuelve hnsw.ef_search
+    candidatos y el cursor se filtra sobre ellos: no se llega más allá de
+    HNSW_EF_SEARCH_MAX (entre el factor de re-puntuación con compresión).
+    """
+    if INDEX_TIPO != "hnsw" or recorrido_iterativo() == "strict_order":
+        return None
+    return HNSW_EF_SEARCH_MAX // factor_rescore(compresion)
+
+
+def _comprobar_compresion(conn, compresion: str) -> None:
+    """Error claro si la versión de pgvector no admite el modo de compresión"""
+    if compresion == "ninguna":
+        return
+    version = version_pgvector(conn)
+    if version is None or version < PGVECTOR_MINIMO_COMPRESION:
+        raise RuntimeError(
+            f"La compresión '{compresion}' requiere pgvector >= 0.7.0 "
+            f"(instalada: {'.'.join(map(str, version)) if version else 'ninguna'})"
+        )
+
+
+def compresion_de_indice(definicion: Optional[str]) -> Optional[str]:
+    """Modo de compresión de un índice existente a partir de su definición"""
+    if not definicion:
+        return None
+    for opclase, compresion in _COMPRESION_DE_OPCLASE.items():
+        if opclase in definicion:
+            return compresion
+    return None
+
+
+def _definicion_indice(conn) -> Optional[str]:
+    return conn.execute(
+        text("SELECT pg_get_indexdef(to_regclass(:indice))"), {"indice": NOMBRE_INDICE}
+    ).scalar()
+
+
+def _preparar_construccion(conn) -> None:
+    if MAINTENANCE_WORK_MEM:
+        conn.execute(text("SELECT set_config('maintenance_work_mem', :valor, false)"),
+                     {"valor": MAINTENANCE_WORK_MEM})
+
+
+def _restaurar_construccion(conn) -> None:
+    # La conexión vuelve al pool: no dejar el ajuste de sesión aplicado
+    if MAINTENANCE_WORK_MEM:
+        conn.execute(text("RESET maintenance_work_mem"))
+
+
+def crear_indice(tipo: Optional[str] = None, compresion: Optional[str] = None) -> bool:
+    """
+    Crea el índice ANN si no existe (sin bloquear escrituras).
+    :param tipo: "hnsw" o "ivfflat"; por defecto EVALIA_INDEX_TIPO.
+    :param compresion: representación indexada; por defecto EVALIA_VECTOR_COMPRESION.
+    :return: True si se ejecutó la creación, False si el tipo es "ninguno".
+    """
+    tipo = tipo or INDEX_TIPO
+    compresion = compresion or VECTOR_COMPRESION
+    if tipo == "ninguno":
+        return False
+    with _conexion_autocommit() as conn:
+        _comprobar_compresion(conn, compresion)
+        _preparar_construccion(conn)
+        try:
+            conn.execute(text(_sql_crear_indice(NOMBRE_INDICE, tipo, _filas_estimadas(conn), compresion)))
+        finally:
+            _restaurar_construccion(conn)
+        existente = compresion_de_indice(_definicion_indice(conn))
+    if existente != compresion:
+        # IF NOT EXISTS no sustituye un índice creado con otro modo
+        logger.warning(
+            "El índice %s es de compresión '%s' pero EVALIA_VECTOR_COMPRESION='%s': "
+            "las búsquedas no lo usarán. Migrar con scripts/migrar_compresion.py",
+            NOMBRE_INDICE, existente, compresion
+        )
+    logger.info("Índice %s (%s, compresión %s) disponible", NOMBRE_INDICE, tipo, compresion)
+    return True
+
+
+def reconstruir_indice(tipo: Optional[str] = None, compresion: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Reconstruye el índice sin cortar el servicio: crea uno nuevo en paralelo,
+    elimina el anterior y renombra el nuevo. Permite cambiar de tipo, de
+    parámetros (p. ej. recalcular las listas de IVFFlat al crecer la tabla)
+    o de representación indexada (compresión).
+    :return: Estado del índice tras la reconstrucción.
+    """
+    tipo = tipo or INDEX_TIPO
+    compresion = compresion or VECTOR_COMPRESION
+    if tipo not in TIPOS_INDICE:
+        raise ValueError(f"Tipo de índice inválido: {tipo}")
+    if compresion not in COMPRESIONES:
+        raise ValueError(f"Compresión inválida: {compresion}")
+    temporal = f"{NOMBRE_INDICE}_nuevo"
+    with _conexion_autocommit() as conn:
+        _comprobar_compresion(conn, compresion)
+        # Restos de una reconstrucción interrumpida
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {temporal}"))
+        if tipo != "ninguno":
+            _preparar_construccion(conn)
+            try:
+                conn.execute(text(_sql_crear_indice(temporal, tipo, _filas_estimadas(conn), compresion)))
+            finally:
+                _restaurar_construccion(conn)
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {NOMBRE_INDICE}"))
+        if tipo != "ninguno":
+            conn.execute(text(f"ALTER INDEX {temporal} RENAME TO {NOMBRE_INDICE}"))
+    logger.info("Índice %s reconstruido (%s, compresión %s)", NOMBRE_INDICE, tipo, compresion)
+    return estado_indice()
+
+
+def analizar_tabla() -> None:
+    """Actualiza las estadísticas del planificador para la tabla de embeddings"""
+    with _conexion_autocommit() as conn:
+        conn.execute(text(f"ANALYZE {TABLA}"))
+    logger.info("ANALYZE %s completado", TABLA)
+
+
+def _ajustes_busqueda(k: int, compresion: str, iterativo: str, servidos: int = 0) -> List[Tuple[str, str]]:
+    """
+    Parámetros del índice (nombre, valor) para una búsqueda de k resultados
+    tras `servidos` ya servidos. Sin recorrido iterativo, el cursor filtra
+    los candidatos que devuelve el índice, así que ef_search tiene que
+    cubrir también los de las páginas anteriores.
+    """
+    if INDEX_TIPO == "hnsw":
+        profundidad = k if iterativo == "strict_order" else servidos + k
+        ef_search = min(
+            max(HNSW_EF_SEARCH, candidatos_primera_etapa(profundidad, compresion)), HNSW_EF_SEARCH_MAX
+        )
+        ajustes = [("hnsw.ef_search", str(ef_search))]
+        if iterativo != "off":
+            ajustes.append(("hnsw.iterative_scan", iterativo))
+        return ajustes
+    if INDEX_TIPO == "ivfflat":
+        return [("ivfflat.probes", str(IVFFLAT_PROBES))]
+    return []
+
+
+_SQL_AJUSTE = text("SELECT set_config(:nombre, :valor, true)")
+
+
+def configurar_busqueda(
+    conn,
+    k: int = 10,
+    compresion: str = VECTOR_COMPRESION,
+    servidos: int = 0
+) -> None:
+    """
+    Ajusta los parámetros del índice para la consulta actual (SET LOCAL, solo
+    dura hasta el final de la transacción).
+    :param conn: Session o Connection de SQLAlchemy con una transacción abierta.
+    :param k: Número de resultados pedidos; ef_search debe cubrir las filas
+        de la primera etapa (k, o k * factor de re-puntuación con compresión).
+    :param compresion: modo de la búsqueda (por defecto EVALIA_VECTOR_COMPRESION).
+    :param servidos: resultados servidos en páginas anteriores (paginación).
+    """
+    iterativo = recorrido_iterativo(conn) if INDEX_TIPO == "hnsw" else "off"
+    for nombre, valor in _ajustes_busqueda(k, compresion, iterativo, servidos):
+        conn.execute(_SQL_AJUSTE, {"nombre": nombre, "valor": valor})
+
+
+async def configurar_busqueda_async(
+    conn,
+    k: int = 10,
+    compresion: str = VECTOR_COMPRESION,
+    servidos: int = 0
+) -> None:
+    """configurar_busqueda sobre una AsyncConnection"""
+    iterativo = await recorrido_iterativo_async(conn) if INDEX_TIPO == "hnsw" else "off"
+    for nombre, valor in _ajustes_busqueda(k, compresion, iterativo, servidos):
+        await conn.execute(_SQL_AJUSTE, {"nombre": nombre, "valor": valor})
+
+
+def estado_indice() -> Dict[str, Any]:
+    """
+    Reporta el estado del índice ANN y de la tabla: tipo, tamaño, validez,
+    uso, filas, tuplas muertas y último ANALYZE.
+    """
+    requerir_bd()
+    with engine.connect() as conn:
+        indice = conn.execute(text(
+            "SELECT am.amname AS tipo, i.indisvalid AS valido, "
+            "       pg_relation_size(c.oid) AS bytes, "
+            "       pg_get_indexdef(c.oid) AS definicion, "
+            "       COALESCE(s.idx_scan, 0) AS escaneos "
+            "FROM pg_class c "
+            "JOIN pg_index i ON i.indexrelid = c.oid "
+            "JOIN pg_am am ON am.oid = c.relam "
+            "LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = c.oid "
+            "WHERE c.oid = to_regclass(:indice)"
+        ), {"indice": NOMBRE_INDICE}).mappings().first()
+
+        tabla = conn.execute(text(
+            "SELECT n_live_tup AS filas, n_dead_tup AS filas_muertas, "
+            "       GREATEST(last_analyze, last_autoanalyze) AS ultimo_analyze, "
+            "       pg_total_relation_size(relid) AS bytes_tabla "
+            "FROM pg_stat_user_tables WHERE relid = to_regclass(:tabla)"
+        ), {"tabla": TABLA}).mappings().first()
+        iterativo = recorrido_iterativo(conn) if INDEX_TIPO == "hnsw" else "off"
+
+    estado: Dict[str, Any] = {
+        "indice": NOMBRE_INDICE,
+        "tipo_configurado": INDEX_TIPO,
+        "almacenamiento": describir_almacenamiento(),
+        "existe": indice is not None,
+        "profundidad_maxima_paginacion": profundidad_maxima(),
+        "parametros_busqueda": (
+            {"hnsw.ef_search": HNSW_EF_SEARCH, "hnsw.iterative_scan": iterativo}
+            if INDEX_TIPO == "hnsw"
+            else {"ivfflat.probes": IVFFLAT_PROBES} if INDEX_TIPO == "ivfflat"
+            else {}
+        ),
+    }
+    if indice is not None:
+        estado.update({
+            "tipo": indice["tipo"],
+            "valido": indice["valido"],
+            "bytes": indice["bytes"],
+            "definicion": indice["definicion"],
+            "compresion": compresion_de_indice(indice["definicion"]),
+            "escaneos": indice["escaneos"],
+        })
+    if tabla is not None:
+        ultimo = tabla["ultimo_analyze"]
+        estado.update({
+            "filas": tabla["filas"],
+            "filas_muertas": tabla["filas_muertas"],
+            "bytes_tabla": tabla["bytes_tabla"],
+            "ultimo_analyze": ultimo.isoformat() if ultimo else None,
+        })
+
+    # Avisos de salud
+    avisos = []
+    if INDEX_TIPO != "ninguno" and indice is None:
+        avisos.append("No existe índice ANN: las búsquedas hacen un recorrido secuencial")
+    if indice is not None and not indice["valido"]:
+        avisos.append("Índice inválido (construcción interrumpida): reconstruir")
+    if indice is not None and indice["tipo"] != INDEX_TIPO:
+        avisos.append(f"El índice es {indice['tipo']} pero la configuración pide {INDEX_TIPO}")
+    if indice is not None and estado["compresion"] != VECTOR_COMPRESION:
+        avisos.append(
+            f"El índice es de compresión '{estado['compresion']}' pero la configuración pide "
+            f"'{VECTOR_COMPRESION}': migrar con scripts/migrar_compresion.py"
+        )
+    if tabla is not None and tabla["filas"] and tabla["filas_muertas"] > 0.2 * tabla["filas"]:
+        avisos.append("Más de un 20% de tuplas muertas: conviene VACUUM/reconstruir")
+    if tabla is not None and tabla["ultimo_analyze"] is None:
+        avisos.append("La tabla nunca se ha analizado: ejecutar ANALYZE")
+    estado["avisos"] = avisos
+    return estado
@@ -0,0 +1,695 @@
+# services/vector_store.py
+"""
+Almacén de vectores intercambiable.
+
+La ingesta y la búsqueda hablan con un VectorStore, no con SQLAlchemy:
+  - PgVectorStore ("pgvector", por defecto): PostgreSQL + pgvector con el
+    índice ANN (services/vector_db.py y services/vector_index.py).
+  - NumpyVectorStore ("numpy"): todos los embeddings en una única matriz
+    float32 contigua en el proceso (opcionalmente mapeada a disco). Top-k
+    exacto con un producto matricial + argpartition y filtro por puesto con
+    un índice precalculado. Pensado para clientes medianos (búsqueda en
+    submilisegundos), pruebas y benchmarks sin base de datos.
+
+Las operaciones tienen una versión asíncrona (sufijo _async) que usan los
+endpoints: con pgvector espera la BD con el motor asíncrono de SQLAlchemy;
+con numpy ejecuta la versión síncrona en un hilo.
+
+Configuración (variables de entorno):
+  - EVALIA_VECTOR_STORE: "pgvector" o "numpy"
+  - EVALIA_NUMPY_STORE_PATH: directorio donde persistir la matriz del
+    almacén numpy (memmap, de un solo proceso); sin valor, el almacén vive
+    solo en memoria
+"""
+
+import os
+import json
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+
+from app2_ia.config import EMBEDDING_DIM
+
+logger = logging.getLogger(__name__)
+
+VECTOR_STORES = {"pgvector", "numpy"}
+VECTOR_STORE = os.getenv("EVALIA_VECTOR_STORE", "pgvector").strip().lower()
+NUMPY_STORE_PATH = os.getenv("EVALIA_NUMPY_STORE_PATH")
+
+if VECTOR_STORE not in VECTOR_STORES:
+    raise RuntimeError(
+        f"EVALIA_VECTOR_STORE inválido ('{VECTOR_STORE}'). Valores permitidos: {sorted(VECTOR_STORES)}"
+    )
+
+
+class Vecino(NamedTuple):
+    """Candidato devuelto por una búsqueda, ordenado por distancia coseno"""
+    candidato_id: int
+    puesto: str
+    cluster_id: Optional[int]
+    # Solo se rellena si se pidió con_embedding y el candidato no tiene cluster_id
+    embedding: Optional[List[float]]
+    distancia: float
+
+
+# Fases de una búsqueda: solo candidatos del puesto pedido o todo el almacén
+FASE_PUESTO = "puesto"
+FASE_GENERAL = "general"
+
+
+class Posicion(NamedTuple):
+    """Último resultado servido de una búsqueda paginada (clave keyset)"""
+    fase: str
+    distancia: float
+    candidato_id: int
+
+
+def _lista_ks(k: Union[int, Sequence[int]], n: int) -> List[int]:
+    return [k] * n if isinstance(k, int) else list(k)
+
+
+class VectorStore(ABC):
+    """
+    Interfaz común de los almacenes de vectores.
+
+    Semántica de búsqueda (igual en todos los backends): si hay candidatos
+    del puesto pedido se devuelven solo esos (fase "puesto"); si no, o si no
+    se pide puesto, los k más cercanos de todo el almacén (fase "general").
+    Los resultados se ordenan por (distancia, candidato_id), que es también
+    la clave de paginación.
+    """
+
+    nombre: str = ""
+
+    def inicializar(self, crear_indice_ann: bool = True) -> None:
+        """Prepara el almacén en el arranque (tablas, índices, ficheros)"""
+
+    @abstractmethod
+    def comprobar(self) -> None:
+        """Lanza una excepción si el almacén no está disponible (readiness)"""
+
+    @abstractmethod
+    def existentes(self, candidato_ids: Iterable[int]) -> Set[int]:
+        """Subconjunto de candidato_ids que ya están almacenados"""
+
+    @abstractmethod
+    def insertar_lote(self, objetos: List[Dict[str, Any]]) -> Set[int]:
+        """
+        Inserta un lote (mismo formato que vector_db.insertar_en_vectordb),
+        ignorando los candidato_id ya existentes.
+        :return: candidato_id efectivamente insertados.
+        """
+
+    @abstractmethod
+    def buscar_lote(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        puestos: Sequence[Optional[str]],
+        k: Union[int, Sequence[int]] = 10,
+        con_embedding: bool = False
+    ) -> List[List[Vecino]]:
+        """Top-k de varias búsquedas (k común o uno por búsqueda); una lista de Vecino por búsqueda"""
+
+    @abstractmethod
+    def buscar_pagina(
+        self,
+        embedding: Sequence[float],
+        puesto: Optional[str],
+        k: int = 10,
+        con_embedding: bool = False,
+        despues: Optional[Posicion] = None,
+        servidos: int = 0
+    ) -> Tuple[List[Vecino], str]:
+        """
+        Una página de resultados. Sin `despues` es la primera página y se
+        decide la fase; con `despues` se continúa esa fase a partir de la
+        posición indicada (keyset, sin OFFSET).
+        :param servidos: resultados servidos en páginas anteriores (el índice
+            HNSW sin recorrido iterativo necesita explorar también esos).
+        :return: (vecinos, fase)
+        """
+
+    def profundidad_maxima(self) -> Optional[int]:
+        """Resultados que puede recorrer la paginación; None si no hay límite"""
+        return None
+
+    def buscar(
+        self,
+        embedding: Sequence[float],
+        puesto: Optional[str],
+        k: int = 10,
+        con_embedding: bool = False
+    ) -> List[Vecino]:
+        """Top-k de una búsqueda"""
+        return self.buscar_pagina(embedding, puesto, k, con_embedding)[0]
+
+    # -- Versiones asíncronas (endpoints) ---------------------------------
+    # Misma semántica que las síncronas. Por defecto ejecutan la versión
+    # síncrona en un hilo; PgVectorStore las implementa con el motor
+    # asíncrono de SQLAlchemy.
+    async def existentes_async(self, candidato_ids: Iterable[int]) -> Set[int]:
+        return await asyncio.to_thread(self.existentes, list(candidato_ids))
+
+    async def insertar_lote_async(self, objetos: List[Dict[str, Any]]) -> Set[int]:
+        return await asyncio.to_thread(self.insertar_lote, objetos)
+
+    async def buscar_lote_async(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        puestos: Sequence[Optional[str]],
+        k: Union[int, Sequence[int]] = 10,
+        con_embedding: bool = False
+    ) -> List[List[Vecino]]:
+        return await asyncio.to_thread(self.buscar_lote, embeddings, puestos, k, con_embedding)
+
+    async def buscar_pagina_async(
+        self,
+        embedding: Sequence[float],
+        puesto: Optional[str],
+        k: int = 10,
+        con_embedding: bool = False,
+        despues: Optional[Posicion] = None,
+        servidos: int = 0
+    ) -> Tuple[List[Vecino], str]:
+        return await asyncio.to_thread(self.buscar_pagina, embedding, puesto, k, con_embedding, despues, servidos)
+
+
+# ----------------------------------------------------------------------
+# PostgreSQL + pgvector
+# ----------------------------------------------------------------------
+def _a_vecino(fila) -> Vecino:
+    return Vecino(fila.candidato_id, fila.puesto, fila.cluster_id, fila.embedding, fila.distancia)
+
+
+class PgVectorStore(VectorStore):
+    """Almacén sobre PostgreSQL + pgvector (comportamiento histórico)"""
+
+    nombre = "pgvector"
+
+    def __init__(self):
+        from app2_ia.services import vector_db
+        vector_db.requerir_bd()
+        self._db = vector_db
+
+    def inicializar(self, crear_indice_ann: bool = True) -> None:
+        self._db.inicializar_bd()
+        if crear_indice_ann:
+            from app2_ia.services.vector_index import crear_indice
+            crear_indice()
+
+    def comprobar(self) -> None:
+        from sqlalchemy import text
+        with self._db.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    def existentes(self, candidato_ids: Iterable[int]) -> Set[int]:
+        return self._db.candidatos_existentes(candidato_ids)
+
+    def insertar_lote(self, objetos: List[Dict[str, Any]]) -> Set[int]:
+        return self._db.insertar_lote_en_vectordb(objetos)
+
+    def profundidad_maxima(self) -> Optional[int]:
+        from app2_ia.services.vector_index import profundidad_maxima
+        return profundidad_maxima()
+
+    def buscar_pagina(self, embedding, puesto, k=10, con_embedding=False, despues=None, servidos=0):
+        from app2_ia.services.vector_index import configurar_busqueda
+        with self._db.engine.begin() as conn:
+            # Parámetros del índice ANN para esta transacción
+            configurar_busqueda(conn, k=k, servidos=servidos)
+            if despues is None:
+                filas = self._db.buscar_vecinos(conn, embedding, puesto, k=k, con_embedding=con_embedding)
+                fase = filas[0].fase if filas else FASE_GENERAL
+            else:
+                fase = despues.fase
+                filas = self._db.buscar_vecinos_despues(
+                    conn, embedding,
+                    puesto if fase == FASE_PUESTO else None,
+                    despues.distancia, despues.candidato_id,
+                    k=k, con_embedding=con_embedding
+                )
+        return [_a_vecino(fila) for fila in filas], fase
+
+    def buscar_lote(self, embeddings, puestos, k=10, con_embedding=False) -> List[List[Vecino]]:
+        from app2_ia.services.vector_index import configurar_busqueda
+        ks = _lista_ks(k, len(embeddings))
+        with self._db.engine.begin() as conn:
+            configurar_busqueda(conn, k=max(ks, default=1))
+            grupos = self._db.buscar_vecinos_lote(
+                conn, list(embeddings), list(puestos), ks, con_embedding=con_embedding
+            )
+        return [[_a_vecino(fila) for fila in filas] for filas in grupos]
+
+    async def existentes_async(self, candidato_ids: Iterable[int]) -> Set[int]:
+        return await self._db.candidatos_existentes_async(candidato_ids)
+
+    async def insertar_lote_async(self, objetos: List[Dict[str, Any]]) -> Set[int]:
+        return await self._db.insertar_lote_en_vectordb_async(objetos)
+
+    async def buscar_pagina_async(self, embedding, puesto, k=10, con_embedding=False, despues=None, servidos=0):
+        from app2_ia.services.vector_index import configurar_busqueda_async
+        async with self._db.obtener_engine_async().begin() as conn:
+            await configurar_busqueda_async(conn, k=k, servidos=servidos)
+            if despues is None:
+                filas = await self._db.buscar_vecinos_async(conn, embedding, puesto, k=k, con_embedding=con_embedding)
+                fase = filas[0].fase if filas else FASE_GENERAL
+            else:
+                fase = despues.fase
+                filas = await self._db.buscar_vecinos_despues_async(
+                    conn, embedding,
+                    puesto if fase == FASE_PUESTO else None,
+                    despues.distancia, despues.candidato_id,
+                    k=k, con_embedding=con_embedding
+                )
+        return [_a_vecino(fila) for fila in filas], fase
+
+    async def buscar_lote_async(self, embeddings, puestos, k=10, con_embedding=False) -> List[List[Vecino]]:
+        from app2_ia.services.vector_index import configurar_busqueda_async
+        ks = _lista_ks(k, len(embeddings))
+        async with self._db.obtener_engine_async().begin() as conn:
+            await configurar_busqueda_async(conn, k=max(ks, default=1))
+            grupos = await self._db.buscar_vecinos_lote_async(
+                conn, list(embeddings), list(puestos), ks, con_embedding=con_embedding
+            )
+        return [[_a_vecino(fila) for fila in filas] for filas in grupos]
+
+
+# ----------------------------------------------------------------------
+# NumPy en proceso
+# ----------------------------------------------------------------------
+# Un filtro por puesto es selectivo si deja como mucho 1/N de las filas del almacén
+_FRACCION_FILTRO_SELECTIVO = 4
+
+
+def _top_k(distancias: np.ndarray, ids: np.ndarray, k: int) -> np.ndarray:
+    """
+    Posiciones de las k menores distancias ordenadas por (distancia,
+    candidato_id), el mismo orden que ORDER BY distancia, candidato_id en SQL
+    """
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if len(distancias) > k:
+        # Todos los empatados con la k-ésima distancia, para desempatar por id
+        umbral = np.partition(distancias, k - 1)[k - 1]
+        candidatos = np.nonzero(distancias <= umbral)[0]
+    else:
+        candidatos = np.arange(len(distancias))
+    return candidatos[np.lexsort((ids[candidatos], distancias[candidatos]))[:k]]
+
+
+def _bloquear_en_exclusiva(fichero) -> None:
+    """
+    Bloqueo exclusivo y sin espera sobre `fichero` (se libera al cerrarlo o
+    al terminar el proceso). OSError si otro proceso ya lo tiene.
+    """
+    if os.name == "nt":
+        import msvcrt
+        fichero.seek(0)
+        msvcrt.locking(fichero.fileno(), msvcrt.LK_NBLCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(fichero.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Almacén en proceso: matriz float32 (capacidad x dim) que crece por
+    duplicación, normas precalculadas para la distancia coseno y un índice
+    puesto -> filas. Con `ruta`, la matriz es un np.memmap sobre
+    `ruta/embeddings.f32` y los metadatos de cada fila (candidato_id,
+    puesto, cluster_id) se añaden a `ruta/filas.jsonl`, así que el almacén
+    sobrevive a reinicios y cada inserción solo escribe sus filas nuevas.
+
+    Un directorio es de un solo proceso: se bloquea en exclusiva al abrirlo
+    y un segundo proceso (u otra instancia) que intente abrirlo falla. Con
+    varios workers de uvicorn hay que usar pgvector o un solo worker.
+
+    Las lecturas toman una instantánea (matriz y número de filas) bajo el
+    lock y calculan sin él: las inserciones solo escriben filas nuevas.
+    """
+
+    nombre = "numpy"
+    _CAPACIDAD_INICIAL = 1024
+
+    def __init__(self, dim: int = EMBEDDING_DIM, ruta: Optional[str] = NUMPY_STORE_PATH):
+        self.dim = dim
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._n = 0
+        self._candidato_ids: List[int] = []
+        self._puestos: List[str] = []
+        self._cluster_ids: List[Optional[int]] = []
+        self._fila_de: Dict[int, int] = {}
+        self._filas_puesto: Dict[str, List[int]] = {}
+        self._indice_puesto: Dict[str, np.ndarray] = {}
+        self._matriz = np.empty((0, dim), dtype=np.float32)
+        # Normas de las filas con 0 sustituido por 1 (distancia coseno sin dividir por cero)
+        self._normas = np.empty(0, dtype=np.float32)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._fichero_bloqueo = None
+        self._log_filas = None
+        if ruta:
+            try:
+                self._abrir(ruta)
+            except BaseException:
+                # No dejar el directorio bloqueado si no se pudo abrir
+                self.cerrar()
+                raise
+
+    # -- Persistencia ----------------------------------------------------
+    @property
+    def _fichero_matriz(self) -> str:
+        return os.path.join(self.ruta, "embeddings.f32")
+
+    @property
+    def _fichero_filas(self) -> str:
+        return os.path.join(self.ruta, "filas.jsonl")
+
+    @property
+    def _fichero_cabecera(self) -> str:
+        return os.path.join(self.ruta, "almacen.json")
+
+    def _bloquear(self) -> None:
+        self._fichero_bloqueo = open(os.path.join(self.ruta, "almacen.lock"), "a+b")
+        try:
+            _bloquear_en_exclusiva(self._fichero_bloqueo)
+        except OSError:
+            self._fichero_bloqueo.close()
+            self._fichero_bloqueo = None
+            raise RuntimeError(
+                f"El almacén numpy en {self.ruta} ya lo tiene abierto otro proceso. "
+                "EVALIA_NUMPY_STORE_PATH es de un solo proceso: usa un solo worker o pgvector"
+            )
+
+    def _leer_filas(self) -> List[list]:
+        """
+        Filas confirmadas de filas.jsonl. Una última línea incompleta (corte
+        a mitad de una inserción) se descarta y se recorta del fichero.
+        """
+        if not os.path.exists(self._fichero_filas):
+            return []
+        with open(self._fichero_filas, "rb") as f:
+            contenido = f.read()
+        completo = contenido[:contenido.rfind(b"\n") + 1]
+        if len(completo) < len(contenido):
+            logger.warning("Almacén numpy en %s: se descarta una inserción incompleta", self.ruta)
+            with open(self._fichero_filas, "r+b") as f:
+                f.truncate(len(completo))
+        return [json.loads(linea) for linea in completo.splitlines()]
+
+    def _convertir_metadatos_json(self) -> None:
+        """Pasa un almacén con el formato anterior (metadatos.json reescrito entero) a filas.jsonl"""
+        anterior = os.path.join(self.ruta, "metadatos.json")
+        if not os.path.exists(anterior) or os.path.exists(self._fichero_filas):
+            return
+        with open(anterior, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        temporal = self._fichero_filas + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            for fila in zip(meta["candidato_ids"], meta["puestos"], meta["cluster_ids"]):
+                f.write(json.dumps(list(fila)) + "\n")
+        with open(self._fichero_cabecera, "w", encoding="utf-8") as f:
+            json.dump({"dim": meta["dim"]}, f)
+        os.replace(temporal, self._fichero_filas)
+        os.remove(anterior)
+        logger.info("Almacén numpy en %s convertido a filas.jsonl (%d filas)", self.ruta, meta["n"])
+
+    def _abrir(self, ruta: str) -> None:
+        os.makedirs(ruta, exist_ok=True)
+        self._bloquear()
+        self._convertir_metadatos_json()
+        if not os.path.exists(self._fichero_cabecera):
+            with open(self._fichero_cabecera, "w", encoding="utf-8") as f:
+                json.dump({"dim": self.dim}, f)
+        with open(self._fichero_cabecera, "r", encoding="utf-8") as f:
+            dim = json.load(f)["dim"]
+        if dim != self.dim:
+            raise RuntimeError(
+                f"El almacén numpy en {ruta} tiene {dim}D y EMBEDDING_DIM es {self.dim}"
+            )
+
+        filas = self._leer_filas()
+        capacidad = os.path.getsize(self._fichero_matriz) // (4 * self.dim) if os.path.exists(self._fichero_matriz) else 0
+        if capacidad < len(filas):
+            raise RuntimeError(
+                f"El almacén numpy en {ruta} está dañado: {len(filas)} filas y espacio para {capacidad}"
+            )
+        self._log_filas = open(self._fichero_filas, "ab")
+        if capacidad == 0:
+            self._redimensionar(self._CAPACIDAD_INICIAL)
+            return
+
+        self._matriz = np.memmap(self._fichero_matriz, dtype=np.float32, mode="r+",
+                                 shape=(capacidad, self.dim))
+        self._n = len(filas)
+        self._normas = np.ones(capacidad, dtype=np.float32)
+        self._normas[:self._n] = self._normas_seguras(self._matriz[:self._n])
+        self._ids = np.zeros(capacidad, dtype=np.int64)
+        for fila, (cid, puesto, cluster_id) in enumerate(filas):
+            self._candidato_ids.append(cid)
+            self._puestos.append(puesto)
+            self._cluster_ids.append(cluster_id)
+            self._fila_de[cid] = fila
+            self._filas_puesto.setdefault(puesto, []).append(fila)
+        self._ids[:self._n] = self._candidato_ids
+        logger.info("Almacén numpy cargado de %s: %s embeddings", ruta, self._n)
+
+    def _anadir_filas(self, objetos: List[Dict[str, Any]]) -> None:
+        """Confirma en disco las filas nuevas (requiere lock): primero la matriz, después su metadato"""
+        self._matriz.flush()
+        self._log_filas.write(b"".join(
+            json.dumps([int(o["candidato_id"]), o["puesto"], o.get("cluster_id")]).encode("utf-8") + b"\n"
+            for o in objetos
+        ))
+        self._log_filas.flush()
+        os.fsync(self._log_filas.fileno())
+
+    def cerrar(self) -> None:
+        """Vuelca la matriz y libera el bloqueo del directorio"""
+        with self._lock:
+            if isinstance(self._matriz, np.memmap):
+                self._matriz.flush()
+            if self._log_filas is not None:
+                self._log_filas.close()
+                self._log_filas = None
+            if self._fichero_bloqueo is not None:
+                self._fichero_bloqueo.close()
+                self._fichero_bloqueo = None
+
+    @staticmethod
+    def _normas_seguras(filas: np.ndarray) -> np.ndarray:
+        normas = np.linalg.norm(filas, axis=1)
+        normas[normas == 0] = 1.0
+        return normas
+
+    def _redimensionar(self, capacidad: int) -> None:
+        """Amplía la matriz a `capacidad` filas (requiere lock)"""
+        if self.ruta:
+            if isinstance(self._matriz, np.memmap):
+                self._matriz.flush()
+            with open(self._fichero_matriz, "ab") as f:
+                f.truncate(capacidad * self.dim * 4)
+            nueva = np.memmap(self._fichero_matriz, dtype=np.float32, mode="r+",
+                              shape=(capacidad, self.dim))
+        else:
+            nueva = np.empty((capacidad, self.dim), dtype=np.float32)
+            nueva[:self._n] = self._matriz[:self._n]
+        normas = np.ones(capacidad, dtype=np.float32)
+        normas[:self._n] = self._normas[:self._n]
+        ids = np.zeros(capacidad, dtype=np.int64)
+        ids[:self._n] = self._ids[:self._n]
+        # Las lecturas en curso conservan su referencia a las matrices anteriores
+        self._matriz, self._normas, self._ids = nueva, normas, ids
+
+    # -- VectorStore ------------------------------------------------------
+    def comprobar(self) -> None:
+        return None
+
+    def __len__(self) -> int:
+        return self._n
+
+    def existentes(self, candidato_ids: Iterable[int]) -> Set[int]:
+        with self._lock:
+            return {int(cid) for cid in candidato_ids if int(cid) in self._fila_de}
+
+    def insertar_lote(self, objetos: List[Dict[str, Any]]) -> Set[int]:
+        insertados: Set[int] = set()
+        with self._lock:
+            nuevos = []
+            for objeto in objetos:
+                cid = int(objeto["candidato_id"])
+                if cid in self._fila_de or cid in insertados:
+                    continue
+                insertados.add(cid)
+                nuevos.append(objeto)
+            if not nuevos:
+                return insertados
+
+            necesarias = self._n + len(nuevos)
+            if necesarias > len(self._matriz):
+                self._redimensionar(max(necesarias, 2 * len(self._matriz), self._CAPACIDAD_INICIAL))
+
+            bloque = np.asarray([o["embedding"] for o in nuevos], dtype=np.float32)
+            inicio = self._n
+            self._matriz[inicio:necesarias] = bloque
+            self._normas[inicio:necesarias] = self._normas_seguras(bloque)
+            self._ids[inicio:necesarias] = [int(o["candidato_id"]) for o in nuevos]
+            if self.ruta:
+                # Si falla la escritura, las filas no llegan a publicarse
+                self._anadir_filas(nuevos)
+            for fila, objeto in enumerate(nuevos, start=inicio):
+                cid, puesto = int(objeto["candidato_id"]), objeto["puesto"]
+                self._candidato_ids.append(cid)
+                self._puestos.append(puesto)
+                self._cluster_ids.append(objeto.get("cluster_id"))
+                self._fila_de[cid] = fila
+                self._filas_puesto.setdefault(puesto, []).append(fila)
+                self._indice_puesto.pop(puesto, None)
+            # Publicar las filas nuevas solo cuando están completas
+            self._n = necesarias
+        return insertados
+
+    def _filas_de_puesto(self, puesto: Optional[str]) -> Optional[np.ndarray]:
+        """Índice precalculado puesto -> filas (requiere lock)"""
+        if not puesto or puesto not in self._filas_puesto:
+            return None
+        filas = self._indice_puesto.get(puesto)
+        if filas is None:
+            filas = np.asarray(self._filas_puesto[puesto], dtype=np.int64)
+            self._indice_puesto[puesto] = filas
+        return filas
+
+    def _instantanea(self, puestos: Sequence[Optional[str]]):
+        with self._lock:
+            return (
+                self._n, self._matriz, self._normas, self._ids,
+                [self._filas_de_puesto(p) for p in puestos],
+                self._puestos, self._cluster_ids,
+            )
+
+    @staticmethod
+    def _distancias(
+        consultas: np.ndarray,
+        matriz: np.ndarray,
+        normas: np.ndarray,
+        filas: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Distancia coseno de cada consulta contra las filas (todas, o solo
+        `filas` si se filtra por puesto): un único matmul del tamaño del filtro
+        """
+        if filas is not None:
+            matriz, normas = matriz[filas], normas[filas]
+        normas_consulta = np.linalg.norm(consultas, axis=1)
+        normas_consulta[normas_consulta == 0] = 1.0
+        similitudes = (consultas @ matriz.T) / normas_consulta[:, None] / normas[None, :]
+        return 1.0 - similitudes.astype(np.float64)
+
+    @staticmethod
+    def _vecinos(elegidas, distancias, ids, matriz, puestos_fila, cluster_ids, con_embedding) -> List[Vecino]:
+        """Vecinos de las filas `elegidas`, con su distancia en `distancias` (mismo orden)"""
+        vecinos = []
+        for fila, distancia in zip(elegidas, distancias):
+            cluster_id = cluster_ids[fila]
+            vecinos.append(Vecino(
+                int(ids[fila]),
+                puestos_fila[fila],
+                cluster_id,
+                matriz[fila].tolist() if con_embedding and cluster_id is None else None,
+                float(distancia),
+            ))
+        return vecinos
+
+    @staticmethod
+    def _filtro_selectivo(filas: Optional[np.ndarray], n: int) -> bool:
+        """
+        Si compensa copiar las filas del puesto y multiplicar solo por ellas.
+        Copiar cuesta tanto como recorrerlas, así que por encima de ~1/4 del
+        almacén es más barato el producto completo y quedarse con sus filas.
+        """
+        return filas is not None and len(filas) * _FRACCION_FILTRO_SELECTIVO <= n
+
+    def buscar_lote(self, embeddings, puestos, k=10, con_embedding=False) -> List[List[Vecino]]:
+        if len(embeddings) == 0:
+            return []
+        ks = _lista_ks(k, len(embeddings))
+        n, matriz, normas, ids, filas_puesto, puestos_fila, cluster_ids = self._instantanea(puestos)
+        if n == 0:
+            return [[] for _ in embeddings]
+
+        # Un producto por puesto selectivo y uno compartido por el resto de búsquedas
+        # (sin puesto o con un puesto que ocupa buena parte del almacén)
+        consultas = np.asarray(embeddings, dtype=np.float32)
+        grupos: Dict[Optional[str], List[int]] = {}
+        for i, (puesto, filas) in enumerate(zip(puestos, filas_puesto)):
+            grupos.setdefault(puesto if self._filtro_selectivo(filas, n) else None, []).append(i)
+
+        resultados: List[List[Vecino]] = [[] for _ in embeddings]
+        todas = np.arange(n)
+        for puesto, indices in grupos.items():
+            selectivas = filas_puesto[indices[0]] if puesto is not None else None
+            distancias = self._distancias(consultas[indices], matriz[:n], normas[:n], selectivas)
+            for i, d in zip(indices, distancias):
+                filas = filas_puesto[i]
+                if selectivas is not None:
+                    filas = selectivas
+                elif filas is not None:
+                    d = d[filas]
+                else:
+                    filas = todas
+                posiciones = _top_k(d, ids[filas], ks[i])
+                resultados[i] = self._vecinos(
+                    filas[posiciones], d[posiciones], ids, matriz, puestos_fila, cluster_ids, con_embedding
+                )
+        return resultados
+
+    def buscar_pagina(self, embedding, puesto, k=10, con_embedding=False, despues=None, servidos=0):
+        n, matriz, normas, ids, (filas_puesto,), puestos_fila, cluster_ids = self._instantanea([puesto])
+        fase = despues.fase if despues else (FASE_PUESTO if filas_puesto is not None else FASE_GENERAL)
+        if n == 0 or (fase == FASE_PUESTO and filas_puesto is None):
+            return [], fase
+
+        filas = filas_puesto if fase == FASE_PUESTO else None
+        selectivo = self._filtro_selectivo(filas, n)
+        d = self._distancias(
+            np.asarray([embedding], dtype=np.float32), matriz[:n], normas[:n], filas if selectivo else None
+        )[0]
+        if filas is None:
+            filas = np.arange(n)
+        elif not selectivo:
+            d = d[filas]
+        cid = ids[filas]
+        if despues is not None:
+            # Keyset: solo lo posterior a (distancia, candidato_id) del último servido
+            mascara = (d > despues.distancia) | ((d == despues.distancia) & (cid > despues.candidato_id))
+            filas, d, cid = filas[mascara], d[mascara], cid[mascara]
+        posiciones = _top_k(d, cid, k)
+        return self._vecinos(
+            filas[posiciones], d[posiciones], ids, matriz, puestos_fila, cluster_ids, con_embedding
+        ), fase
+
+# Instancia global (singleton pattern)
+_store_singleton: Optional[VectorStore] = None
+_store_lock = threading.Lock()
+
+
+def crear_store(tipo: str = VECTOR_STORE) -> VectorStore:
+    """Construye el almacén de vectores del tipo indicado"""
+    if tipo == "numpy":
+        return NumpyVectorStore()
+    return PgVectorStore()
+
+
+def obtener_store() -> VectorStore:
+    """Obtiene el almacén de vectores del proceso (EVALIA_VECTOR_STORE)"""
+    global _store_singleton
+    if _store_singleton is None:
+        with _store_lock:
+            if _store_singleton is None:
+                _store_singleton = crear_store()
+                logger.info("Almacén de vectores: %s", _store_singleton.nombre)
+    return _store_singleton
@@ -0,0 +1,166 @@
+# utils/configuracion_logs.py
+"""
+Configuración única de logging del servicio (se llama desde main.py).
+
+- Los módulos solo hacen logging.getLogger(__name__) y registran con
+  formato perezoso ("%s", valor): el mensaje no se construye si el nivel
+  está desactivado.
+- El logger raíz escribe en una cola acotada (QueueHandler); un hilo
+  (QueueListener) formatea y escribe en consola y, opcionalmente, en un
+  fichero rotativo. La escritura no ocurre en el hilo que atiende la
+  petición o procesa la ingesta. Si la cola se llena, los registros se
+  descartan (y se cuentan en /metrics) en lugar de bloquear.
+- Muestreo: los mensajes por petición se registran 1 de cada
+  EVALIA_LOG_MUESTREO veces (los totales exactos están en /metrics).
+
+Configuración (variables de entorno):
+  - EVALIA_LOG_NIVEL: DEBUG, INFO, WARNING... (por defecto INFO)
+  - EVALIA_LOG_FORMATO: "texto" o "json" (una línea JSON por registro)
+  - EVALIA_LOG_FICHERO: fichero de log rotativo (opcional)
+  - EVALIA_LOG_FICHERO_MB: tamaño de cada fichero antes de rotar
+  - EVALIA_LOG_COLA_MAX: registros pendientes máximos en la cola
+  - EVALIA_LOG_MUESTREO: 1 de cada N mensajes muestreados (1 = todos)
+"""
+
+import os
+import json
+import queue
+import atexit
+import logging
+import itertools
+import threading
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import List, Optional
+
+from app2_ia.utils.metricas import REGISTRO, Contador
+
+LOG_NIVEL = os.getenv("EVALIA_LOG_NIVEL", "INFO").strip().upper()
+LOG_FORMATO = os.getenv("EVALIA_LOG_FORMATO", "texto").strip().lower()
+LOG_FICHERO = os.getenv("EVALIA_LOG_FICHERO")
+LOG_FICHERO_MB = float(os.getenv("EVALIA_LOG_FICHERO_MB", "50"))
+LOG_COLA_MAX = int(os.getenv("EVALIA_LOG_COLA_MAX", "10000"))
+LOG_MUESTREO = int(os.getenv("EVALIA_LOG_MUESTREO", "100"))
+
+FORMATO_TEXTO = "%(asctime)s - %(name)s - %(levelname)s: %(message)s"
+FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+
+LOGS_DESCARTADOS = REGISTRO.registrar(Contador(
+    "evalia_logs_descartados_total",
+    "Registros de log descartados por tener la cola de logging llena"
+))
+
+
+class FormateadorJSON(logging.Formatter):
+    """Una línea JSON por registro, para agregadores de logs"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        datos = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+            "hilo": record.threadName,
+        }
+        if record.exc_info:
+            datos["excepcion"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            datos["excepcion"] = record.exc_text
+        return json.dumps(datos, ensure_ascii=False)
+
+
+class _ManejadorCola(QueueHandler):
+    """QueueHandler que descarta (y cuenta) en vez de bloquear con la cola llena"""
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOGS_DESCARTADOS.inc()
+
+
+class _EscritorCola(QueueListener):
+    """QueueListener cuyo centinela de parada espera hueco en vez de fallar con la cola llena"""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+
+class Muestreo:
+    """
+    Deja pasar 1 de cada `cada` eventos. Para mensajes que se repiten en
+    cada petición o fila:
+
+        if _muestreo.toca():
+            logger.info("Búsqueda completada (muestreo 1/%d)", _muestreo.cada)
+    """
+
+    def __init__(self, cada: int = LOG_MUESTREO):
+        self.cada = max(1, cada)
+        self._contador = itertools.count()
+
+    def toca(self) -> bool:
+        # next() sobre itertools.count es atómico con el GIL
+        return next(self._contador) % self.cada == 0
+
+
+_listener: Optional[QueueListener] = None
+_atexit_registrado = False
+_lock = threading.Lock()
+
+
+def _crear_manejadores(formato: str, fichero: Optional[str]) -> List[logging.Handler]:
+    if formato == "json":
+        formateador: logging.Formatter = FormateadorJSON()
+    else:
+        formateador = logging.Formatter(FORMATO_TEXTO, datefmt=FORMATO_FECHA)
+    manejadores: List[logging.Handler] = [logging.StreamHandler()]
+    if fichero:
+        directorio = os.path.dirname(fichero)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        manejadores.append(RotatingFileHandler(
+            fichero, maxBytes=int(LOG_FICHERO_MB * 1024 * 1024), backupCount=3, encoding="utf-8"
+        ))
+    for manejador in manejadores:
+        manejador.setFormatter(formateador)
+    return manejadores
+
+
+def configurar_logging(
+    nivel: str = LOG_NIVEL,
+    formato: str = LOG_FORMATO,
+    fichero: Optional[str] = LOG_FICHERO
+) -> None:
+    """
+    Configura el logger raíz con la cola y arranca el hilo escritor.
+    Idempotente: llamadas posteriores no hacen nada.
+    """
+    global _listener, _atexit_registrado
+    with _lock:
+        if _listener is not None:
+            return
+        if formato not in ("texto", "json"):
+            raise ValueError(f"EVALIA_LOG_FORMATO inválido: '{formato}' (valores: texto, json)")
+
+        cola: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=LOG_COLA_MAX)
+        raiz = logging.getLogger()
+        for manejador in list(raiz.handlers):
+            raiz.removeHandler(manejador)
+        raiz.addHandler(_ManejadorCola(cola))
+        raiz.setLevel(nivel)
+
+        _listener = _EscritorCola(cola, *_crear_manejadores(formato, fichero), respect_handler_level=True)
+        _listener.start()
+        if not _atexit_registrado:
+            atexit.register(detener_logging)
+            _atexit_registrado = True
+
+
+def detener_logging() -> None:
+    """Vacía la cola y detiene el hilo escritor (se registra con atexit)"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
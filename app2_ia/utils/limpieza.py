@@ -1,86 +1,277 @@
-import spacy
-import logging
-
-# --- Configuración de logging para guardar en un archivo ---
-# Esto configura el logger raíz.
-# - level=logging.INFO: Se capturarán mensajes de INFO, WARNING, ERROR, CRITICAL.
-# - format: Define el formato de los mensajes de log.
-# - datefmt: Define el formato de la fecha/hora.
-# - filename: Nombre del archivo donde se guardarán los logs.
-# - filemode='a': 'a' (append) para añadir logs al final del archivo si ya existe.
-#                  Usa 'w' (write) para sobrescribir el archivo en cada ejecución.
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S',
-    filename='errores_formateotext.log',
-    filemode='a'
-)
-
-# Obtener un logger específico para este módulo (buena práctica)
-logger = logging.getLogger(__name__)
-
-# --- Carga del modelo de spaCy ---
-# Es buena práctica cargarlo una vez fuera de la función si la vas a llamar múltiples veces.
-nlp = None # Inicializar nlp a None
-try:
-    # Intentamos cargar un modelo en español.
-    # 'es_core_news_sm' es pequeño y rápido.
-    # Para mayor precisión, considera 'es_core_news_md' o 'es_core_news_lg'
-    # (necesitarás descargarlos primero: python -m spacy download es_core_news_md)
-    nlp = spacy.load('es_core_news_sm')
-    logger.info("Modelo de spaCy 'es_core_news_sm' cargado exitosamente.")
-except OSError:
-    logger.error(
-        "Modelo 'es_core_news_sm' no encontrado. "
-        "Por favor, descárgalo ejecutando: python -m spacy download es_core_news_sm. "
-        "El procesamiento de texto no funcionará sin el modelo."
-    )
-    # nlp permanece como None, la función lo manejará
-
-def limpiar_texto_para_embedding(texto: str) -> str:
-    """
-    Limpia y procesa un texto en español para su uso en modelos de embedding.
-    Incluye: conversión a minúsculas, eliminación de puntuación,
-    eliminación de stopwords y lematización. Utiliza logging para errores/warnings
-    y guarda los logs en un archivo.
-
-    Args:
-        texto (str): El texto de entrada a procesar.
-
-    Returns:
-        str: El texto procesado como un string único con tokens limpios y lematizados.
-             Devuelve un string vacío si el modelo de spaCy no está cargado o el texto es nulo/vacío.
-    """
-    if nlp is None:
-        logger.warning(
-            "Intento de procesar texto ('%s...') pero el modelo de spaCy no está cargado. "
-            "La función devolverá un string vacío.", texto[:20] if texto else "N/A"
-        )
-        return "" # Retorna string vacío si el modelo no se pudo cargar
-
-    if not texto: # Verifica si el texto es None o vacío
-        logger.info("Se recibió un texto vacío o None para procesar. Devolviendo string vacío.")
-        return ""
-
-    # Convertir texto a minúsculas
-    texto_minusculas = texto.lower()
-    logger.debug(f"Texto convertido a minúsculas: '{texto_minusculas[:50]}...'")
-
-    # Procesar el texto con spaCy
-    doc = nlp(texto_minusculas)
-
-    tokens_limpios_lematizados = []
-    for token in doc:
-        # Filtrar puntuación y stopwords
-        # token.is_alpha puede ser útil si solo quieres palabras (sin números o símbolos especiales)
-        if not token.is_punct and not token.is_stop:
-            tokens_limpios_lematizados.append(token.lemma_)
-            logger.debug(f"Token: '{token.text}' -> Lemma: '{token.lemma_}', No es Puntuación, No es Stopword")
-        else:
-            logger.debug(f"Token: '{token.text}' -> Descartado (Puntuación: {token.is_punct}, Stopword: {token.is_stop})")
-
-
-    resultado = " ".join(tokens_limpios_lematizados)
-    logger.info(f"Texto original ('{texto[:30]}...') procesado a ('{resultado[:30]}...').")
-    return resultado
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from app2_ia.utils.metricas import registrar_indicador
+
+# Logger del módulo; los handlers se configuran una sola vez en main.py
+# (utils/configuracion_logs.py; EVALIA_LOG_FICHERO para escribir a fichero)
+logger = logging.getLogger(__name__)
+
+# Solo usamos is_punct, is_stop y lemma_: el parser y el NER no aportan nada
+# y son la parte más cara del pipeline. El lematizador necesita las etiquetas
+# del morphologizer/attribute_ruler, que sí se conservan.
+COMPONENTES_NO_USADOS = ["parser", "ner"]
+
+# Parámetros de limpieza por lotes (nlp.pipe)
+SPACY_BATCH_SIZE = int(os.getenv("EVALIA_SPACY_BATCH_SIZE", "128"))
+SPACY_N_PROCESS = int(os.getenv("EVALIA_SPACY_N_PROCESS", "1"))
+
+# Memo de textos ya limpiados (0 lo desactiva)
+LIMPIEZA_CACHE_MAX = int(os.getenv("EVALIA_LIMPIEZA_CACHE_MAX", "20000"))
+
+# Versión de las reglas de limpieza (_unir_tokens_limpios y
+# COMPONENTES_NO_USADOS). Cambiarla invalida el memo.
+VERSION_REGLAS = "1"
+
+# --- Carga del modelo de spaCy ---
+# Se carga una sola vez, de forma perezosa: importar este módulo no importa
+# spaCy. El calentamiento del arranque (services/arranque.py) fuerza la carga
+# antes de aceptar tráfico.
+nlp = None # Inicializar nlp a None
+_nlp_intentado = False
+_nlp_lock = threading.Lock()
+
+
+def obtener_nlp():
+    """
+    Devuelve el modelo de spaCy, cargándolo la primera vez.
+    Si el modelo no está instalado devuelve None (y no vuelve a intentarlo).
+    """
+    global nlp, _nlp_intentado
+    if _nlp_intentado:
+        return nlp
+    with _nlp_lock:
+        if _nlp_intentado:
+            return nlp
+        try:
+            import spacy
+            # Intentamos cargar un modelo en español.
+            # 'es_core_news_sm' es pequeño y rápido.
+            # Para mayor precisión, considera 'es_core_news_md' o 'es_core_news_lg'
+            # (necesitarás descargarlos primero: python -m spacy download es_core_news_md)
+            nlp = spacy.load('es_core_news_sm', exclude=COMPONENTES_NO_USADOS)
+            _memo.fijar_version(_version_limpieza(nlp))
+            logger.info("Modelo de spaCy 'es_core_news_sm' cargado exitosamente.")
+        except OSError:
+            logger.error(
+                "Modelo 'es_core_news_sm' no encontrado. "
+                "Por favor, descárgalo ejecutando: python -m spacy download es_core_news_sm. "
+                "El procesamiento de texto no funcionará sin el modelo."
+            )
+            # nlp permanece como None, la función lo manejará
+        _nlp_intentado = True
+    return nlp
+
+class MemoLimpieza:
+    """
+    Memo LRU de textos limpiados, acotado por número de entradas y seguro
+    para uso concurrente. Muchos candidatos comparten valoraciones repetidas
+    y las mismas descripciones vuelven en las búsquedas.
+
+    La clave es un hash del texto junto con la versión del modelo de spaCy y
+    de las reglas de limpieza: cambiar cualquiera de ellos no sirve
+    resultados antiguos.
+    """
+
+    def __init__(self, max_entradas: int = LIMPIEZA_CACHE_MAX):
+        self.max_entradas = max_entradas
+        self.version = ""
+        self._entradas: "OrderedDict[bytes, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @property
+    def activo(self) -> bool:
+        return self.max_entradas > 0
+
+    def fijar_version(self, version: str) -> None:
+        """Versión del modelo y de las reglas; si cambia, se vacía el memo"""
+        with self._lock:
+            if version != self.version:
+                self.version = version
+                self._entradas.clear()
+
+    def clave(self, texto: str) -> bytes:
+        return hashlib.blake2b(f"{self.version}\x00{texto}".encode(), digest_size=16).digest()
+
+    def get_many(self, claves: List[bytes]) -> Dict[bytes, str]:
+        if not self.activo:
+            return {}
+        encontrados: Dict[bytes, str] = {}
+        with self._lock:
+            for clave in claves:
+                limpio = self._entradas.get(clave)
+                if limpio is None:
+                    self._stats["misses"] += 1
+                    continue
+                self._entradas.move_to_end(clave)
+                self._stats["hits"] += 1
+                encontrados[clave] = limpio
+        return encontrados
+
+    def put_many(self, pares: Dict[bytes, str]) -> None:
+        if not self.activo:
+            return
+        with self._lock:
+            for clave, limpio in pares.items():
+                self._entradas[clave] = limpio
+                self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "entradas": len(self._entradas), "max_entradas": self.max_entradas}
+
+
+_memo = MemoLimpieza()
+
+
+def _version_limpieza(modelo) -> str:
+    import spacy
+    return (
+        f"{modelo.meta.get('lang')}_{modelo.meta.get('name')}-{modelo.meta.get('version')}"
+        f":spacy-{spacy.__version__}:reglas-{VERSION_REGLAS}:sin-{','.join(COMPONENTES_NO_USADOS)}"
+    )
+
+
+def estadisticas_memo() -> Dict[str, int]:
+    """Aciertos, fallos y ocupación del memo de limpieza"""
+    return _memo.stats()
+
+
+def limpiar_texto_para_embedding(texto: str) -> str:
+    """
+    Limpia y procesa un texto en español para su uso en modelos de embedding.
+    Incluye: conversión a minúsculas, eliminación de puntuación,
+    eliminación de stopwords y lematización. Utiliza logging para errores/warnings.
+
+    Args:
+        texto (str): El texto de entrada a procesar.
+
+    Returns:
+        str: El texto procesado como un string único con tokens limpios y lematizados.
+             Devuelve un string vacío si el modelo de spaCy no está cargado o el texto es nulo/vacío.
+    """
+    nlp = obtener_nlp()
+    if nlp is None:
+        logger.warning(
+            "Intento de procesar texto ('%s...') pero el modelo de spaCy no está cargado. "
+            "La función devolverá un string vacío.", texto[:20] if texto else "N/A"
+        )
+        return "" # Retorna string vacío si el modelo no se pudo cargar
+
+    if not texto: # Verifica si el texto es None o vacío
+        logger.debug("Se recibió un texto vacío o None para procesar. Devolviendo string vacío.")
+        return ""
+
+    clave = _memo.clave(texto)
+    memorizado = _memo.get_many([clave])
+    if memorizado:
+        return memorizado[clave]
+
+    # Convertir texto a minúsculas
+    texto_minusculas = texto.lower()
+
+    # Procesar el texto con spaCy
+    doc = nlp(texto_minusculas)
+
+    resultado = _unir_tokens_limpios(doc)
+    _memo.put_many({clave: resultado})
+    logger.debug("Texto original ('%.30s...') procesado a ('%.30s...').", texto, resultado)
+    return resultado
+
+
+def _unir_tokens_limpios(doc) -> str:
+    """Filtra puntuación y stopwords de un Doc y une los lemas restantes"""
+    # Filtrar puntuación y stopwords
+    # token.is_alpha puede ser útil si solo quieres palabras (sin números o símbolos especiales)
+    tokens_limpios_lematizados = [
+        token.lemma_ for token in doc if not token.is_punct and not token.is_stop
+    ]
+    # Un único mensaje agregado por texto (no uno por token)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Tokens: %d conservados, %d descartados (puntuación o stopword)",
+            len(tokens_limpios_lematizados), len(doc) - len(tokens_limpios_lematizados)
+        )
+    return " ".join(tokens_limpios_lematizados)
+
+
+def limpiar_textos_para_embedding(
+    textos: List[str],
+    batch_size: Optional[int] = None,
+    n_process: Optional[int] = None
+) -> List[str]:
+    """
+    Versión por lotes de limpiar_texto_para_embedding, basada en nlp.pipe.
+    Produce exactamente el mismo resultado que aplicar la función a cada texto.
+    Los textos repetidos dentro del lote y los que ya están en el memo no
+    pasan por spaCy: cada texto distinto se procesa una sola vez.
+
+    Args:
+        textos (List[str]): Textos de entrada a procesar.
+        batch_size (int, opcional): Textos por lote de nlp.pipe (por defecto SPACY_BATCH_SIZE).
+        n_process (int, opcional): Procesos de spaCy (por defecto SPACY_N_PROCESS).
+            Con valores > 1 conviene lotes grandes: cada proceso tiene su propio modelo.
+
+    Returns:
+        List[str]: Textos procesados, en el mismo orden que la entrada.
+    """
+    nlp = obtener_nlp()
+    if nlp is None:
+        logger.warning(
+            "Intento de procesar %d textos pero el modelo de spaCy no está cargado. "
+            "Se devolverán strings vacíos.", len(textos)
+        )
+        return ["" for _ in textos]
+
+    resultados = ["" for _ in textos]
+    # Los textos vacíos o None no pasan por spaCy
+    indices = [i for i, texto in enumerate(textos) if texto]
+    claves = {i: _memo.clave(textos[i]) for i in indices}
+    limpios = _memo.get_many(list(dict.fromkeys(claves.values())))
+
+    # Un solo texto por clave pendiente (los repetidos del lote comparten resultado)
+    pendientes: Dict[bytes, str] = {}
+    for i in indices:
+        if claves[i] not in limpios and claves[i] not in pendientes:
+            pendientes[claves[i]] = textos[i]
+
+    if pendientes:
+        docs = nlp.pipe(
+            (texto.lower() for texto in pendientes.values()),
+            batch_size=batch_size or SPACY_BATCH_SIZE,
+            n_process=n_process or SPACY_N_PROCESS
+        )
+        nuevos = {clave: _unir_tokens_limpios(doc) for clave, doc in zip(pendientes, docs)}
+        _memo.put_many(nuevos)
+        limpios.update(nuevos)
+
+    for i in indices:
+        resultados[i] = limpios[claves[i]]
+
+    logger.debug(
+        "Lote de %d textos procesado (%d vacíos, %d procesados con spaCy).",
+        len(textos), len(textos) - len(indices), len(pendientes)
+    )
+    return resultados
+
+
+registrar_indicador(
+    "evalia_limpieza_memo_consultas_total",
+    "Consultas al memo de limpieza de texto por resultado",
+    lambda: {(resultado,): valor for resultado, valor in _memo.stats().items() if resultado in ("hits", "misses")},
+    etiquetas=("resultado",),
+    tipo="counter"
+)
+registrar_indicador(
+    "evalia_limpieza_memo_entradas",
+    "Entradas en el memo de limpieza de texto",
+    lambda: _memo.stats()["entradas"]
+)
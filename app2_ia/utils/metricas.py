@@ -0,0 +1,301 @@
+# utils/metricas.py
+"""
+Métricas del servicio en formato de exposición de Prometheus (texto 0.0.4).
+
+Implementación mínima sin dependencias: contadores, histogramas e
+indicadores calculados al exponer (callbacks). Los valores viven en memoria
+del proceso: con varios workers de uvicorn, Prometheus debe consultar cada
+worker por separado (o usar un único worker por contenedor).
+
+Uso:
+    BUSQUEDAS.inc(tipo="pagina", resultado="cache")
+    with medir_etapa("busqueda", "embedding"):
+        ...
+    registrar_indicador("evalia_x", "Ayuda", lambda: {("valor",): 1.0}, etiquetas=("e",))
+
+GET /metrics (routes/metrics_controller.py) devuelve exponer().
+"""
+
+import math
+import time
+import threading
+from contextlib import ContextDecorator
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple, Union
+
+# Buckets por defecto (segundos): de 1 ms a 30 s
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+ValoresEtiquetas = Tuple[str, ...]
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _escapar_ayuda(valor: str) -> str:
+    # En HELP solo se escapan la barra invertida y el salto de línea (\" no es válido ahí)
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _formatear_etiquetas(nombres: Sequence[str], valores: Sequence[str]) -> str:
+    if not nombres:
+        return ""
+    pares = ",".join(f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores))
+    return "{" + pares + "}"
+
+
+def _formatear_valor(valor: float) -> str:
+    if math.isinf(valor):
+        return "+Inf" if valor > 0 else "-Inf"
+    if math.isnan(valor):
+        return "NaN"
+    return repr(float(valor))
+
+
+class _Metrica:
+    tipo = "untyped"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+
+    def _clave(self, etiquetas: Dict[str, str]) -> ValoresEtiquetas:
+        if set(etiquetas) != set(self.etiquetas):
+            raise ValueError(f"{self.nombre} espera las etiquetas {self.etiquetas}, recibió {tuple(etiquetas)}")
+        return tuple(str(etiquetas[n]) for n in self.etiquetas)
+
+    def _muestras(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def exponer(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {_escapar_ayuda(self.ayuda)}", f"# TYPE {self.nombre} {self.tipo}"]
+        lineas.extend(self._muestras())
+        return lineas
+
+
+class Contador(_Metrica):
+    """Valor acumulado que solo crece (peticiones, filas, errores...)"""
+    tipo = "counter"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        super().__init__(nombre, ayuda, etiquetas)
+        self._valores: Dict[ValoresEtiquetas, float] = {}
+
+    def inc(self, valor: float = 1, **etiquetas) -> None:
+        if valor < 0:
+            raise ValueError("Un contador no puede decrecer")
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0.0) + valor
+
+    def valor(self, **etiquetas) -> float:
+        with self._lock:
+            return self._valores.get(self._clave(etiquetas), 0.0)
+
+    def _muestras(self) -> Iterable[str]:
+        with self._lock:
+            valores = sorted(self._valores.items())
+        for clave, valor in valores:
+            yield f"{self.nombre}{_formatear_etiquetas(self.etiquetas, clave)} {_formatear_valor(valor)}"
+
+
+class _Cronometro(ContextDecorator):
+    """Mide la duración de un bloque (o función decorada) y la observa en el histograma"""
+
+    def __init__(self, histograma: "Histograma", etiquetas: Dict[str, str]):
+        self._histograma = histograma
+        self._etiquetas = etiquetas
+        self._inicio = 0.0
+
+    def _recreate_cm(self):
+        # Como decorador, cada llamada necesita su propio instante de inicio
+        return _Cronometro(self._histograma, self._etiquetas)
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histograma.observe(time.perf_counter() - self._inicio, **self._etiquetas)
+        return False
+
+
+class Histograma(_Metrica):
+    """Distribución de valores (latencias) en buckets acumulativos"""
+    tipo = "histogram"
+
+    def __init__(
+        self,
+        nombre: str,
+        ayuda: str,
+        etiquetas: Sequence[str] = (),
+        buckets: Sequence[float] = BUCKETS_LATENCIA
+    ):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets))
+        # clave -> (conteos por bucket, [suma, total])
+        self._series: Dict[ValoresEtiquetas, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, valor: float, **etiquetas) -> None:
+        clave = self._clave(etiquetas)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = ([0] * len(self.buckets), [0.0, 0])
+            conteos, acumulado = serie
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    conteos[i] += 1
+                    break
+            acumulado[0] += valor
+            acumulado[1] += 1
+
+    def cronometrar(self, **etiquetas) -> _Cronometro:
+        """Context manager / decorador que observa la duración en segundos"""
+        self._clave(etiquetas)
+        return _Cronometro(self, etiquetas)
+
+    def _muestras(self) -> Iterable[str]:
+        with self._lock:
+            series = sorted((clave, (list(c), list(a))) for clave, (c, a) in self._series.items())
+        nombres_bucket = self.etiquetas + ("le",)
+        for clave, (conteos, (suma, total)) in series:
+            acumulado = 0
+            for limite, conteo in zip(self.buckets, conteos):
+                acumulado += conteo
+                yield (
+                    f"{self.nombre}_bucket"
+                    f"{_formatear_etiquetas(nombres_bucket, clave + (_formatear_valor(limite),))} {acumulado}"
+                )
+            yield f"{self.nombre}_bucket{_formatear_etiquetas(nombres_bucket, clave + ('+Inf',))} {int(total)}"
+            etiquetas = _formatear_etiquetas(self.etiquetas, clave)
+            yield f"{self.nombre}_sum{etiquetas} {_formatear_valor(suma)}"
+            yield f"{self.nombre}_count{etiquetas} {int(total)}"
+
+
+class Indicador(_Metrica):
+    """
+    Valor calculado en el momento de exponer las métricas a partir de un
+    callback: útil para estado que ya mantiene otro componente (pool de
+    conexiones, caches, trabajos en cola). El callback devuelve un número
+    (sin etiquetas) o un dict {valores de etiquetas: número}.
+    """
+
+    def __init__(
+        self,
+        nombre: str,
+        ayuda: str,
+        funcion: Callable[[], Union[float, Dict[ValoresEtiquetas, float]]],
+        etiquetas: Sequence[str] = (),
+        tipo: str = "gauge"
+    ):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.tipo = tipo
+        self._funcion = funcion
+
+    def _muestras(self) -> Iterable[str]:
+        try:
+            valores = self._funcion()
+        except Exception as e:
+            # Un componente caído no debe romper /metrics entero
+            yield f"# {self.nombre} no disponible: {_escapar(e)}"
+            return
+        if valores is None:
+            return
+        if not isinstance(valores, dict):
+            valores = {(): valores}
+        for clave, valor in sorted(valores.items()):
+            yield f"{self.nombre}{_formatear_etiquetas(self.etiquetas, clave)} {_formatear_valor(valor)}"
+
+
+class RegistroMetricas:
+    """Conjunto de métricas que se exponen juntas en /metrics"""
+
+    def __init__(self):
+        self._metricas: Dict[str, _Metrica] = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, metrica: _Metrica) -> _Metrica:
+        """Registra una métrica; si ya existe una con ese nombre la sustituye"""
+        with self._lock:
+            self._metricas[metrica.nombre] = metrica
+        return metrica
+
+    def exponer(self) -> str:
+        with self._lock:
+            metricas = list(self._metricas.values())
+        lineas: List[str] = []
+        for metrica in metricas:
+            lineas.extend(metrica.exponer())
+        return "\n".join(lineas) + "\n"
+
+
+# Registro global del proceso
+REGISTRO = RegistroMetricas()
+
+
+def exponer() -> str:
+    """Texto en formato Prometheus con todas las métricas registradas"""
+    return REGISTRO.exponer()
+
+
+def registrar_indicador(
+    nombre: str,
+    ayuda: str,
+    funcion: Callable[[], Union[float, Dict[ValoresEtiquetas, float]]],
+    etiquetas: Sequence[str] = (),
+    tipo: str = "gauge"
+) -> Indicador:
+    """Registra un indicador calculado por callback (tipo "gauge" o "counter")"""
+    return REGISTRO.registrar(Indicador(nombre, ayuda, funcion, etiquetas, tipo))
+
+
+# --------------------------------------------------
+# Métricas del pipeline
+# --------------------------------------------------
+
+# Latencia por etapa. operacion: busqueda | busqueda_lote | ingesta.
+# etapa: limpieza, embedding, vectorial, clusters, reranking (búsqueda);
+# validacion, duplicados, limpieza, embedding, clusters, insercion (ingesta).
+DURACION_ETAPA = REGISTRO.registrar(Histograma(
+    "evalia_etapa_duracion_segundos",
+    "Duración de cada etapa del pipeline",
+    etiquetas=("operacion", "etapa")
+))
+
+# Latencia total de una búsqueda (incluidas las servidas desde el cache)
+DURACION_BUSQUEDA = REGISTRO.registrar(Histograma(
+    "evalia_busqueda_duracion_segundos",
+    "Duración total de una búsqueda",
+    etiquetas=("tipo",)
+))
+
+# Búsquedas atendidas. tipo: pagina | lote (un perfil del lote cuenta una vez).
+# resultado: cache | calculada | error
+BUSQUEDAS = REGISTRO.registrar(Contador(
+    "evalia_busquedas_total",
+    "Búsquedas atendidas",
+    etiquetas=("tipo", "resultado")
+))
+
+# Candidatos procesados por la ingesta. resultado: insertado | duplicado | error
+CANDIDATOS_INGESTA = REGISTRO.registrar(Contador(
+    "evalia_ingesta_candidatos_total",
+    "Candidatos procesados por la ingesta",
+    etiquetas=("resultado",)
+))
+
+# Bloques de ingesta procesados
+BLOQUES_INGESTA = REGISTRO.registrar(Contador(
+    "evalia_ingesta_bloques_total",
+    "Bloques de ingesta procesados"
+))
+
+
+def medir_etapa(operacion: str, etapa: str) -> _Cronometro:
+    """Atajo: cronometra una etapa del pipeline en evalia_etapa_duracion_segundos"""
+    return DURACION_ETAPA.cronometrar(operacion=operacion, etapa=etapa)
@@ -1,80 +1,100 @@
-import re
-import logging
-import pandas as pd
-
-# Configuración de logging
-tools_logger = logging.getLogger(__name__)
-tools_logger.setLevel(logging.INFO)
-
-# Regex para detectar datos sensibles
-DNI_RE = re.compile(r"\b\d{7,8}[A-Za-z]\b")
-TEL_RE = re.compile(r"\b(\+34)?[ -]?[6-9]\d{8}\b")
-
-# Columnas esperadas (todas en minúsculas)
-COLUMNAS = {"candidato_id", "puesto", "fortalezas", "debilidades", "valoracion_gpt"}
-
-
-def validar_filas(df: pd.DataFrame):
-    """
-    Valida cada fila de un DataFrame:
-      - Normaliza cabeceras a minúsculas.
-      - Verifica columnas esperadas.
-      - Comprueba campos requeridos no vacíos.
-      - Valida que candidato_id sea numérico (como texto).
-      - Realiza fallback de valoracion_gpt si está vacío.
-      - Descarta filas con datos sensibles (DNI/TEL).
-
-    Retorna:
-        validos: List[dict]
-        errores: List[str]
-    """
-    errores = []
-    validos = []
-
-    # Normalizar nombres de columna
-    df.columns = df.columns.str.lower()
-    if set(df.columns) != COLUMNAS:
-        raise ValueError(f"Columnas incorrectas. Se esperaba {COLUMNAS}, vino {set(df.columns)}")
-
-    for i, row in df.iterrows():
-        linea = i + 2
-        fila = row.to_dict()
-
-        # 1) Campos requeridos
-        requeridos = ["candidato_id", "puesto", "fortalezas", "debilidades"]
-        if any(pd.isna(fila[c]) or (isinstance(fila[c], str) and not fila[c].strip())
-               for c in requeridos):
-            msg = f"Fila {linea}: campos {requeridos} no pueden estar vacíos"
-            tools_logger.warning(msg)
-            errores.append(msg)
-            continue
-
-        # 2) ID numérico
-        cid = str(fila["candidato_id"]).strip()
-        if not cid.isdigit():
-            msg = f"Fila {linea}: ID no numérico ('{fila['candidato_id']}')"
-            tools_logger.warning(msg)
-            errores.append(msg)
-            continue
-        fila["candidato_id"] = cid
-
-        # 3) Fallback valoracion_gpt
-        val = fila.get("valoracion_gpt")
-        if pd.isna(val) or (isinstance(val, str) and not val.strip()):
-            fort = fila["fortalezas"].strip()
-            deb = fila["debilidades"].strip()
-            reconstruido = f"{fort} {deb}".strip()
-            fila["valoracion_gpt"] = reconstruido
-            tools_logger.debug("Fila %d: valoracion_gpt ausente; usando '%s'", linea, reconstruido)
-
-        # 4) Detectar datos sensibles
-        texto = " ".join(fila.values())
-        if DNI_RE.search(texto) or TEL_RE.search(texto):
-            msg = f"Fila {linea}: dato sensible detectado"
-            tools_logger.warning(msg)
-            errores.append(msg)
-            continue
-
-        validos.append(fila)
-
-    return validos, errores
\ No newline at end of file
+import re
+import logging
+import pandas as pd
+
+# Logger del módulo (el nivel se configura de forma global en main.py)
+tools_logger = logging.getLogger(__name__)
+
+# Regex para detectar datos sensibles
+DNI_RE = re.compile(r"\b\d{7,8}[A-Za-z]\b")
+TEL_RE = re.compile(r"\b(?:\+34)?[ -]?[6-9]\d{8}\b")
+# Ambas en una sola pasada (hay coincidencia si la hay con cualquiera de las dos)
+SENSIBLE_RE = re.compile(f"{DNI_RE.pattern}|{TEL_RE.pattern}")
+
+# Columnas esperadas (todas en minúsculas)
+COLUMNAS = {"candidato_id", "puesto", "fortalezas", "debilidades", "valoracion_gpt"}
+REQUERIDOS = ["candidato_id", "puesto", "fortalezas", "debilidades"]
+
+
+def _como_texto(columna: pd.Series) -> pd.Series:
+    """Columna con dtype "string" (los nulos quedan como <NA>) para usar .str"""
+    return columna.astype("string")
+
+
+def _vacia(columna: pd.Series) -> pd.Series:
+    """Máscara de celdas nulas o con solo espacios"""
+    return columna.isna() | _como_texto(columna).str.strip().eq("").fillna(False).astype(bool)
+
+
+def validar_filas(df: pd.DataFrame):
+    """
+    Valida las filas de un DataFrame por columnas (sin iterar fila a fila):
+      - Normaliza cabeceras a minúsculas.
+      - Verifica columnas esperadas.
+      - Comprueba campos requeridos no vacíos.
+      - Valida que candidato_id sea numérico (como texto).
+      - Realiza fallback de valoracion_gpt si está vacío.
+      - Descarta filas con datos sensibles (DNI/TEL).
+
+    Cada fila descartada genera un único error (el primero que falla, en
+    el orden anterior), con su número de línea en el CSV.
+
+    Retorna:
+        validos: List[dict]
+        errores: List[str]
+    """
+    # Normalizar nombres de columna
+    df.columns = df.columns.str.lower()
+    if set(df.columns) != COLUMNAS:
+        raise ValueError(f"Columnas incorrectas. Se esperaba {COLUMNAS}, vino {set(df.columns)}")
+    if df.empty:
+        return [], []
+
+    # 1) Campos requeridos
+    vacias = pd.concat([_vacia(df[c]) for c in REQUERIDOS], axis=1).any(axis=1)
+
+    # 2) ID numérico (str.isdigit, igual que la validación por fila)
+    cid = _como_texto(df["candidato_id"]).str.strip()
+    id_invalido = ~vacias & ~cid.str.isdigit().fillna(False).astype(bool)
+
+    # 3) Fallback valoracion_gpt: "fortalezas debilidades"
+    candidatas = ~vacias & ~id_invalido
+    sin_valoracion = candidatas & _vacia(df["valoracion_gpt"])
+    valoracion = df["valoracion_gpt"]
+    if sin_valoracion.any():
+        reconstruido = (
+            _como_texto(df["fortalezas"]).str.strip() + " " + _como_texto(df["debilidades"]).str.strip()
+        ).str.strip()
+        valoracion = valoracion.where(~sin_valoracion, reconstruido)
+        if tools_logger.isEnabledFor(logging.DEBUG):
+            for i, texto in reconstruido[sin_valoracion].items():
+                tools_logger.debug("Fila %d: valoracion_gpt ausente; usando '%s'", i + 2, texto)
+    filas = df.assign(candidato_id=cid, valoracion_gpt=valoracion)
+
+    # 4) Datos sensibles sobre el texto concatenado de la fila (en el orden de columnas)
+    texto = _como_texto(filas.iloc[:, 0]).str.cat(
+        [_como_texto(filas[c]) for c in filas.columns[1:]], sep=" "
+    )
+    sensible = candidatas & texto.str.contains(SENSIBLE_RE, regex=True).fillna(False).astype(bool)
+
+    # Un mensaje por fila descartada, en el orden del CSV
+    descartadas = vacias | id_invalido | sensible
+    prefijo = "Fila " + pd.Series(df.index + 2, index=df.index).astype(str)
+    mensajes = pd.Series("", index=df.index, dtype=object)
+    mensajes[sensible] = prefijo[sensible] + ": dato sensible detectado"
+    mensajes[id_invalido] = (
+        prefijo[id_invalido] + ": ID no numérico ('" + df.loc[id_invalido, "candidato_id"].astype(str) + "')"
+    )
+    mensajes[vacias] = prefijo[vacias] + f": campos {REQUERIDOS} no pueden estar vacíos"
+    errores = mensajes[descartadas].tolist()
+
+    validos = filas[~descartadas].astype(object).to_dict("records")
+
+    # Un aviso agregado por bloque; el detalle por fila va a DEBUG y al log
+    # de errores de la carga
+    if errores:
+        if tools_logger.isEnabledFor(logging.DEBUG):
+            for msg in errores:
+                tools_logger.debug(msg)
+        tools_logger.warning("%d de %d filas descartadas en la validación", len(errores), len(df))
+    return validos, errores
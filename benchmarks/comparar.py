@@ -0,0 +1,78 @@
+# benchmarks/comparar.py
+"""
+Compara dos ejecuciones de benchmarks/ejecutar.py (p50 y elementos/s) y
+marca las regresiones que superan el umbral.
+
+Uso:
+    python -m benchmarks.comparar benchmarks/resultados/antes.json benchmarks/resultados/despues.json
+    python -m benchmarks.comparar antes.json despues.json --umbral 0.15 --fallar   # código 1 si hay regresiones
+"""
+
+import sys
+import json
+import argparse
+from typing import Any, Dict, List, Tuple
+
+
+def cargar(ruta: str) -> Dict[str, Any]:
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def comparar(base: Dict[str, Any], nuevo: Dict[str, Any], umbral: float) -> List[Tuple[str, float, float, float, bool]]:
+    """
+    Devuelve (benchmark, p50 base, p50 nuevo, cambio relativo, regresión) para
+    los benchmarks medidos en ambas ejecuciones. Cambio > 0 significa más lento.
+    """
+    filas = []
+    for nombre, r_nuevo in nuevo["resultados"].items():
+        r_base = base["resultados"].get(nombre, {})
+        if "p50_ms" not in r_base or "p50_ms" not in r_nuevo or not r_base["p50_ms"]:
+            continue
+        cambio = r_nuevo["p50_ms"] / r_base["p50_ms"] - 1
+        filas.append((nombre, r_base["p50_ms"], r_nuevo["p50_ms"], cambio, cambio > umbral))
+    return filas
+
+
+def _avisos_entorno(base: Dict[str, Any], nuevo: Dict[str, Any]) -> List[str]:
+    """Diferencias de entorno o parámetros que invalidan la comparación"""
+    avisos = []
+    for seccion, ignorar in (("entorno", {"commit"}), ("parametros", set())):
+        a, b = base.get(seccion, {}), nuevo.get(seccion, {})
+        for clave in sorted((set(a) | set(b)) - ignorar):
+            if a.get(clave) != b.get(clave):
+                avisos.append(f"{seccion}.{clave}: {a.get(clave)} -> {b.get(clave)}")
+    return avisos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara dos ejecuciones de benchmarks")
+    parser.add_argument("base", help="JSON de la ejecución de referencia")
+    parser.add_argument("nuevo", help="JSON de la ejecución a comparar")
+    parser.add_argument("--umbral", type=float, default=0.10, help="Empeoramiento relativo del p50 que cuenta como regresión")
+    parser.add_argument("--fallar", action="store_true", help="Termina con código 1 si hay regresiones")
+    args = parser.parse_args()
+
+    base, nuevo = cargar(args.base), cargar(args.nuevo)
+    print(f"Base:  {base['entorno'].get('commit')} ({base['fecha']})")
+    print(f"Nuevo: {nuevo['entorno'].get('commit')} ({nuevo['fecha']})")
+    for aviso in _avisos_entorno(base, nuevo):
+        print(f"⚠️  Distinto {aviso}")
+
+    filas = comparar(base, nuevo, args.umbral)
+    print(f"\n{'benchmark':<26}{'p50 base':>12}{'p50 nuevo':>12}{'cambio':>10}")
+    for nombre, p50_base, p50_nuevo, cambio, regresion in filas:
+        marca = "  ❌" if regresion else ("  ✅" if cambio < -args.umbral else "")
+        print(f"{nombre:<26}{p50_base:>12.3f}{p50_nuevo:>12.3f}{cambio:>+10.1%}{marca}")
+
+    regresiones = [f[0] for f in filas if f[4]]
+    if regresiones:
+        print(f"\nRegresiones (> {args.umbral:.0%}): {', '.join(regresiones)}")
+        if args.fallar:
+            sys.exit(1)
+    else:
+        print("\n✅ Sin regresiones")
+
+
+if __name__ == "__main__":
+    main()
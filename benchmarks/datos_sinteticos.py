@@ -0,0 +1,134 @@
+# benchmarks/datos_sinteticos.py
+"""
+Genera datos sintéticos reproducibles para los benchmarks: CSV de
+candidatos con el formato de /api/procesar_csv_completo y descripciones de
+puesto para las búsquedas. La misma semilla produce siempre los mismos datos.
+
+Uso:
+    python -m benchmarks.datos_sinteticos --candidatos 10000 --salida data/bench_10k.csv
+    python -m benchmarks.datos_sinteticos --candidatos 500 --invalidas 0.05 --salida /tmp/bench.csv
+"""
+
+import argparse
+import random
+from typing import List, Optional, Tuple
+
+import pandas as pd
+
+PUESTOS = [
+    "Desarrollador Backend", "Desarrollador Frontend", "Científico de Datos",
+    "Ingeniero DevOps", "Analista QA", "Jefe de Proyecto", "Diseñador UX",
+    "Administrador de Sistemas",
+]
+
+HABILIDADES = [
+    "Python", "Java", "SQL", "PostgreSQL", "Docker", "Kubernetes", "React",
+    "FastAPI", "aprendizaje automático", "pruebas automatizadas", "Scrum",
+    "análisis de requisitos", "integración continua", "AWS", "Linux",
+    "diseño de interfaces", "comunicación con clientes", "gestión de equipos",
+]
+
+CUALIDADES = [
+    "proactivo", "metódico", "resolutivo", "comunicativo", "detallista",
+    "autónomo", "creativo", "organizado", "con capacidad de liderazgo",
+]
+
+CARENCIAS = [
+    "poca experiencia en producción", "inglés mejorable", "conocimientos de cloud limitados",
+    "le cuesta delegar", "documentación escasa", "falta de experiencia con equipos grandes",
+]
+
+PLANTILLAS_VALORACION = [
+    "El candidato muestra un dominio sólido de {h1} y {h2}. Es {c1} y {c2}. "
+    "Durante la entrevista explicó proyectos con {h3}. Como punto débil, {d1}.",
+    "Perfil {c1} con experiencia en {h1}, {h2} y {h3}. Demuestra ser {c2} "
+    "aunque presenta {d1}. Recomendable para un puesto de {puesto}.",
+    "Buena base técnica en {h1}. Ha trabajado con {h2} en entornos reales y "
+    "conoce {h3}. Se le percibe {c1}; habría que reforzar: {d1}.",
+]
+
+PLANTILLAS_DESCRIPCION = [
+    "Buscamos un perfil de {puesto} con experiencia en {h1} y {h2}, {c1} y {c2}.",
+    "Se necesita {puesto} con conocimientos de {h1}, {h2} y {h3}. Valoramos que sea {c1}.",
+    "Incorporamos {puesto}: imprescindible {h1}; deseable {h2} y {h3}. Persona {c1}.",
+]
+
+COLUMNAS = ["candidato_id", "puesto", "fortalezas", "debilidades", "valoracion_gpt"]
+
+
+def _rellenar(rng: random.Random, plantilla: str, puesto: str) -> str:
+    h1, h2, h3 = rng.sample(HABILIDADES, 3)
+    c1, c2 = rng.sample(CUALIDADES, 2)
+    return plantilla.format(h1=h1, h2=h2, h3=h3, c1=c1, c2=c2, d1=rng.choice(CARENCIAS), puesto=puesto)
+
+
+def _estropear(rng: random.Random, fila: dict) -> dict:
+    """Introduce un error de validación realista (campo vacío, ID no numérico o dato sensible)"""
+    tipo = rng.randrange(3)
+    if tipo == 0:
+        fila["fortalezas"] = ""
+    elif tipo == 1:
+        fila["candidato_id"] = f"X{fila['candidato_id']}"
+    else:
+        fila["valoracion_gpt"] += " Contacto: 612345678."
+    return fila
+
+
+def generar_candidatos(
+    n: int,
+    semilla: int = 42,
+    proporcion_invalidas: float = 0.0,
+    id_inicial: int = 1
+) -> pd.DataFrame:
+    """
+    DataFrame de `n` candidatos con las columnas del CSV de ingesta (todo texto).
+    Una fracción `proporcion_invalidas` de filas no pasa validar_filas.
+    """
+    rng = random.Random(semilla)
+    filas = []
+    for i in range(n):
+        puesto = rng.choice(PUESTOS)
+        fila = {
+            "candidato_id": str(id_inicial + i),
+            "puesto": puesto,
+            "fortalezas": ", ".join(rng.sample(HABILIDADES, 3)),
+            "debilidades": rng.choice(CARENCIAS),
+            "valoracion_gpt": _rellenar(rng, rng.choice(PLANTILLAS_VALORACION), puesto),
+        }
+        if proporcion_invalidas and rng.random() < proporcion_invalidas:
+            fila = _estropear(rng, fila)
+        filas.append(fila)
+    return pd.DataFrame(filas, columns=COLUMNAS)
+
+
+def generar_descripciones(n: int, semilla: int = 7) -> List[Tuple[Optional[str], str]]:
+    """Lista de (puesto, descripción) para las búsquedas; 1 de cada 4 sin puesto"""
+    rng = random.Random(semilla)
+    busquedas = []
+    for i in range(n):
+        puesto = rng.choice(PUESTOS)
+        descripcion = _rellenar(rng, rng.choice(PLANTILLAS_DESCRIPCION), puesto)
+        busquedas.append((None if i % 4 == 3 else puesto, descripcion))
+    return busquedas
+
+
+def escribir_csv(ruta: str, n: int, semilla: int = 42, proporcion_invalidas: float = 0.0, id_inicial: int = 1) -> str:
+    generar_candidatos(n, semilla, proporcion_invalidas, id_inicial).to_csv(ruta, index=False)
+    return ruta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera un CSV sintético de candidatos")
+    parser.add_argument("--candidatos", type=int, default=1000)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--invalidas", type=float, default=0.0, help="Fracción de filas inválidas (0-1)")
+    parser.add_argument("--id-inicial", type=int, default=1)
+    parser.add_argument("--salida", required=True, help="Ruta del CSV a generar")
+    args = parser.parse_args()
+
+    escribir_csv(args.salida, args.candidatos, args.semilla, args.invalidas, args.id_inicial)
+    print(f"✅ {args.candidatos} candidatos sintéticos escritos en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+# benchmarks/ejecutar.py
+"""
+Suite de benchmarks de los caminos calientes de ingesta y búsqueda.
+
+Mide por separado validar_filas, la limpieza con spaCy, la generación de
+embeddings, la consulta vectorial, ClusteringService.fit_predict y
+RerankingService.predict, y después la ingesta y la búsqueda de extremo a
+extremo. Los datos son sintéticos y reproducibles (benchmarks/datos_sinteticos.py).
+
+Almacenes:
+  - numpy (por defecto): NumpyVectorStore en memoria, sin base de datos.
+  - pgvector: la BD de DATABASE_URL. Usar una base de datos dedicada: los
+    candidatos se insertan a partir de --id-inicial y al terminar se borran
+    los que insertó la propia ejecución (salvo --conservar); los candidatos
+    que ya existían en ese rango no se tocan.
+
+Los caches de embeddings y de resultados se desactivan por defecto para
+medir el trabajo real (--con-cache los mantiene).
+
+El resultado se escribe en JSON (benchmarks/resultados/ por defecto) con el
+commit, el entorno y los parámetros; benchmarks/comparar.py compara dos
+ejecuciones.
+
+Uso:
+    python -m benchmarks.ejecutar
+    python -m benchmarks.ejecutar --candidatos 20000 --consultas 200 --repeticiones 5
+    python -m benchmarks.ejecutar --store pgvector --solo consulta_vectorial,busqueda
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRECTORIO_RESULTADOS = os.path.join(RAIZ, "benchmarks", "resultados")
+
+# Benchmarks disponibles, en orden de ejecución
+BENCHMARKS = [
+    "validar_filas",
+    "limpieza",
+    "limpieza_lote",
+    "embedding",
+    "embedding_lote",
+    "ingesta",
+    "consulta_vectorial",
+    "consulta_vectorial_lote",
+    "clustering",
+    "reranking",
+    "busqueda",
+    "busqueda_lote",
+]
+
+
+def configurar_entorno(args: argparse.Namespace) -> None:
+    """Fija las variables de entorno antes de importar app2_ia (se leen al importar)"""
+    os.environ["EVALIA_VECTOR_STORE"] = args.store
+    if args.store == "numpy":
+        # Almacén solo en memoria: no reutilizar ni ensuciar un memmap existente
+        os.environ.pop("EVALIA_NUMPY_STORE_PATH", None)
+    if not args.con_cache:
+        os.environ["EVALIA_RESULT_CACHE_MAX"] = "0"
+        os.environ["EVALIA_EMBEDDING_CACHE_MB"] = "0"
+        os.environ.pop("EVALIA_EMBEDDING_CACHE_PATH", None)
+
+
+# --------------------------------------------------
+# Medición
+# --------------------------------------------------
+
+def resumir(tiempos: Sequence[float], elementos_por_medida: int = 1) -> Dict[str, float]:
+    """Estadísticas (ms) de una serie de tiempos en segundos"""
+    t = np.asarray(tiempos, dtype=np.float64)
+    total = float(t.sum())
+    return {
+        "medidas": int(t.size),
+        "elementos_por_medida": elementos_por_medida,
+        "media_ms": round(float(t.mean()) * 1000, 4),
+        "p50_ms": round(float(np.percentile(t, 50)) * 1000, 4),
+        "p95_ms": round(float(np.percentile(t, 95)) * 1000, 4),
+        "min_ms": round(float(t.min()) * 1000, 4),
+        "max_ms": round(float(t.max()) * 1000, 4),
+        "elementos_por_s": round(t.size * elementos_por_medida / total, 2) if total > 0 else None,
+    }
+
+
+def medir(funcion: Callable[[], Any], repeticiones: int, elementos: int = 1, calentamiento: int = 1) -> Dict[str, float]:
+    """Cronometra `repeticiones` llamadas a una operación que procesa `elementos` elementos"""
+    for _ in range(calentamiento):
+        funcion()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return resumir(tiempos, elementos)
+
+
+def medir_por_elemento(funcion: Callable[[Any], Any], elementos: Sequence[Any], repeticiones: int) -> Dict[str, float]:
+    """Cronometra cada llamada `funcion(elemento)` (latencia por petición)"""
+    funcion(elementos[0])  # calentamiento
+    tiempos = []
+    for _ in range(repeticiones):
+        for elemento in elementos:
+            inicio = time.perf_counter()
+            funcion(elemento)
+            tiempos.append(time.perf_counter() - inicio)
+    return resumir(tiempos)
+
+
+# --------------------------------------------------
+# Entorno de la ejecución
+# --------------------------------------------------
+
+def _commit_git() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def describir_entorno(args: argparse.Namespace) -> Dict[str, Any]:
+    from app2_ia.config import EMBEDDING_MODO, EMBEDDING_DIM
+    from app2_ia.services.embedding_backend import EMBEDDING_BACKEND
+    from app2_ia.services.embedding_pool import EMBEDDING_PROCESOS
+    entorno = {
+        "commit": _commit_git(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "store": args.store,
+        "embedding_modo": EMBEDDING_MODO,
+        "embedding_dim": EMBEDDING_DIM,
+        "embedding_backend": EMBEDDING_BACKEND,
+        "embedding_procesos": EMBEDDING_PROCESOS,
+        "caches": args.con_cache,
+    }
+    if args.store == "pgvector":
+        from app2_ia.services.vector_db import VECTOR_COMPRESION, factor_rescore
+        from app2_ia.services.vector_index import INDEX_TIPO
+        entorno["indice"] = INDEX_TIPO
+        entorno["vector_compresion"] = VECTOR_COMPRESION
+        entorno["factor_rescore"] = factor_rescore()
+    return entorno
+
+
+# --------------------------------------------------
+# Suite
+# --------------------------------------------------
+
+class Suite:
+    """Prepara los datos sintéticos y ejecuta los benchmarks seleccionados"""
+
+    def __init__(self, args: argparse.Namespace):
+        from benchmarks.datos_sinteticos import generar_candidatos, generar_descripciones
+
+        self.args = args
+        self.resultados: Dict[str, Dict[str, Any]] = {}
+        self.candidatos = generar_candidatos(args.candidatos, args.semilla, args.invalidas, args.id_inicial)
+        self.busquedas = generar_descripciones(args.consultas, args.semilla + 1)
+        self.ruta_csv = os.path.join(tempfile.mkdtemp(prefix="evalia_bench_"), "candidatos.csv")
+        self.candidatos.to_csv(self.ruta_csv, index=False)
+        # Se rellenan según avanza la suite
+        self._textos_consulta: Optional[List[str]] = None
+        self._embeddings_consulta: Optional[List[List[float]]] = None
+        self._ingestado = False
+        # candidato_id insertados por esta ejecución (los únicos que se borran al terminar)
+        self._ids_insertados: List[int] = []
+
+    # Datos derivados (se calculan una vez, fuera de las mediciones)
+    def textos_consulta(self) -> List[str]:
+        if self._textos_consulta is None:
+            from app2_ia.utils.limpieza import limpiar_textos_para_embedding
+            self._textos_consulta = limpiar_textos_para_embedding([d for _, d in self.busquedas])
+        return self._textos_consulta
+
+    def embeddings_consulta(self) -> List[List[float]]:
+        if self._embeddings_consulta is None:
+            from app2_ia.services.embedding import generar_embeddings
+            self._embeddings_consulta = generar_embeddings(self.textos_consulta())
+        return self._embeddings_consulta
+
+    def _ingestar(self):
+        from app2_ia.services.ingest_service import procesar_csv_en_streaming
+        resultado = procesar_csv_en_streaming(self.ruta_csv)
+        # `datos` solo incluye los candidatos que insertar_lote insertó de verdad
+        self._ids_insertados = [int(d["candidato_id"]) for d in resultado.datos]
+        self._ingestado = True
+        return resultado
+
+    def asegurar_ingesta(self) -> None:
+        """La consulta vectorial y la búsqueda necesitan los candidatos cargados"""
+        if not self._ingestado:
+            self._ingestar()
+
+    def valoraciones(self) -> List[str]:
+        return self.candidatos["valoracion_gpt"].tolist()
+
+    # ---- benchmarks aislados ----
+    def bench_validar_filas(self):
+        from app2_ia.utils.validacion import validar_filas
+        # validar_filas modifica las cabeceras: cada medida con su copia
+        return medir(lambda: validar_filas(self.candidatos.copy()), self.args.repeticiones, len(self.candidatos))
+
+    def bench_limpieza(self):
+        from app2_ia.utils.limpieza import limpiar_texto_para_embedding
+        return medir_por_elemento(limpiar_texto_para_embedding, [d for _, d in self.busquedas], self.args.repeticiones)
+
+    def bench_limpieza_lote(self):
+        from app2_ia.utils.limpieza import limpiar_textos_para_embedding
+        textos = self.valoraciones()
+        return medir(lambda: limpiar_textos_para_embedding(textos), self.args.repeticiones, len(textos))
+
+    def bench_embedding(self):
+        from app2_ia.services.embedding import obtener_modulo
+        modulo = obtener_modulo()
+        return medir_por_elemento(modulo.generar_embedding, self.textos_consulta(), self.args.repeticiones)
+
+    def bench_embedding_lote(self):
+        from app2_ia.services.embedding import generar_embeddings
+        from app2_ia.utils.limpieza import limpiar_textos_para_embedding
+        textos = limpiar_textos_para_embedding(self.valoraciones())
+        return medir(lambda: generar_embeddings(textos), self.args.repeticiones, len(textos))
+
+    def bench_ingesta(self):
+        # Una sola medida: repetirla solo encontraría duplicados
+        from app2_ia.services.embedding import obtener_modulo
+        if self._ingestado:
+            return {"omitido": "los candidatos ya estaban cargados"}
+        obtener_modulo()  # la carga del modelo no forma parte de la ingesta
+        inicio = time.perf_counter()
+        resultado = self._ingestar()
+        resumen = resumir([time.perf_counter() - inicio], len(self.candidatos))
+        resumen.update(insertados=resultado.validados, descartados=resultado.descartados)
+        return resumen
+
+    def bench_consulta_vectorial(self):
+        from app2_ia.services.vector_store import obtener_store
+        self.asegurar_ingesta()
+        store = obtener_store()
+        pares = list(zip(self.embeddings_consulta(), (p for p, _ in self.busquedas)))
+        return medir_por_elemento(lambda par: store.buscar(par[0], par[1], k=self.args.k), pares, self.args.repeticiones)
+
+    def bench_consulta_vectorial_lote(self):
+        from app2_ia.services.vector_store import obtener_store
+        self.asegurar_ingesta()
+        store = obtener_store()
+        embeddings = self.embeddings_consulta()
+        puestos = [p for p, _ in self.busquedas]
+        return medir(lambda: store.buscar_lote(embeddings, puestos, k=self.args.k), self.args.repeticiones, len(embeddings))
+
+    def bench_clustering(self):
+        try:
+            from app2_ia.services.clustering_service import ClusteringService
+            servicio = ClusteringService(n_clusters=3)
+        except ImportError as e:
+            return {"omitido": f"dependencia no disponible: {e}"}
+        from app2_ia.models.schemas import EmbeddingCandidato
+        from app2_ia.services.vector_store import obtener_store
+        self.asegurar_ingesta()
+        store = obtener_store()
+        # KMeans sobre los vecinos de cada consulta, como hacía la búsqueda por petición
+        listas = [
+            [
+                EmbeddingCandidato(candidato_id=str(v.candidato_id), embedding=list(v.embedding))
+                for v in store.buscar(embedding, puesto, k=self.args.k, con_embedding=True)
+            ]
+            for embedding, (puesto, _) in zip(self.embeddings_consulta(), self.busquedas)
+        ]
+        return medir_por_elemento(servicio.fit_predict, listas, self.args.repeticiones)
+
+    def bench_reranking(self):
+        try:
+            from app2_ia.services.reranking_service import RegistroReranker, RERANKER_PATH
+            ruta = self.args.reranker or RERANKER_PATH
+            reranker = RegistroReranker(ruta, intervalo_s=0).obtener()
+        except ImportError as e:
+            return {"omitido": f"dependencia no disponible: {e}"}
+        if reranker is None:
+            return {"omitido": f"no hay modelo de reranking en {ruta}"}
+        from app2_ia.models.schemas import ResultadoRanking
+        from app2_ia.services.vector_store import obtener_store
+        self.asegurar_ingesta()
+        store = obtener_store()
+        listas = [
+            [
+                ResultadoRanking(
+                    candidato_id=str(v.candidato_id), similitud=round(1 - v.distancia, 4),
+                    ranking=i + 1, puesto=v.puesto, cluster_id=v.cluster_id
+                )
+                for i, v in enumerate(store.buscar(embedding, puesto, k=self.args.k))
+            ]
+            for embedding, (puesto, _) in zip(self.embeddings_consulta(), self.busquedas)
+        ]
+        # predict reordena la lista: cada llamada con su copia
+        return medir_por_elemento(lambda lista: reranker.predict(list(lista)), listas, self.args.repeticiones)
+
+    # ---- extremo a extremo ----
+    def bench_busqueda(self):
+        from app2_ia.services.search_service import buscar_candidatos_similares
+        self.asegurar_ingesta()
+        return medir_por_elemento(
+            lambda b: buscar_candidatos_similares(b[0], b[1], k=self.args.k), self.busquedas, self.args.repeticiones
+        )
+
+    def bench_busqueda_lote(self):
+        from app2_ia.services.search_service import buscar_candidatos_similares_lote
+        self.asegurar_ingesta()
+        ks = [self.args.k] * len(self.busquedas)
+        return medir(lambda: buscar_candidatos_similares_lote(self.busquedas, ks), self.args.repeticiones, len(self.busquedas))
+
+    def ejecutar(self, nombres: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        for nombre in nombres:
+            print(f"  {nombre}...", flush=True)
+            try:
+                self.resultados[nombre] = getattr(self, f"bench_{nombre}")()
+            except Exception as e:
+                print(f"  ❌ {nombre}: {e}")
+                self.resultados[nombre] = {"error": str(e)}
+        return self.resultados
+
+    def limpiar(self) -> None:
+        """Borra el CSV temporal y, en pgvector, los candidatos que insertó esta ejecución"""
+        try:
+            os.remove(self.ruta_csv)
+            os.rmdir(os.path.dirname(self.ruta_csv))
+        except OSError:
+            pass
+        if self.args.store == "pgvector" and self._ids_insertados and not self.args.conservar:
+            from sqlalchemy import text
+            from app2_ia.services.vector_db import engine
+            with engine.begin() as conn:
+                borrados = conn.execute(
+                    text("DELETE FROM evalia_embeddings WHERE candidato_id = ANY(:ids)"),
+                    {"ids": self._ids_insertados}
+                ).rowcount
+            print(f"  {borrados} candidatos de prueba eliminados de la BD")
+
+
+def imprimir_tabla(resultados: Dict[str, Dict[str, Any]]) -> None:
+    print(f"\n{'benchmark':<26}{'p50 ms':>12}{'p95 ms':>12}{'media ms':>12}{'elem/s':>14}")
+    for nombre, r in resultados.items():
+        if "p50_ms" in r:
+            print(f"{nombre:<26}{r['p50_ms']:>12.3f}{r['p95_ms']:>12.3f}{r['media_ms']:>12.3f}{r['elementos_por_s'] or 0:>14.1f}")
+        else:
+            print(f"{nombre:<26}  {r.get('omitido') or r.get('error')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de ingesta y búsqueda de Eval-IA")
+    parser.add_argument("--store", choices=["numpy", "pgvector"], default="numpy")
+    parser.add_argument("--candidatos", type=int, default=2000, help="Candidatos sintéticos a cargar")
+    parser.add_argument("--consultas", type=int, default=50, help="Descripciones de puesto a buscar")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--invalidas", type=float, default=0.02, help="Fracción de filas inválidas en el CSV")
+    parser.add_argument("--id-inicial", type=int, default=900_000_000,
+                        help="Primer candidato_id sintético (fuera del rango de datos reales)")
+    parser.add_argument("--solo", help=f"Benchmarks a ejecutar, separados por comas: {','.join(BENCHMARKS)}")
+    parser.add_argument("--reranker", help="Modelo de reranking (por defecto EVALIA_RERANKER_PATH)")
+    parser.add_argument("--con-cache", action="store_true", help="No desactivar los caches de embeddings y resultados")
+    parser.add_argument("--conservar", action="store_true", help="pgvector: no borrar los candidatos insertados")
+    parser.add_argument("--salida", help="Fichero JSON de resultados (por defecto benchmarks/resultados/<fecha>_<store>.json)")
+    args = parser.parse_args()
+
+    nombres = args.solo.split(",") if args.solo else BENCHMARKS
+    desconocidos = set(nombres) - set(BENCHMARKS)
+    if desconocidos:
+        parser.error(f"Benchmarks desconocidos: {sorted(desconocidos)}")
+
+    configurar_entorno(args)
+    if RAIZ not in sys.path:
+        sys.path.insert(0, RAIZ)
+    if args.store == "pgvector":
+        from app2_ia.services.vector_db import requerir_bd
+        from app2_ia.services.arranque import INDEX_AUTO_CREAR
+        from app2_ia.services.vector_store import obtener_store
+        requerir_bd()
+        obtener_store().inicializar(crear_indice_ann=INDEX_AUTO_CREAR)
+
+    print(f"Benchmarks ({args.store}, {args.candidatos} candidatos, {args.consultas} consultas, "
+          f"{args.repeticiones} repeticiones)")
+    suite = Suite(args)
+    try:
+        resultados = suite.ejecutar(nombres)
+    finally:
+        suite.limpiar()
+    imprimir_tabla(resultados)
+
+    informe = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "entorno": describir_entorno(args),
+        "parametros": {
+            "candidatos": args.candidatos,
+            "consultas": args.consultas,
+            "repeticiones": args.repeticiones,
+            "k": args.k,
+            "semilla": args.semilla,
+            "invalidas": args.invalidas,
+        },
+        "resultados": resultados,
+    }
+    salida = args.salida or os.path.join(
+        DIRECTORIO_RESULTADOS, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{args.store}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ Resultados guardados en {salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# tests/test_arranque.py
+"""Pruebas del calentamiento: reintentos y etapas ya completadas"""
+
+import pytest
+
+from app2_ia.services import arranque
+
+
+@pytest.fixture
+def etapas(monkeypatch):
+    """Estado limpio y etapas falsas; "bd" falla las dos primeras veces"""
+    llamadas = []
+
+    def etapa(nombre, fallos=0):
+        def funcion():
+            llamadas.append(nombre)
+            if llamadas.count(nombre) <= fallos:
+                raise ConnectionError(f"{nombre} no disponible")
+        return nombre, funcion
+
+    monkeypatch.setattr(arranque, "_estado", arranque.EstadoArranque())
+    monkeypatch.setattr(arranque, "ETAPAS_BD", [etapa("bd")])
+    monkeypatch.setattr(arranque, "ETAPAS_MODELOS", [etapa("modelo", fallos=2)])
+    return llamadas
+
+
+def test_un_fallo_deja_el_servicio_no_listo_con_el_error(etapas):
+    assert arranque.calentar() is False
+
+    estado = arranque.estado_arranque()
+    assert estado["listo"] is False and estado["en_curso"] is False
+    assert estado["error"] == "modelo no disponible"
+    assert estado["intentos"] == 1
+
+
+def test_reintenta_con_espera_exponencial_sin_repetir_etapas(etapas, monkeypatch):
+    esperas = []
+    monkeypatch.setattr(arranque.time, "sleep", esperas.append)
+    monkeypatch.setattr(arranque, "WARMUP_REINTENTO_MAX_S", 3)
+
+    arranque.calentar_con_reintentos(espera_s=2)
+
+    assert arranque.esta_listo()
+    assert esperas == [2, 3]
+    assert etapas == ["bd", "modelo", "modelo", "modelo"]
+    estado = arranque.estado_arranque()
+    assert estado["error"] is None and estado["intentos"] == 3
+
+
+def test_desactivado_inicializa_la_bd_sin_cargar_modelos(etapas, monkeypatch):
+    monkeypatch.setattr(arranque, "WARMUP_MODO", "desactivado")
+
+    arranque.iniciar()
+
+    assert arranque.esta_listo()
+    assert etapas == ["bd"]
@@ -0,0 +1,42 @@
+# tests/test_clustering_service.py
+"""Pruebas de los clusters globales: asignación y recarga de los centroides"""
+
+import types
+
+import numpy as np
+
+from app2_ia.config import EMBEDDING_DIM
+from app2_ia.services import clustering_service
+from app2_ia.services.clustering_service import ClusteringGlobal, RegistroClusters
+
+
+def test_asigna_el_centroide_mas_cercano():
+    centroides = np.eye(3, dtype=np.float32)
+    modelo = ClusteringGlobal(centroides, "v1")
+
+    asignados = modelo.asignar([[0.9, 0.1, 0.0], [0.0, 0.2, 0.7], [0.1, 0.8, 0.3]])
+
+    assert asignados == [0, 2, 1]
+    assert modelo.asignar([]) == []
+
+
+def test_una_carga_fallida_se_reintenta_con_la_misma_firma(tmp_path, monkeypatch):
+    ruta = tmp_path / "clusters.joblib"
+    ruta.write_bytes(b"centroides")
+    cargas = []
+
+    def cargar(_ruta):
+        cargas.append(_ruta)
+        if len(cargas) == 1:
+            raise EOFError("fichero truncado")
+        return {"version": "v1", "centroides": np.zeros((4, EMBEDDING_DIM), dtype=np.float32)}
+
+    monkeypatch.setattr(clustering_service, "joblib", types.SimpleNamespace(load=cargar))
+    registro = RegistroClusters(str(ruta), intervalo_s=0)
+
+    assert registro.obtener() is None
+    modelo = registro.obtener()
+    assert modelo is not None and modelo.version == "v1" and modelo.n_clusters == 4
+    # Ya cargado: no se vuelve a leer mientras el fichero no cambie
+    assert registro.obtener() is modelo
+    assert len(cargas) == 2
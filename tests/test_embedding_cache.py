@@ -0,0 +1,87 @@
+# tests/test_embedding_cache.py
+"""Pruebas del cache de embeddings: LRU en memoria y nivel LRU en disco (SQLite)"""
+
+import itertools
+import sqlite3
+
+import numpy as np
+
+from app2_ia.services import embedding_cache
+from app2_ia.services.embedding_cache import EmbeddingCache, _OVERHEAD_ENTRADA
+
+DIM = 4
+BYTES_VECTOR = DIM * 4
+
+
+def _vector(valor):
+    return np.full(DIM, valor, dtype=np.float32)
+
+
+def test_memoria_expulsa_la_entrada_menos_usada():
+    cache = EmbeddingCache("ns", max_bytes=2 * (BYTES_VECTOR + _OVERHEAD_ENTRADA))
+    cache.put_many([("a", _vector(1)), ("b", _vector(2))])
+    cache.get("a")
+
+    cache.put("c", _vector(3))
+
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+    stats = cache.stats()
+    assert (stats["hits_memoria"], stats["misses"], stats["evictions"]) == (3, 1, 1)
+    assert stats["entradas"] == 2 and stats["bytes"] <= cache.max_bytes
+    assert stats["disco"] is False
+
+
+def test_convierte_a_float32_y_las_claves_dependen_del_namespace():
+    cache = EmbeddingCache("modelo-a")
+    cache.put("k", np.arange(DIM, dtype=np.float64))
+
+    assert cache.get("k").dtype == np.float32
+    assert cache.clave("texto") != EmbeddingCache("modelo-b").clave("texto")
+
+
+def test_el_disco_sobrevive_a_un_cache_nuevo(tmp_path):
+    ruta = str(tmp_path / "cache.sqlite")
+    EmbeddingCache("ns", ruta_disco=ruta).put("k", _vector(7))
+
+    cache = EmbeddingCache("ns", ruta_disco=ruta)
+    np.testing.assert_array_equal(cache.get("k"), _vector(7))
+    cache.get("k")
+
+    stats = cache.stats()
+    assert (stats["hits_disco"], stats["hits_memoria"], stats["misses"]) == (1, 1, 0)
+
+
+def test_poda_del_disco_por_ultimo_uso(tmp_path, monkeypatch):
+    # Reloj que siempre avanza: escrituras y lecturas no comparten milisegundo
+    reloj = itertools.count(1)
+    monkeypatch.setattr(embedding_cache, "_ahora_ms", lambda: next(reloj))
+    ruta = str(tmp_path / "cache.sqlite")
+    cache = EmbeddingCache("ns", ruta_disco=ruta, max_bytes_disco=1500 * BYTES_VECTOR)
+    cache.put_many([(f"k{i}", _vector(i)) for i in range(1000)])
+    cache.clear()
+    usadas = [f"k{i}" for i in range(300)]
+    assert len(cache.get_many(usadas)) == 300
+
+    # Superar el límite fuerza la poda (cada 1000 escrituras)
+    cache.put_many([(f"n{i}", _vector(i)) for i in range(1000)])
+    cache.clear()
+
+    assert len(cache.get_many(usadas)) == 300
+    stats = cache.stats()
+    assert stats["evictions_disco"] > 0
+    assert stats["evictions"] == 0
+
+
+def test_migra_un_cache_en_disco_sin_ultimo_uso(tmp_path):
+    ruta = str(tmp_path / "cache.sqlite")
+    conn = sqlite3.connect(ruta)
+    conn.execute("CREATE TABLE embeddings (clave TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+    conn.execute("INSERT INTO embeddings VALUES (?, ?)", ("antigua", _vector(1).tobytes()))
+    conn.commit()
+    conn.close()
+
+    cache = EmbeddingCache("ns", ruta_disco=ruta)
+
+    np.testing.assert_array_equal(cache.get("antigua"), _vector(1))
+    cache.put("nueva", _vector(2))
+    assert cache.stats()["disco"] is True
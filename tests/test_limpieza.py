@@ -0,0 +1,39 @@
+# tests/test_limpieza.py
+"""Pruebas del memo de textos limpios (sin cargar spaCy)"""
+
+from app2_ia.utils.limpieza import MemoLimpieza
+
+
+def test_aciertos_fallos_y_expulsion_lru():
+    memo = MemoLimpieza(max_entradas=2)
+    a, b, c = memo.clave("uno"), memo.clave("dos"), memo.clave("tres")
+    memo.put_many({a: "uno", b: "dos"})
+    assert memo.get_many([a]) == {a: "uno"}  # "uno" pasa a ser el más reciente
+
+    memo.put_many({c: "tres"})
+
+    assert memo.get_many([a, b, c]) == {a: "uno", c: "tres"}
+    assert memo.stats() == {"hits": 3, "misses": 1, "evictions": 1, "entradas": 2, "max_entradas": 2}
+
+
+def test_cambiar_version_vacia_el_memo_y_cambia_las_claves():
+    memo = MemoLimpieza(max_entradas=10)
+    memo.fijar_version("es_core_news_sm-3.7:reglas-1")
+    antigua = memo.clave("texto")
+    memo.put_many({antigua: "texto"})
+
+    memo.fijar_version("es_core_news_sm-3.7:reglas-2")
+
+    assert memo.clave("texto") != antigua
+    assert memo.get_many([antigua, memo.clave("texto")]) == {}
+    assert memo.stats()["entradas"] == 0
+
+
+def test_memo_desactivado():
+    memo = MemoLimpieza(max_entradas=0)
+    clave = memo.clave("texto")
+    memo.put_many({clave: "texto"})
+
+    assert not memo.activo
+    assert memo.get_many([clave]) == {}
+    assert memo.stats()["misses"] == 0
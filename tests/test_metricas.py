@@ -0,0 +1,143 @@
+# tests/test_metricas.py
+"""Pruebas del formato de exposición de Prometheus (texto 0.0.4) de utils/metricas.py"""
+
+import re
+
+import pytest
+
+from app2_ia.utils.metricas import (
+    Contador,
+    Histograma,
+    Indicador,
+    RegistroMetricas,
+)
+
+# nombre{etiqueta="valor",...} valor
+MUESTRA_RE = re.compile(
+    r'^[a-zA-Z_:][a-zA-Z0-9_:]*'
+    r'(\{[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\[\\"n])*"(,[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\[\\"n])*")*\})?'
+    r' (?:[+-]Inf|NaN|-?\d+(?:\.\d+)?(?:e[+-]?\d+)?)$'
+)
+
+
+def _exponer(*metricas):
+    registro = RegistroMetricas()
+    for metrica in metricas:
+        registro.registrar(metrica)
+    return registro.exponer()
+
+
+def _comprobar_formato(texto):
+    assert texto.endswith("\n")
+    for linea in texto.rstrip("\n").split("\n"):
+        if linea.startswith("#"):
+            continue
+        assert MUESTRA_RE.match(linea), linea
+
+
+def test_contador_con_help_type_y_etiquetas_ordenadas():
+    contador = Contador("evalia_x_total", "Eventos", etiquetas=("tipo", "resultado"))
+    contador.inc(tipo="lote", resultado="error")
+    contador.inc(2, tipo="pagina", resultado="cache")
+    contador.inc(0.5, tipo="pagina", resultado="cache")
+
+    texto = _exponer(contador)
+
+    _comprobar_formato(texto)
+    assert texto.split("\n")[:4] == [
+        "# HELP evalia_x_total Eventos",
+        "# TYPE evalia_x_total counter",
+        'evalia_x_total{tipo="lote",resultado="error"} 1.0',
+        'evalia_x_total{tipo="pagina",resultado="cache"} 2.5',
+    ]
+
+
+def test_histograma_con_buckets_acumulativos():
+    histograma = Histograma("evalia_d_segundos", "Duración", etiquetas=("etapa",), buckets=(0.1, 1.0))
+    for valor in (0.05, 0.1, 0.5, 3.0):
+        histograma.observe(valor, etapa="embedding")
+
+    texto = _exponer(histograma)
+
+    _comprobar_formato(texto)
+    assert texto.split("\n")[1:] == [
+        "# TYPE evalia_d_segundos histogram",
+        'evalia_d_segundos_bucket{etapa="embedding",le="0.1"} 2',
+        'evalia_d_segundos_bucket{etapa="embedding",le="1.0"} 3',
+        'evalia_d_segundos_bucket{etapa="embedding",le="+Inf"} 4',
+        'evalia_d_segundos_sum{etapa="embedding"} 3.65',
+        'evalia_d_segundos_count{etapa="embedding"} 4',
+        "",
+    ]
+
+
+def test_cronometrar_como_decorador_observa_cada_llamada():
+    histograma = Histograma("evalia_c_segundos", "Duración")
+
+    @histograma.cronometrar()
+    def funcion():
+        pass
+
+    funcion()
+    funcion()
+
+    assert "evalia_c_segundos_count 2" in _exponer(histograma)
+
+
+def test_escapado_de_etiquetas_y_ayuda():
+    contador = Contador("evalia_e_total", 'Ayuda con \\ y "comillas"\nen dos líneas', etiquetas=("puesto",))
+    contador.inc(puesto='dev "senior"\\backend\n')
+
+    texto = _exponer(contador)
+
+    _comprobar_formato(texto)
+    # En HELP las comillas no se escapan; en los valores de etiqueta sí
+    assert '# HELP evalia_e_total Ayuda con \\\\ y "comillas"\\nen dos líneas\n' in texto
+    assert 'evalia_e_total{puesto="dev \\"senior\\"\\\\backend\\n"} 1.0\n' in texto
+
+
+def test_indicador_con_y_sin_etiquetas():
+    texto = _exponer(
+        Indicador("evalia_pool", "Conexiones", lambda: {("en_uso",): 3, ("libres",): 2}, etiquetas=("estado",)),
+        Indicador("evalia_cola", "Tareas", lambda: 7),
+        Indicador("evalia_total", "Acumulado", lambda: float("inf"), tipo="counter"),
+    )
+
+    _comprobar_formato(texto)
+    assert 'evalia_pool{estado="en_uso"} 3.0\nevalia_pool{estado="libres"} 2.0\n' in texto
+    assert "# TYPE evalia_cola gauge\nevalia_cola 7.0\n" in texto
+    assert "# TYPE evalia_total counter\nevalia_total +Inf\n" in texto
+
+
+def test_indicador_que_falla_no_rompe_la_exposicion():
+    def falla():
+        raise RuntimeError("pool cerrado")
+
+    contador = Contador("evalia_ok_total", "Sigue apareciendo")
+    contador.inc()
+    texto = _exponer(Indicador("evalia_roto", "Roto", falla), contador)
+
+    _comprobar_formato(texto)
+    assert "# evalia_roto no disponible: pool cerrado\n" in texto
+    assert "evalia_ok_total 1.0\n" in texto
+
+
+def test_etiquetas_incorrectas_y_decrementos_se_rechazan():
+    contador = Contador("evalia_v_total", "Validación", etiquetas=("tipo",))
+
+    with pytest.raises(ValueError, match="espera las etiquetas"):
+        contador.inc(otro="x")
+    with pytest.raises(ValueError, match="decrecer"):
+        contador.inc(-1, tipo="x")
+    with pytest.raises(ValueError, match="espera las etiquetas"):
+        Histograma("evalia_h", "H", etiquetas=("etapa",)).cronometrar()
+
+
+def test_registro_global_expone_las_metricas_del_pipeline():
+    from app2_ia.utils.metricas import exponer
+
+    texto = exponer()
+
+    _comprobar_formato(texto)
+    assert "# TYPE evalia_etapa_duracion_segundos histogram" in texto
+    assert "# TYPE evalia_busquedas_total counter" in texto
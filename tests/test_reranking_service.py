@@ -0,0 +1,66 @@
+# tests/test_reranking_service.py
+"""Pruebas del registro del modelo de reranking (carga y recarga en caliente)"""
+
+import pytest
+
+from app2_ia.services import reranking_service
+from app2_ia.services.reranking_service import RegistroReranker
+
+
+class _ServicioFalso:
+    """RerankingService que falla las primeras `fallos` cargas"""
+    fallos = 0
+    cargas = 0
+
+    def __init__(self, model_path):
+        type(self).cargas += 1
+        if type(self).cargas <= type(self).fallos:
+            raise EOFError("fichero truncado")
+
+    def incompatibilidad(self, clusters):
+        return None
+
+
+@pytest.fixture
+def servicio(monkeypatch):
+    _ServicioFalso.fallos, _ServicioFalso.cargas = 0, 0
+    monkeypatch.setattr(reranking_service, "RerankingService", _ServicioFalso)
+    monkeypatch.setattr(reranking_service, "obtener_clusters", lambda: None)
+    return _ServicioFalso
+
+
+def test_sin_fichero_no_hay_modelo(tmp_path, servicio):
+    registro = RegistroReranker(str(tmp_path / "reranker.joblib"), intervalo_s=0)
+
+    assert registro.obtener() is None
+    assert registro.version is None
+    assert servicio.cargas == 0
+
+
+def test_carga_una_vez_y_recarga_si_cambia_el_fichero(tmp_path, servicio):
+    ruta = tmp_path / "reranker.joblib"
+    ruta.write_bytes(b"modelo v1")
+    registro = RegistroReranker(str(ruta), intervalo_s=0)
+
+    primera = registro.obtener()
+    version = registro.version
+    assert primera is not None and registro.obtener() is primera
+    assert servicio.cargas == 1
+
+    ruta.write_bytes(b"modelo v2 distinto")
+
+    assert registro.obtener() is not primera
+    assert registro.version != version
+    assert servicio.cargas == 2
+
+
+def test_una_carga_fallida_se_reintenta_con_la_misma_firma(tmp_path, servicio):
+    servicio.fallos = 1
+    ruta = tmp_path / "reranker.joblib"
+    ruta.write_bytes(b"modelo")
+    registro = RegistroReranker(str(ruta), intervalo_s=0)
+
+    assert registro.obtener() is None
+    # El fichero no cambia: la siguiente comprobación lo vuelve a intentar
+    assert registro.obtener() is not None
+    assert servicio.cargas == 2
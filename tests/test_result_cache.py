@@ -0,0 +1,81 @@
+# tests/test_result_cache.py
+"""Pruebas del cache de resultados: LRU, TTL e invalidación tras una ingesta"""
+
+import pytest
+
+from app2_ia.models.schemas import ResultadoRanking
+from app2_ia.services.result_cache import (
+    CacheResultados,
+    incrementar_version_datos,
+    normalizar_descripcion,
+    obtener_cache_resultados,
+)
+
+
+def _ranking(*ids):
+    return [
+        ResultadoRanking(candidato_id=str(cid), similitud=0.9, ranking=i, puesto="dev", cluster_id=None)
+        for i, cid in enumerate(ids, start=1)
+    ]
+
+
+def test_guarda_y_devuelve_copias():
+    cache = CacheResultados(max_entradas=4, ttl_s=60)
+    cache.put("a", _ranking(1, 2), cache.version_datos, "cursor")
+
+    ranking, siguiente = cache.get("a")
+    ranking[0].ranking = 99
+
+    assert siguiente == "cursor"
+    assert cache.get("a")[0][0].ranking == 1
+    assert cache.stats()["hits"] == 2
+
+
+def test_incrementar_version_datos_invalida_el_cache_del_proceso():
+    cache = obtener_cache_resultados()
+    version = cache.version_datos
+    cache.put(("dev", "python", 10, None), _ranking(1), version)
+    assert cache.get(("dev", "python", 10, None)) is not None
+
+    assert incrementar_version_datos() == version + 1
+
+    assert cache.get(("dev", "python", 10, None)) is None
+    assert cache.stats()["entradas"] == 0
+    # Un ranking calculado con la versión anterior (consulta en curso durante
+    # la ingesta) no se guarda
+    cache.put(("dev", "python", 10, None), _ranking(1), version)
+    assert cache.get(("dev", "python", 10, None)) is None
+
+
+def test_expulsa_la_entrada_menos_usada():
+    cache = CacheResultados(max_entradas=2, ttl_s=60)
+    cache.put("a", _ranking(1), 0)
+    cache.put("b", _ranking(2), 0)
+    cache.get("a")
+
+    cache.put("c", _ranking(3), 0)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entradas_caducadas():
+    cache = CacheResultados(max_entradas=2, ttl_s=-1)
+    cache.put("a", _ranking(1), 0)
+
+    assert cache.get("a") is None
+    assert cache.stats()["expiradas"] == 1
+
+
+def test_cache_desactivado():
+    cache = CacheResultados(max_entradas=0)
+    cache.put("a", _ranking(1), 0)
+
+    assert not cache.activo
+    assert cache.get("a") is None
+
+
+@pytest.mark.parametrize("variante", ["Python y SQL", "  python   Y sql ", "PYTHON Y SQL"])
+def test_normalizar_descripcion(variante):
+    assert normalizar_descripcion(variante) == "python y sql"
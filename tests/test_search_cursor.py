@@ -0,0 +1,62 @@
+# tests/test_search_cursor.py
+"""Pruebas de los cursores de paginación de la búsqueda"""
+
+import base64
+import json
+
+import pytest
+
+from app2_ia.services.search_service import _huella, codificar_cursor, decodificar_cursor
+from app2_ia.services.vector_store import FASE_GENERAL, FASE_PUESTO, Posicion
+
+
+def test_ida_y_vuelta():
+    huella = _huella("dev", "Python y SQL")
+    posicion = Posicion(FASE_PUESTO, 0.123456789, 42)
+
+    cursor = codificar_cursor(posicion, 20, huella)
+
+    assert "=" not in cursor
+    assert decodificar_cursor(cursor, huella) == (posicion, 20)
+
+
+def test_la_huella_ignora_mayusculas_y_espacios():
+    cursor = codificar_cursor(Posicion(FASE_GENERAL, 0.5, 7), 10, _huella(None, "Python  y SQL"))
+
+    assert decodificar_cursor(cursor, _huella(None, "python y sql"))[1] == 10
+
+
+@pytest.mark.parametrize("puesto, descripcion", [
+    ("qa", "Python y SQL"),      # otro puesto
+    ("dev", "Java y Kotlin"),    # otra descripción
+    (None, "Python y SQL"),      # sin puesto
+])
+def test_cursor_de_otra_busqueda_se_rechaza(puesto, descripcion):
+    cursor = codificar_cursor(Posicion(FASE_PUESTO, 0.1, 1), 10, _huella("dev", "Python y SQL"))
+
+    with pytest.raises(ValueError, match="no corresponde"):
+        decodificar_cursor(cursor, _huella(puesto, descripcion))
+
+
+def _cursor_crudo(datos) -> str:
+    return base64.urlsafe_b64encode(json.dumps(datos).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("cursor", [
+    "abc",
+    "no es base64!",
+    _cursor_crudo({"f": FASE_PUESTO, "d": 0.1, "id": 1}),                              # sin huella ni servidos
+    _cursor_crudo({"f": FASE_PUESTO, "d": "lejos", "id": 1, "n": 10, "h": "x"}),       # distancia no numérica
+    _cursor_crudo([1, 2, 3]),
+])
+def test_cursor_mal_formado(cursor):
+    with pytest.raises(ValueError, match="Cursor inválido"):
+        decodificar_cursor(cursor, "x")
+
+
+def test_fase_desconocida():
+    huella = _huella(None, "x")
+    cursor = _cursor_crudo({"f": "otra", "d": 0.1, "id": 1, "n": 10, "h": huella})
+
+    with pytest.raises(ValueError, match="fase desconocida"):
+        decodificar_cursor(cursor, huella)
@@ -0,0 +1,113 @@
+# tests/test_search_service.py
+"""
+Pruebas de la búsqueda sobre un almacén numpy en memoria. La limpieza, el
+embedding, los clusters y el reranking se sustituyen por funciones
+deterministas: aquí se prueba la paginación y el cache de resultados.
+"""
+
+import asyncio
+import threading
+import types
+import zlib
+
+import numpy as np
+import pytest
+
+from app2_ia.services import search_service
+from app2_ia.services.result_cache import CacheResultados
+from app2_ia.services.search_service import (
+    buscar_candidatos_similares_lote,
+    buscar_candidatos_similares_lote_async,
+    buscar_pagina_similares,
+    buscar_pagina_similares_async,
+)
+from app2_ia.services.vector_store import NumpyVectorStore
+
+DIM = 8
+
+
+def _embeddings(textos):
+    return [np.random.default_rng(zlib.crc32(t.encode())).standard_normal(DIM).tolist() for t in textos]
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """Almacén con 60 candidatos y un cache de resultados propio de la prueba"""
+    store = NumpyVectorStore(dim=DIM, ruta=None)
+    store.insertar_lote([
+        {"candidato_id": i, "puesto": "qa" if i % 2 else "dev", "embedding": e, "cluster_id": None}
+        for i, e in enumerate(_embeddings([f"candidato {i}" for i in range(60)]))
+    ])
+    cache = CacheResultados(max_entradas=100, ttl_s=60)
+    monkeypatch.setattr(search_service, "obtener_store", lambda: store)
+    monkeypatch.setattr(search_service, "obtener_cache_resultados", lambda: cache)
+    monkeypatch.setattr(search_service, "limpiar_texto_para_embedding", lambda texto: texto)
+    monkeypatch.setattr(search_service, "limpiar_textos_para_embedding", list)
+    monkeypatch.setattr(search_service, "generar_embeddings", _embeddings)
+    monkeypatch.setattr(search_service, "obtener_clusters", lambda: None)
+    monkeypatch.setattr(search_service, "obtener_reranker", lambda: None)
+    monkeypatch.setattr(search_service, "obtener_registro", lambda: types.SimpleNamespace(version=None))
+    return cache
+
+
+def test_pagina_cacheada_conserva_el_cursor(cache):
+    primera = buscar_pagina_similares("qa", "python", k=5)
+    cacheada = buscar_pagina_similares("qa", "python", k=5)
+
+    assert primera.siguiente_cursor is not None
+    assert cacheada.siguiente_cursor == primera.siguiente_cursor
+    assert cacheada.resultados == primera.resultados
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.parametrize("orden", ["lote_primero", "pagina_primero"])
+def test_lote_y_pagina_no_comparten_entrada(cache, orden):
+    if orden == "pagina_primero":
+        pagina = buscar_pagina_similares("qa", "python", k=5)
+    (lote,) = buscar_candidatos_similares_lote([("qa", "python")], [5])
+    if orden == "lote_primero":
+        pagina = buscar_pagina_similares("qa", "python", k=5)
+
+    # Tras un lote, la primera página sigue trayendo el cursor siguiente
+    assert pagina.siguiente_cursor is not None
+    assert pagina.limite_profundidad is None
+    assert [r.candidato_id for r in pagina.resultados] == [r.candidato_id for r in lote]
+    assert cache.stats()["entradas"] == 2
+    assert cache.stats()["hits"] == 0
+
+
+def test_paginas_encadenadas_recorren_el_puesto_sin_repetir(cache):
+    ids, cursor = [], None
+    while True:
+        pagina = buscar_pagina_similares("qa", "python", k=7, cursor=cursor)
+        ids += [r.candidato_id for r in pagina.resultados]
+        cursor = pagina.siguiente_cursor
+        if cursor is None:
+            break
+
+    assert len(ids) == len(set(ids)) == 30
+    assert [r.ranking for r in pagina.resultados] == list(range(29, 31))
+
+
+def test_la_version_asincrona_consulta_los_registros_fuera_del_bucle(cache, monkeypatch):
+    # Los registros pueden leer el modelo del disco: nunca en el hilo del bucle
+    hilos = []
+
+    def registro():
+        hilos.append(threading.current_thread())
+        return types.SimpleNamespace(version=None)
+
+    monkeypatch.setattr(search_service, "obtener_registro", registro)
+
+    async def buscar():
+        pagina = await buscar_pagina_similares_async("qa", "python", k=5)
+        cacheada = await buscar_pagina_similares_async("qa", "python", k=5)
+        (lote,) = await buscar_candidatos_similares_lote_async([("qa", "python")], [5])
+        return pagina, cacheada, lote
+
+    pagina, cacheada, lote = asyncio.run(buscar())
+
+    assert len(hilos) == 3
+    assert threading.main_thread() not in hilos
+    assert cacheada.siguiente_cursor == pagina.siguiente_cursor
+    assert [r.candidato_id for r in lote] == [r.candidato_id for r in pagina.resultados]
@@ -0,0 +1,107 @@
+# tests/test_validacion.py
+"""
+Paridad de la validación por columnas con la validación fila a fila que
+sustituye (copiada abajo como referencia): mismas filas válidas y mismos
+errores, en el mismo orden, sobre los bloques que produce read_csv.
+"""
+
+import io
+import re
+
+import pandas as pd
+import pytest
+
+from app2_ia.utils.validacion import validar_filas
+
+DNI_RE = re.compile(r"\b\d{7,8}[A-Za-z]\b")
+TEL_RE = re.compile(r"\b(\+34)?[ -]?[6-9]\d{8}\b")
+COLUMNAS = {"candidato_id", "puesto", "fortalezas", "debilidades", "valoracion_gpt"}
+
+
+def _validar_filas_por_fila(df):
+    """Implementación anterior (iterrows), sin el logging"""
+    errores, validos = [], []
+    df.columns = df.columns.str.lower()
+    if set(df.columns) != COLUMNAS:
+        raise ValueError("Columnas incorrectas")
+    for i, row in df.iterrows():
+        linea = i + 2
+        fila = row.to_dict()
+        requeridos = ["candidato_id", "puesto", "fortalezas", "debilidades"]
+        if any(pd.isna(fila[c]) or (isinstance(fila[c], str) and not fila[c].strip())
+               for c in requeridos):
+            errores.append(f"Fila {linea}: campos {requeridos} no pueden estar vacíos")
+            continue
+        cid = str(fila["candidato_id"]).strip()
+        if not cid.isdigit():
+            errores.append(f"Fila {linea}: ID no numérico ('{fila['candidato_id']}')")
+            continue
+        fila["candidato_id"] = cid
+        val = fila.get("valoracion_gpt")
+        if pd.isna(val) or (isinstance(val, str) and not val.strip()):
+            fila["valoracion_gpt"] = f"{fila['fortalezas'].strip()} {fila['debilidades'].strip()}".strip()
+        texto = " ".join(fila.values())
+        if DNI_RE.search(texto) or TEL_RE.search(texto):
+            errores.append(f"Fila {linea}: dato sensible detectado")
+            continue
+        validos.append(fila)
+    return validos, errores
+
+
+CSV = """Candidato_ID,Puesto,Fortalezas,Debilidades,Valoracion_GPT
+1,dev,Buen código,Poca documentación,Candidato sólido
+2,,Comunicación,Impuntual,Regular
+3,qa,   ,Lento,Regular
+,qa,Detallista,Lento,Sin ID
+12a,dev,Rápido,Desordenado,ID con letras
+ 42 ,dev,Constante,Tímido,ID con espacios
+4,qa, Analítico ,Perfeccionista ,
+5,ops,Proactivo,Impaciente,"   "
+6,dev,DNI 12345678Z en el texto,Nada,Ok
+7,dev,Tel +34 612345678,Nada,Ok
+8,qa,Bueno,Llamar al 712345678,
+9,dev,Correcto,Mejorable,Contacto 98765432X
+10,ops,Sin teléfono: 5123456789,Nada,Ok
+-3,dev,Negativo,Nada,Ok
+²,dev,Superíndice,Nada,Ok
+11,qa,Todo bien,Nada,Final
+"""
+
+
+def _bloques(chunksize):
+    return list(pd.read_csv(io.StringIO(CSV), chunksize=chunksize, dtype=str))
+
+
+@pytest.mark.parametrize("chunksize", [100, 5, 3])
+def test_paridad_con_la_validacion_fila_a_fila(chunksize):
+    for bloque in _bloques(chunksize):
+        esperado = _validar_filas_por_fila(bloque.copy())
+
+        assert validar_filas(bloque.copy()) == esperado
+
+
+def test_bloque_con_indice_desplazado_informa_la_linea_del_csv():
+    bloques = _bloques(5)
+    validos, errores = validar_filas(bloques[1].copy())
+
+    # El segundo bloque empieza en la fila 5 del DataFrame: línea 7 del CSV
+    assert bloques[1].index[0] == 5
+    assert errores == ["Fila 10: dato sensible detectado", "Fila 11: dato sensible detectado"]
+    assert [f["candidato_id"] for f in validos] == ["42", "4", "5"]
+    assert validos[1]["valoracion_gpt"] == "Analítico Perfeccionista"
+    assert validos[2]["valoracion_gpt"] == "Proactivo Impaciente"
+
+
+def test_todas_las_causas_de_descarte_aparecen():
+    _, errores = validar_filas(_bloques(100)[0].copy())
+
+    assert any("no pueden estar vacíos" in e for e in errores)
+    assert any("ID no numérico" in e for e in errores)
+    assert sum("dato sensible" in e for e in errores) == 4
+
+
+def test_columnas_incorrectas():
+    df = pd.DataFrame({"candidato_id": ["1"], "puesto": ["dev"]})
+
+    with pytest.raises(ValueError, match="Columnas incorrectas"):
+        validar_filas(df)
@@ -0,0 +1,162 @@
+# tests/test_vector_store.py
+"""Pruebas del almacén numpy: top-k exacto, filtro por puesto, keyset y persistencia"""
+
+import numpy as np
+import pytest
+
+from app2_ia.services.vector_store import (
+    FASE_GENERAL,
+    FASE_PUESTO,
+    NumpyVectorStore,
+    Posicion,
+)
+
+DIM = 8
+
+
+def _objetos(embeddings, puestos):
+    return [
+        {"candidato_id": i, "puesto": puesto, "embedding": fila.tolist(), "cluster_id": i % 3}
+        for i, (fila, puesto) in enumerate(zip(embeddings, puestos))
+    ]
+
+
+def _fuerza_bruta(embeddings, candidato_ids, consulta, k):
+    """Top-k de referencia: distancia coseno en float64 y desempate por candidato_id"""
+    matriz = np.asarray(embeddings, dtype=np.float64)
+    consulta = np.asarray(consulta, dtype=np.float64)
+    similitudes = matriz @ consulta / np.linalg.norm(matriz, axis=1) / np.linalg.norm(consulta)
+    orden = sorted(zip(1.0 - similitudes, candidato_ids), key=lambda par: (par[0], par[1]))
+    return orden[:k]
+
+
+def _comprobar_orden(vecinos):
+    claves = [(v.distancia, v.candidato_id) for v in vecinos]
+    assert claves == sorted(claves)
+
+
+@pytest.fixture
+def datos():
+    rng = np.random.default_rng(7)
+    embeddings = rng.standard_normal((400, DIM)).astype(np.float32)
+    # "dev" ocupa ~1/10 del almacén (filtro selectivo) y "qa" ~1/2 (producto completo)
+    puestos = ["dev" if i % 10 == 0 else "qa" if i % 2 else "ops" for i in range(len(embeddings))]
+    return embeddings, puestos
+
+
+@pytest.fixture
+def almacen(datos):
+    embeddings, puestos = datos
+    store = NumpyVectorStore(dim=DIM, ruta=None)
+    store.insertar_lote(_objetos(embeddings, puestos))
+    return store
+
+
+def test_top_k_coincide_con_fuerza_bruta(almacen, datos):
+    embeddings, _ = datos
+    consultas = np.random.default_rng(11).standard_normal((5, DIM)).astype(np.float32)
+
+    resultados = almacen.buscar_lote(consultas, [None] * len(consultas), k=15)
+
+    for consulta, vecinos in zip(consultas, resultados):
+        esperado = _fuerza_bruta(embeddings, range(len(embeddings)), consulta, 15)
+        np.testing.assert_allclose([v.distancia for v in vecinos], [d for d, _ in esperado], atol=1e-5)
+        _comprobar_orden(vecinos)
+
+
+@pytest.mark.parametrize("puesto", ["dev", "qa"])
+def test_filtro_por_puesto(almacen, datos, puesto):
+    embeddings, puestos = datos
+    consulta = np.random.default_rng(3).standard_normal(DIM).astype(np.float32)
+    filas = [i for i, p in enumerate(puestos) if p == puesto]
+
+    vecinos, fase = almacen.buscar_pagina(consulta, puesto, k=10)
+    (por_lote,) = almacen.buscar_lote([consulta], [puesto], k=10)
+
+    assert fase == FASE_PUESTO
+    assert all(v.puesto == puesto for v in vecinos)
+    esperado = _fuerza_bruta(embeddings[filas], filas, consulta, 10)
+    np.testing.assert_allclose([v.distancia for v in vecinos], [d for d, _ in esperado], atol=1e-5)
+    assert [v.candidato_id for v in por_lote] == [v.candidato_id for v in vecinos]
+
+
+def test_puesto_desconocido_busca_en_todo_el_almacen(almacen):
+    vecinos, fase = almacen.buscar_pagina(np.ones(DIM), "inexistente", k=5)
+
+    assert fase == FASE_GENERAL
+    assert len(vecinos) == 5
+
+
+def test_keyset_con_empates_recorre_todo_sin_repetir():
+    rng = np.random.default_rng(5)
+    base = rng.standard_normal((30, DIM)).astype(np.float32)
+    # Cada vector aparece tres veces: empates exactos de distancia
+    embeddings = np.repeat(base, 3, axis=0)
+    store = NumpyVectorStore(dim=DIM, ruta=None)
+    store.insertar_lote(_objetos(embeddings, ["dev"] * len(embeddings)))
+    consulta = base[4] + 0.01
+
+    completo, _ = store.buscar_pagina(consulta, None, k=len(embeddings))
+    paginas, posicion = [], None
+    while True:
+        pagina, fase = store.buscar_pagina(consulta, None, k=7, despues=posicion)
+        paginas += pagina
+        if len(pagina) < 7:
+            break
+        posicion = Posicion(fase, pagina[-1].distancia, pagina[-1].candidato_id)
+
+    assert [v.candidato_id for v in paginas] == [v.candidato_id for v in completo]
+    assert len({v.candidato_id for v in paginas}) == len(embeddings)
+    _comprobar_orden(paginas)
+
+
+def test_insertar_ignora_duplicados(almacen, datos):
+    embeddings, _ = datos
+
+    insertados = almacen.insertar_lote([
+        {"candidato_id": 0, "puesto": "dev", "embedding": embeddings[0].tolist()},
+        {"candidato_id": 10_000, "puesto": "dev", "embedding": embeddings[0].tolist()},
+    ])
+
+    assert insertados == {10_000}
+    assert len(almacen) == len(embeddings) + 1
+    assert almacen.existentes([0, 10_000, 20_000]) == {0, 10_000}
+
+
+def test_persistencia_y_reapertura(tmp_path, datos):
+    embeddings, puestos = datos
+    ruta = str(tmp_path / "almacen")
+    store = NumpyVectorStore(dim=DIM, ruta=ruta)
+    store.insertar_lote(_objetos(embeddings[:250], puestos[:250]))
+    store.insertar_lote(_objetos(embeddings, puestos))  # las 250 primeras se ignoran
+    consulta = embeddings[42]
+    antes, _ = store.buscar_pagina(consulta, "dev", k=10)
+    store.cerrar()
+
+    reabierto = NumpyVectorStore(dim=DIM, ruta=ruta)
+    try:
+        despues, _ = reabierto.buscar_pagina(consulta, "dev", k=10)
+        assert len(reabierto) == len(embeddings)
+        assert despues == antes
+    finally:
+        reabierto.cerrar()
+
+
+def test_ruta_abierta_por_otro_almacen_se_rechaza(tmp_path):
+    ruta = str(tmp_path / "almacen")
+    store = NumpyVectorStore(dim=DIM, ruta=ruta)
+    try:
+        with pytest.raises(RuntimeError, match="otro proceso"):
+            NumpyVectorStore(dim=DIM, ruta=ruta)
+    finally:
+        store.cerrar()
+
+
+def test_reapertura_con_otra_dimension_falla(tmp_path):
+    ruta = str(tmp_path / "almacen")
+    NumpyVectorStore(dim=DIM, ruta=ruta).cerrar()
+
+    with pytest.raises(RuntimeError, match="8D"):
+        NumpyVectorStore(dim=DIM * 2, ruta=ruta)
+    # El intento fallido no deja el almacén bloqueado
+    NumpyVectorStore(dim=DIM, ruta=ruta).cerrar()